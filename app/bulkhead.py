@@ -0,0 +1,81 @@
+import asyncio
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+class BulkheadFullError(Exception):
+    """Raised when a bulkhead cannot admit a call in time"""
+
+class Bulkhead:
+    """Bounded concurrency with a bounded, time-limited wait queue"""
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._active = 0
+        self._queued = 0
+        self._stats = {
+            "admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "queued_total": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Hold a slot for the duration of the block"""
+        if self._semaphore.locked():
+            await self._wait_for_slot()
+        else:
+            await self._semaphore.acquire()
+
+        self._active += 1
+        self._stats["admitted"] += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+
+    async def _wait_for_slot(self):
+        """Queue for a slot, rejecting when the queue is full or the wait times out"""
+        if self._queued >= self.max_queue:
+            self._stats["rejected_queue_full"] += 1
+            raise BulkheadFullError(f"Bulkhead '{self.name}' queue is full ({self.max_queue} waiting)")
+
+        self._queued += 1
+        self._stats["queued_total"] += 1
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._stats["rejected_timeout"] += 1
+            raise BulkheadFullError(f"Bulkhead '{self.name}' queue wait exceeded {self.queue_timeout}s")
+        finally:
+            self._queued -= 1
+            wait_ms = (time.perf_counter() - start_time) * 1000
+            self._stats["total_wait_ms"] += wait_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return current load and wait statistics"""
+        stats = {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "active": self._active,
+            "queue_depth": self._queued,
+        }
+        stats.update(self._stats)
+        stats["total_wait_ms"] = round(self._stats["total_wait_ms"], 2)
+        stats["max_wait_ms"] = round(self._stats["max_wait_ms"], 2)
+        stats["avg_wait_ms"] = round(self._stats["total_wait_ms"] / self._stats["queued_total"], 2) if self._stats["queued_total"] else 0.0
+        return stats
@@ -1,155 +1,909 @@
 import asyncio
+import json
 import time
+import uuid
 import logging
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, Dict, Iterable, List, Tuple
 import redis.asyncio as redis
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+CLOSED = "CLOSED"
+OPEN = "OPEN"
+HALF_OPEN = "HALF_OPEN"
+
+# Trip modes: N consecutive failures, or failure / slow call rate over a sliding time window
+CONSECUTIVE = "consecutive"
+SLIDING_WINDOW = "sliding_window"
+
+EVENTS_CHANNEL = "circuit_breaker:events"
+
+# Call outcomes as seen by the breaker; ignored calls count neither way
+SUCCESS = "success"
+FAILURE = "failure"
+IGNORED = "ignored"
+
+OutcomeClassifier = Callable[[Any, Optional[BaseException]], str]
+
+def default_classifier(result: Any, error: Optional[BaseException]) -> str:
+    """Count raised exceptions as failures and everything else as success"""
+    return FAILURE if error is not None else SUCCESS
+
+# Breaker transitions run as server-side scripts so each one is atomic across
+# workers and costs a single round trip. They share one layout:
+#
+# KEYS[1] = state, KEYS[2] = failure count, KEYS[3] = last failure time (unix seconds),
+# KEYS[4] = sliding window (only used by WINDOW_SCRIPT),
+# KEYS[5] = half-open probes in flight (sorted set of probe ids scored by lease expiry),
+# KEYS[6] = successful half-open probes
+# ARGV[1] = pub/sub channel for transition and failure count events, ARGV[2] = breaker name
+# Returns {state, failure count, last failure time, transitioned (1/0)}
+_SCRIPT_PRELUDE = """
+local state = redis.call('GET', KEYS[1]) or 'CLOSED'
+local now = tonumber(redis.call('TIME')[1])
+local function publish(new_state)
+    redis.call('PUBLISH', ARGV[1], cjson.encode({
+        name = ARGV[2],
+        state = new_state,
+        last_failure_time = tonumber(redis.call('GET', KEYS[3]) or 0),
+        failure_count = tonumber(redis.call('GET', KEYS[2]) or 0)
+    }))
+end
+local function result(new_state, transitioned)
+    if transitioned == 1 then
+        redis.call('SET', KEYS[1], new_state)
+        publish(new_state)
+    end
+    return {
+        new_state,
+        tonumber(redis.call('GET', KEYS[2]) or 0),
+        tonumber(redis.call('GET', KEYS[3]) or 0),
+        transitioned
+    }
+end
+"""
+
+# ARGV[3] = recovery timeout in seconds, ARGV[4] = max concurrent probes,
+# ARGV[5] = probe id, ARGV[6] = probe lease in seconds
+# Promotes OPEN to HALF_OPEN once the recovery timeout has passed. In HALF_OPEN
+# the call is admitted only if it can take one of the probe slots; leases of
+# probes whose worker never reported back expire. Also returns permitted (1/0).
+ALLOW_SCRIPT = _SCRIPT_PRELUDE + """
+local transitioned = 0
+if state == 'OPEN' then
+    local last_failure = tonumber(redis.call('GET', KEYS[3]) or 0)
+    if now - last_failure < tonumber(ARGV[3]) then
+        local r = result(state, 0)
+        r[5] = 0
+        return r
+    end
+    redis.call('DEL', KEYS[5], KEYS[6])
+    state = 'HALF_OPEN'
+    transitioned = 1
+end
+
+local permitted = 1
+if state == 'HALF_OPEN' then
+    redis.call('ZREMRANGEBYSCORE', KEYS[5], '-inf', now)
+    if redis.call('ZCARD', KEYS[5]) < tonumber(ARGV[4]) then
+        redis.call('ZADD', KEYS[5], now + tonumber(ARGV[6]), ARGV[5])
+        redis.call('EXPIRE', KEYS[5], tonumber(ARGV[6]) * 2)
+    else
+        permitted = 0
+    end
+end
+
+local r = result(state, transitioned)
+r[5] = permitted
+return r
+"""
+
+# ARGV[3] = probe id (empty for ordinary calls), ARGV[4] = successful probes needed to close
+# Counts a successful HALF_OPEN probe and closes the breaker after enough of them;
+# clears the consecutive failure count when CLOSED, telling other workers it is back to zero
+SUCCESS_SCRIPT = _SCRIPT_PRELUDE + """
+if state == 'HALF_OPEN' then
+    if ARGV[3] == '' or redis.call('ZREM', KEYS[5], ARGV[3]) == 0 then
+        return result(state, 0)
+    end
+    if redis.call('INCR', KEYS[6]) < tonumber(ARGV[4]) then
+        return result(state, 0)
+    end
+    redis.call('DEL', KEYS[2], KEYS[3], KEYS[5], KEYS[6])
+    return result('CLOSED', 1)
+end
+if state == 'CLOSED' and redis.call('DEL', KEYS[2]) == 1 then
+    publish(state)
+end
+return result(state, 0)
+"""
+
+# ARGV[3] = failure threshold, ARGV[4] = probe id (empty for ordinary calls)
+# Counts a failure and opens the breaker when the threshold is reached; a failed
+# HALF_OPEN probe reopens it, while late results of calls admitted earlier are ignored.
+# Counts below the threshold are published so every worker knows a success must reset them.
+FAILURE_SCRIPT = _SCRIPT_PRELUDE + """
+if state == 'HALF_OPEN' then
+    if ARGV[4] == '' or redis.call('ZREM', KEYS[5], ARGV[4]) == 0 then
+        return result(state, 0)
+    end
+    redis.call('SET', KEYS[3], now)
+    redis.call('DEL', KEYS[5], KEYS[6])
+    return result('OPEN', 1)
+end
+if state == 'CLOSED' then
+    local count = redis.call('INCR', KEYS[2])
+    redis.call('SET', KEYS[3], now)
+    if count >= tonumber(ARGV[3]) then
+        return result('OPEN', 1)
+    end
+    publish(state)
+end
+return result(state, 0)
+"""
+
+# KEYS[4] = window hash with "<bucket>:calls", "<bucket>:failures" and "<bucket>:slow" fields
+# ARGV[3..5] = calls, failures and slow calls aggregated in process since the last flush
+# ARGV[6] = bucket length in seconds, ARGV[7] = buckets per window, ARGV[8] = minimum calls
+# ARGV[9] = failure rate threshold, ARGV[10] = slow call rate threshold (percent)
+# Adds the counts to the current bucket and opens a CLOSED breaker whose window
+# failure or slow call rate reaches its threshold. Counts that arrive while the
+# breaker is not CLOSED are discarded. Also returns the window's calls, failures and slow calls.
+WINDOW_SCRIPT = _SCRIPT_PRELUDE + """
+if state ~= 'CLOSED' then
+    local r = result(state, 0)
+    r[5], r[6], r[7] = 0, 0, 0
+    return r
+end
+
+local bucket_seconds = tonumber(ARGV[6])
+local buckets = tonumber(ARGV[7])
+local bucket = math.floor(now / bucket_seconds)
+redis.call('HINCRBY', KEYS[4], bucket .. ':calls', ARGV[3])
+redis.call('HINCRBY', KEYS[4], bucket .. ':failures', ARGV[4])
+redis.call('HINCRBY', KEYS[4], bucket .. ':slow', ARGV[5])
+redis.call('EXPIRE', KEYS[4], bucket_seconds * (buckets + 1))
+
+local totals = {calls = 0, failures = 0, slow = 0}
+local fields = redis.call('HGETALL', KEYS[4])
+for i = 1, #fields, 2 do
+    local field_bucket, counter = string.match(fields[i], '^(%d+):(%a+)$')
+    if tonumber(field_bucket) > bucket - buckets then
+        totals[counter] = totals[counter] + tonumber(fields[i + 1])
+    else
+        redis.call('HDEL', KEYS[4], fields[i])
+    end
+end
+
+local transitioned = 0
+if totals.calls >= tonumber(ARGV[8]) then
+    local failure_rate = totals.failures * 100 / totals.calls
+    local slow_rate = totals.slow * 100 / totals.calls
+    if failure_rate >= tonumber(ARGV[9]) or slow_rate >= tonumber(ARGV[10]) then
+        redis.call('SET', KEYS[3], now)
+        redis.call('DEL', KEYS[4])
+        state = 'OPEN'
+        transitioned = 1
+    end
+end
+
+local r = result(state, transitioned)
+r[5], r[6], r[7] = totals.calls, totals.failures, totals.slow
+return r
+"""
+
+def _decode(value: Any) -> Optional[str]:
+    """Redis values arrive as bytes or str depending on decode_responses"""
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
 class CircuitBreaker:
-    """Circuit breaker pattern implementation using Redis"""
+    """Circuit breaker pattern implementation using Redis.
+    
+    State is cached in process. Transitions are written to Redis and
+    broadcast over pub/sub so every worker's cache converges; while the
+    breaker is CLOSED, allowing a call and recording a success need no
+    Redis round trip. Consecutive failure counts are broadcast as well, so
+    a success on any worker resets failures counted on the others.
+    
+    In sliding_window mode outcomes are counted in process and flushed
+    periodically into time buckets in Redis, where the breaker trips once
+    the window holds minimum_calls and its failure or slow call rate
+    reaches the threshold.
+    
+    Without Redis, or while Redis is unreachable, the same state machine
+    runs in memory. State decided in memory during an outage is written
+    back to Redis once it is reachable again.
+    """
     
     def __init__(
         self,
+        name: str = "default",
         failure_threshold: int = 5,
         recovery_timeout: int = 60,
-        redis_client: Optional[redis.Redis] = None
+        redis_client: Optional[redis.Redis] = None,
+        mode: str = CONSECUTIVE,
+        window_size: int = 60,
+        window_buckets: int = 6,
+        minimum_calls: int = 20,
+        failure_rate_threshold: float = 50.0,
+        slow_call_rate_threshold: float = 100.0,
+        slow_call_duration: float = 5.0,
+        half_open_max_probes: int = 1,
+        half_open_success_threshold: int = 1,
+        probe_timeout: int = 30,
+        redis_retry_interval: float = 5.0,
+        classifier: Optional[OutcomeClassifier] = None
     ):
+        self.name = name
         self.failure_threshold = failure_threshold
         self.recovery_timeout = recovery_timeout
         self.redis_client = redis_client
-        self.state_key = "circuit_breaker:state"
-        self.failure_count_key = "circuit_breaker:failure_count"
-        self.last_failure_time_key = "circuit_breaker:last_failure_time"
+        if mode not in (CONSECUTIVE, SLIDING_WINDOW):
+            logger.warning(f"Unknown circuit breaker mode '{mode}', using '{CONSECUTIVE}'")
+            mode = CONSECUTIVE
+        self.mode = mode
+        self.window_buckets = max(1, window_buckets)
+        self.bucket_seconds = max(1, window_size // self.window_buckets)
+        self.minimum_calls = max(1, minimum_calls)
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.half_open_max_probes = max(1, half_open_max_probes)
+        self.half_open_success_threshold = max(1, half_open_success_threshold)
+        self.probe_timeout = max(1, probe_timeout)
+        self.redis_retry_interval = redis_retry_interval
+        # Decides whether a call's result or exception counts as a failure
+        self.classifier = classifier or default_classifier
+        self.state_key = f"circuit_breaker:{name}:state"
+        self.failure_count_key = f"circuit_breaker:{name}:failure_count"
+        self.last_failure_time_key = f"circuit_breaker:{name}:last_failure_time"
+        self.window_key = f"circuit_breaker:{name}:window"
+        self.probes_key = f"circuit_breaker:{name}:probes"
+        self.probe_successes_key = f"circuit_breaker:{name}:probe_successes"
+        self.channel = EVENTS_CHANNEL
+        if redis_client:
+            self._allow_script = redis_client.register_script(ALLOW_SCRIPT)
+            self._success_script = redis_client.register_script(SUCCESS_SCRIPT)
+            self._failure_script = redis_client.register_script(FAILURE_SCRIPT)
+            self._window_script = redis_client.register_script(WINDOW_SCRIPT)
         
-    async def get_state(self) -> str:
-        """Get current circuit breaker state"""
+        # In-process view of the shared state
+        self._state = CLOSED
+        self._last_failure_time = 0
+        # Consecutive failures as last seen in Redis or published by any worker (or counted
+        # in memory), so successes only reset the shared count when it may be non-zero
+        self._failure_count = 0
+        # Sliding window outcomes not yet flushed to Redis, and the window as of the last flush
+        self._pending = {"calls": 0, "failures": 0, "slow": 0}
+        self._window = {"calls": 0, "failures": 0, "slow": 0}
+        # Probes this worker holds, so it can turn callers away without asking Redis
+        self._local_probes = 0
+        # In-memory state used while Redis is unavailable
+        self._redis_down_until = 0.0
+        self._local_dirty = False
+        self._local_probe_successes = 0
+        self._local_window: Dict[int, List[int]] = {}
+        self._stats = {
+            "redis_round_trips": 0,
+            "events_published": 0,
+            "events_received": 0,
+            "resyncs": 0,
+            "flushes": 0,
+            "probes_admitted": 0,
+            "probes_rejected": 0,
+            "redis_errors": 0,
+            "local_transitions": 0,
+            "classified_failures": 0,
+            "ignored_calls": 0,
+        }
+    
+    def state_keys(self) -> Tuple[str, str, str]:
+        """Redis keys holding this breaker's state, last failure time and failure count"""
+        return self.state_key, self.last_failure_time_key, self.failure_count_key
+    
+    async def sync_state(self):
+        """Refresh the cached state from Redis"""
         if not self.redis_client:
-            return "CLOSED"  # Default to closed if Redis not available
+            return
         
-        state = await self.redis_client.get(self.state_key)
-        return state.decode() if state else "CLOSED"
+        self._stats["redis_round_trips"] += 1
+        self.apply_snapshot(*await self.redis_client.mget(*self.state_keys()))
+    
+    def apply_snapshot(self, state: Any, last_failure_time: Any, failure_count: Any):
+        """Replace the cached state with values read from Redis"""
+        if self._local_dirty:
+            # State decided in memory during an outage wins until it has been written back
+            return
+        self._state = _decode(state) or CLOSED
+        self._last_failure_time = int(_decode(last_failure_time) or 0)
+        self._failure_count = int(_decode(failure_count) or 0)
+        self._stats["resyncs"] += 1
+    
+    def apply_event(self, event: Dict[str, Any]):
+        """Update the cached state from a published transition"""
+        self._stats["events_received"] += 1
+        self._state = event.get("state", self._state)
+        self._last_failure_time = int(event.get("last_failure_time") or self._last_failure_time)
+        if "failure_count" in event:
+            self._failure_count = int(event["failure_count"] or 0)
+        elif self._state == CLOSED:
+            self._failure_count = 0
+    
+    async def get_state(self) -> str:
+        """Get current circuit breaker state"""
+        return self._state
     
     async def set_state(self, state: str):
-        """Set circuit breaker state"""
+        """Force the circuit breaker state and broadcast the transition"""
+        self._state = state
         if not self.redis_client:
             return
         
-        await self.redis_client.set(self.state_key, state)
-        logger.info(f"Circuit breaker state changed to: {state}")
+        event = json.dumps({"name": self.name, "state": state, "last_failure_time": self._last_failure_time})
+        self._stats["redis_round_trips"] += 1
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.set(self.state_key, state)
+            if self._last_failure_time:
+                pipe.set(self.last_failure_time_key, str(self._last_failure_time))
+            pipe.delete(self.probes_key, self.probe_successes_key)
+            if state == CLOSED:
+                pipe.delete(self.failure_count_key)
+            pipe.publish(self.channel, event)
+            await pipe.execute()
+        self._stats["events_published"] += 1
+        logger.info(f"Circuit breaker '{self.name}' state changed to: {state}")
+    
+    def _use_redis(self) -> bool:
+        """Whether Redis should be tried for the next transition"""
+        return self.redis_client is not None and time.monotonic() >= self._redis_down_until
+    
+    def _redis_failed(self, error: Exception):
+        """Fall back to in-memory state for a while after a Redis error"""
+        self._stats["redis_errors"] += 1
+        self._redis_down_until = time.monotonic() + self.redis_retry_interval
+        logger.warning(
+            f"Circuit breaker '{self.name}' Redis unavailable, using in-memory state "
+            f"for {self.redis_retry_interval}s: {error}"
+        )
+    
+    async def write_back(self):
+        """Write state decided in memory during a Redis outage back to Redis"""
+        if self._local_dirty:
+            await self.set_state(self._state)
+            self._local_dirty = False
+    
+    def _transition_locally(self, state: str):
+        """Move the in-memory state machine to a new state"""
+        self._state = state
+        self._local_probe_successes = 0
+        if state == OPEN:
+            self._last_failure_time = int(time.time())
+            self._local_window.clear()
+        elif state == CLOSED:
+            self._failure_count = 0
+        self._local_dirty = self.redis_client is not None
+        self._stats["local_transitions"] += 1
+        logger.info(f"Circuit breaker '{self.name}' state changed to: {state} (in memory)")
     
     async def get_failure_count(self) -> int:
         """Get current failure count"""
         if not self.redis_client:
             return 0
         
+        self._stats["redis_round_trips"] += 1
         count = await self.redis_client.get(self.failure_count_key)
-        return int(count.decode()) if count else 0
+        return int(_decode(count)) if count else 0
     
-    async def increment_failure_count(self) -> int:
-        """Increment failure count and return new count"""
-        if not self.redis_client:
-            return 0
+    async def _run_transition(self, script, *args) -> Tuple[str, int, int]:
+        """Run a transition script and apply its result to the cached state"""
+        state, failure_count, transitioned, _ = await self._run_script(script, *args)
+        return state, failure_count, transitioned
+    
+    async def _run_script(self, script, *args) -> Tuple[str, int, int, List[int]]:
+        """Run a breaker script, returning its transition result and any extra values"""
+        self._stats["redis_round_trips"] += 1
+        state, failure_count, last_failure_time, transitioned, *extra = await script(
+            keys=[
+                self.state_key,
+                self.failure_count_key,
+                self.last_failure_time_key,
+                self.window_key,
+                self.probes_key,
+                self.probe_successes_key
+            ],
+            args=[self.channel, self.name, *args]
+        )
+        state = _decode(state)
+        self._state = state
+        self._last_failure_time = int(last_failure_time)
+        self._failure_count = int(failure_count)
+        if int(transitioned):
+            self._stats["events_published"] += 1
+            logger.info(f"Circuit breaker '{self.name}' state changed to: {state}")
+        return state, int(failure_count), int(transitioned), [int(value) for value in extra]
+    
+    async def should_allow_request(self) -> bool:
+        """Check if request should be allowed (in HALF_OPEN this takes a probe slot until its lease expires; prefer call())"""
+        allowed, _ = await self._admit()
+        return allowed
+    
+    async def _admit(self) -> Tuple[bool, Optional[str]]:
+        """Decide whether a call may proceed, returning a probe id when it is a HALF_OPEN probe"""
+        state = self._state
         
-        count = await self.redis_client.incr(self.failure_count_key)
-        await self.redis_client.set(self.last_failure_time_key, str(int(time.time())))
-        return count
+        if state == CLOSED:
+            return True, None
+        if state == OPEN:
+            # Only ask Redis once the recovery timeout looks to have passed locally
+            if not self._last_failure_time or int(time.time()) - self._last_failure_time < self.recovery_timeout:
+                return False, None
+        elif self._local_probes >= self.half_open_max_probes:
+            # HALF_OPEN and this worker alone already holds every probe slot
+            self._stats["probes_rejected"] += 1
+            return False, None
+        
+        if self._use_redis():
+            try:
+                return await self._admit_redis()
+            except Exception as e:
+                self._redis_failed(e)
+        return self._admit_local()
     
-    async def reset_failure_count(self):
-        """Reset failure count to zero"""
-        if not self.redis_client:
+    async def _admit_redis(self) -> Tuple[bool, Optional[str]]:
+        """Promote and take a cluster-wide probe slot in Redis"""
+        await self.write_back()
+        probe_id = uuid.uuid4().hex
+        state, _, transitioned, (permitted,) = await self._run_script(
+            self._allow_script,
+            self.recovery_timeout,
+            self.half_open_max_probes,
+            probe_id,
+            self.probe_timeout
+        )
+        if transitioned:
+            logger.info(f"Circuit breaker '{self.name}' transitioning to HALF_OPEN state")
+        if state == CLOSED:
+            return True, None
+        if state == HALF_OPEN and permitted:
+            self._stats["probes_admitted"] += 1
+            self._local_probes += 1
+            return True, probe_id
+        if state == HALF_OPEN:
+            self._stats["probes_rejected"] += 1
+        return False, None
+    
+    def _admit_local(self) -> Tuple[bool, Optional[str]]:
+        """Promote and take a probe slot in memory (the checks in _admit already bound the probes)"""
+        if self._state == OPEN:
+            self._transition_locally(HALF_OPEN)
+        self._stats["probes_admitted"] += 1
+        self._local_probes += 1
+        return True, uuid.uuid4().hex
+    
+    async def record_success(self, duration: float = 0.0, probe_id: Optional[str] = None):
+        """Record a successful request"""
+        if probe_id is not None:
+            self._local_probes -= 1
+        if self.mode == SLIDING_WINDOW and self._state == CLOSED:
+            self._count(failed=False, duration=duration)
+            return
+        # In CLOSED there is nothing to reset unless a worker has published failures
+        if self._state == CLOSED and not self._failure_count:
             return
         
-        await self.redis_client.delete(self.failure_count_key)
-        await self.redis_client.delete(self.last_failure_time_key)
-        logger.info("Circuit breaker failure count reset")
+        if self._use_redis():
+            try:
+                await self.write_back()
+                _, _, transitioned = await self._run_transition(
+                    self._success_script,
+                    probe_id or "",
+                    self.half_open_success_threshold
+                )
+                if transitioned:
+                    logger.info(f"Circuit breaker '{self.name}' closed after {self.half_open_success_threshold} successful probes")
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        
+        if self._state == CLOSED:
+            self._failure_count = 0
+        elif self._state == HALF_OPEN and probe_id is not None:
+            self._local_probe_successes += 1
+            if self._local_probe_successes >= self.half_open_success_threshold:
+                self._transition_locally(CLOSED)
     
-    async def should_allow_request(self) -> bool:
-        """Check if request should be allowed"""
-        state = await self.get_state()
-        
-        if state == "CLOSED":
-            return True
-        elif state == "OPEN":
-            # Check if recovery timeout has passed
-            last_failure_time = await self.redis_client.get(self.last_failure_time_key)
-            if last_failure_time:
-                last_time = int(last_failure_time.decode())
-                current_time = int(time.time())
-                if current_time - last_time >= self.recovery_timeout:
-                    # Transition to HALF_OPEN
-                    await self.set_state("HALF_OPEN")
-                    logger.info("Circuit breaker transitioning to HALF_OPEN state")
-                    return True
-            return False
-        elif state == "HALF_OPEN":
-            # Allow limited requests in half-open state
-            return True
-        
-        return True
-    
-    async def record_success(self):
-        """Record a successful request"""
-        state = await self.get_state()
-        
-        if state == "HALF_OPEN":
-            # Success in half-open state, close the circuit
-            await self.reset_failure_count()
-            await self.set_state("CLOSED")
-            logger.info("Circuit breaker closed due to successful request")
-        elif state == "CLOSED":
-            # Reset failure count on success in closed state
-            await self.reset_failure_count()
-    
-    async def record_failure(self):
+    async def record_failure(self, duration: float = 0.0, probe_id: Optional[str] = None):
         """Record a failed request"""
-        state = await self.get_state()
-        
-        if state == "HALF_OPEN":
-            # Failure in half-open state, reopen the circuit
-            await self.set_state("OPEN")
-            logger.warning("Circuit breaker reopened due to failure in HALF_OPEN state")
-        elif state == "CLOSED":
-            # Increment failure count
-            count = await self.increment_failure_count()
-            if count >= self.failure_threshold:
-                # Open the circuit
-                await self.set_state("OPEN")
-                logger.error(f"Circuit breaker opened due to {count} consecutive failures")
+        if probe_id is not None:
+            self._local_probes -= 1
+        if self.mode == SLIDING_WINDOW and self._state == CLOSED:
+            self._count(failed=True, duration=duration)
+            return
+        
+        if self._use_redis():
+            try:
+                await self.write_back()
+                previous_state = self._state
+                state, failure_count, transitioned = await self._run_transition(
+                    self._failure_script,
+                    self.failure_threshold,
+                    probe_id or ""
+                )
+                if transitioned and previous_state == HALF_OPEN:
+                    logger.warning(f"Circuit breaker '{self.name}' reopened due to failed probe in HALF_OPEN state")
+                elif transitioned:
+                    logger.error(f"Circuit breaker '{self.name}' opened due to {failure_count} consecutive failures")
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        
+        if self._state == HALF_OPEN and probe_id is not None:
+            self._transition_locally(OPEN)
+            logger.warning(f"Circuit breaker '{self.name}' reopened due to failed probe in HALF_OPEN state")
+        elif self._state == CLOSED:
+            self._failure_count += 1
+            self._last_failure_time = int(time.time())
+            if self._failure_count >= self.failure_threshold:
+                logger.error(f"Circuit breaker '{self.name}' opened due to {self._failure_count} consecutive failures")
+                self._transition_locally(OPEN)
+    
+    def _count(self, failed: bool, duration: float):
+        """Aggregate a sliding window outcome in process until the next flush"""
+        self._pending["calls"] += 1
+        if failed:
+            self._pending["failures"] += 1
+        if duration >= self.slow_call_duration:
+            self._pending["slow"] += 1
+    
+    async def flush(self):
+        """Add outcomes aggregated since the last flush to the shared window and evaluate it"""
+        pending = self._pending
+        if not pending["calls"]:
+            return
+        self._pending = {"calls": 0, "failures": 0, "slow": 0}
+        
+        if self._use_redis():
+            try:
+                await self.write_back()
+                state, _, transitioned, window = await self._run_script(
+                    self._window_script,
+                    pending["calls"],
+                    pending["failures"],
+                    pending["slow"],
+                    self.bucket_seconds,
+                    self.window_buckets,
+                    self.minimum_calls,
+                    self.failure_rate_threshold,
+                    self.slow_call_rate_threshold
+                )
+                self._stats["flushes"] += 1
+                self._window = dict(zip(("calls", "failures", "slow"), window))
+                if transitioned:
+                    self._log_window_trip()
+                return
+            except Exception as e:
+                self._redis_failed(e)
+        
+        self._flush_local(pending)
+    
+    def _flush_local(self, pending: Dict[str, int]):
+        """Evaluate the sliding window in memory"""
+        if self._state != CLOSED:
+            return
+        
+        bucket = int(time.time()) // self.bucket_seconds
+        counts = self._local_window.setdefault(bucket, [0, 0, 0])
+        counts[0] += pending["calls"]
+        counts[1] += pending["failures"]
+        counts[2] += pending["slow"]
+        for old_bucket in [b for b in self._local_window if b <= bucket - self.window_buckets]:
+            del self._local_window[old_bucket]
+        
+        calls, failures, slow = (sum(values) for values in zip(*self._local_window.values()))
+        self._stats["flushes"] += 1
+        self._window = {"calls": calls, "failures": failures, "slow": slow}
+        if calls >= self.minimum_calls and (
+            failures * 100 / calls >= self.failure_rate_threshold
+            or slow * 100 / calls >= self.slow_call_rate_threshold
+        ):
+            self._log_window_trip()
+            self._transition_locally(OPEN)
+    
+    def _log_window_trip(self):
+        calls, failures, slow = self._window["calls"], self._window["failures"], self._window["slow"]
+        logger.error(
+            f"Circuit breaker '{self.name}' opened: {failures}/{calls} failed and {slow}/{calls} slow "
+            f"in the last {self.bucket_seconds * self.window_buckets}s"
+        )
     
     async def call(self, func: Callable, *args, **kwargs) -> Any:
         """Execute a function with circuit breaker protection"""
-        if not await self.should_allow_request():
-            raise Exception("Circuit breaker is OPEN - requests not allowed")
+        allowed, probe_id = await self._admit()
+        if not allowed:
+            raise Exception(f"Circuit breaker '{self.name}' is {self._state} - requests not allowed")
         
+        start_time = time.perf_counter()
         try:
             result = await func(*args, **kwargs)
-            await self.record_success()
-            return result
+        except asyncio.CancelledError:
+            # The caller went away; a Redis probe lease expires after probe_timeout
+            if probe_id is not None:
+                self._local_probes -= 1
+            raise
         except Exception as e:
-            await self.record_failure()
+            await self._record(self.classifier(None, e), time.perf_counter() - start_time, probe_id)
             raise e
+        await self._record(self.classifier(result, None), time.perf_counter() - start_time, probe_id)
+        return result
+    
+    async def _record(self, outcome: str, duration: float, probe_id: Optional[str]):
+        """Record a classified call outcome"""
+        if outcome == FAILURE:
+            self._stats["classified_failures"] += 1
+            await self.record_failure(duration, probe_id)
+        elif outcome == IGNORED:
+            self._stats["ignored_calls"] += 1
+            await self.release_probe(probe_id)
+        else:
+            await self.record_success(duration, probe_id)
+    
+    async def release_probe(self, probe_id: Optional[str]):
+        """Hand back a probe slot without counting the call either way"""
+        if probe_id is None:
+            return
+        self._local_probes -= 1
+        if self._use_redis():
+            try:
+                self._stats["redis_round_trips"] += 1
+                await self.redis_client.zrem(self.probes_key, probe_id)
+            except Exception as e:
+                self._redis_failed(e)
+    
+    def _backend(self) -> str:
+        if self.redis_client is None:
+            return "memory"
+        return "redis" if self._use_redis() else "memory (redis unavailable)"
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the cached state and Redis traffic counters"""
+        stats = {
+            "name": self.name,
+            "state": self._state,
+            "last_failure_time": self._last_failure_time or None,
+            "failure_threshold": self.failure_threshold,
+            "recovery_timeout": self.recovery_timeout,
+            "mode": self.mode,
+            "half_open_max_probes": self.half_open_max_probes,
+            "half_open_success_threshold": self.half_open_success_threshold,
+            "backend": self._backend(),
+        }
+        if self.mode == SLIDING_WINDOW:
+            calls = self._window["calls"]
+            stats["window"] = {
+                "seconds": self.bucket_seconds * self.window_buckets,
+                "calls": calls,
+                "failure_rate": round(self._window["failures"] * 100 / calls, 2) if calls else 0.0,
+                "slow_call_rate": round(self._window["slow"] * 100 / calls, 2) if calls else 0.0,
+                "pending_calls": self._pending["calls"],
+            }
+        stats.update(self._stats)
+        return stats
 
-# Global circuit breaker instance
-circuit_breaker = None
+class CircuitBreakerRegistry:
+    """Named circuit breakers, one per HikCentral operation (and optionally per host).
+    
+    Thresholds come from Settings, with per-operation overrides. A single
+    pub/sub subscription per worker keeps every breaker's cache current, and
+    one background task flushes sliding window counts.
+    """
+    
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        failure_threshold: int = 5,
+        recovery_timeout: int = 60,
+        overrides: Optional[Dict[str, Dict[str, Any]]] = None,
+        per_host: bool = False,
+        resync_interval: float = 30.0,
+        flush_interval: float = 1.0,
+        redis_retry_interval: float = 5.0,
+        classifier: Optional[OutcomeClassifier] = None,
+        **breaker_options
+    ):
+        self.redis_client = redis_client
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.overrides = dict(overrides or {})
+        self.per_host = per_host
+        self.resync_interval = resync_interval
+        self.flush_interval = flush_interval
+        self.redis_retry_interval = redis_retry_interval
+        # Defaults for the remaining CircuitBreaker arguments (mode, window and probe settings)
+        self.breaker_options = dict(breaker_options, redis_retry_interval=redis_retry_interval, classifier=classifier)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._listener_task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+    
+    def breaker_name(self, operation: str, host: Optional[str] = None) -> str:
+        """Name of the breaker guarding an operation"""
+        if self.per_host and host:
+            return f"{operation}@{host}"
+        return operation
+    
+    def get(self, operation: str, host: Optional[str] = None) -> CircuitBreaker:
+        """Get or create the breaker for an operation"""
+        name = self.breaker_name(operation, host)
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            options = {
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout": self.recovery_timeout,
+                **self.breaker_options,
+                **self.overrides.get(operation, {})
+            }
+            breaker = self._breakers[name] = CircuitBreaker(name=name, redis_client=self.redis_client, **options)
+        return breaker
+    
+    async def start(self):
+        """Load the shared state of every breaker and follow transitions from other workers"""
+        if self._flush_task is not None:
+            return
+        
+        self._flush_task = asyncio.create_task(self._flush_periodically())
+        if not self.redis_client:
+            return
+        
+        try:
+            await self.sync_all()
+        except Exception as e:
+            logger.warning(f"Circuit breakers could not load state from Redis, starting in memory: {e}")
+        self._listener_task = asyncio.create_task(self._listen())
+    
+    async def stop(self):
+        """Stop following transitions and flush outstanding sliding window counts"""
+        for task in (self._listener_task, self._flush_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._listener_task = None
+        self._flush_task = None
+        await self.flush_all()
+    
+    async def flush_all(self):
+        """Flush every breaker's in-process sliding window counts"""
+        for breaker in list(self._breakers.values()):
+            try:
+                await breaker.flush()
+            except Exception as e:
+                logger.warning(f"Circuit breaker '{breaker.name}' flush failed: {e}")
+    
+    async def _flush_periodically(self):
+        """Push aggregated outcomes to Redis every flush_interval"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_all()
+    
+    async def sync_all(self):
+        """Refresh every breaker's cached state in one round trip"""
+        breakers = list(self._breakers.values())
+        if not self.redis_client or not breakers:
+            return
+        
+        # Redis is reachable: publish anything decided in memory while it was not
+        for breaker in breakers:
+            await breaker.write_back()
+        
+        keys = [key for breaker in breakers for key in breaker.state_keys()]
+        values = await self.redis_client.mget(keys)
+        for index, breaker in enumerate(breakers):
+            breaker.apply_snapshot(*values[index * 3:index * 3 + 3])
+    
+    async def _listen(self):
+        """Apply transitions published by other workers, resubscribing after connection loss"""
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(EVENTS_CHANNEL)
+                # Transitions may have been missed while unsubscribed
+                await self.sync_all()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=self.resync_interval)
+                    if message is None:
+                        await self.sync_all()
+                        continue
+                    self._dispatch(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Circuit breaker event listener error, resubscribing in {self.redis_retry_interval}s: {e}")
+                await asyncio.sleep(self.redis_retry_interval)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+    
+    def _dispatch(self, data: Any):
+        """Route a published transition to the breaker it belongs to"""
+        try:
+            event = json.loads(_decode(data))
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed circuit breaker event: {data!r}")
+            return
+        
+        breaker = self._breakers.get(event.get("name"))
+        if breaker is not None:
+            breaker.apply_event(event)
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return the state of every breaker"""
+        return {name: breaker.get_stats() for name, breaker in sorted(self._breakers.items())}
 
-def get_circuit_breaker() -> CircuitBreaker:
-    """Get or create circuit breaker instance"""
-    global circuit_breaker
-    if circuit_breaker is None:
-        circuit_breaker = CircuitBreaker(
-            failure_threshold=settings.circuit_breaker_failure_threshold,
-            recovery_timeout=settings.circuit_breaker_recovery_timeout
-        )
-    return circuit_breaker
+# Global circuit breaker registry
+circuit_breaker_registry = None
 
-async def initialize_circuit_breaker(redis_client: redis.Redis):
-    """Initialize circuit breaker with Redis client"""
-    global circuit_breaker
-    circuit_breaker = CircuitBreaker(
+def _create_registry(
+    redis_client: Optional[redis.Redis],
+    classifier: Optional[OutcomeClassifier] = None
+) -> CircuitBreakerRegistry:
+    if settings.circuit_breaker_backend == "memory":
+        redis_client = None
+    return CircuitBreakerRegistry(
+        redis_client=redis_client,
         failure_threshold=settings.circuit_breaker_failure_threshold,
         recovery_timeout=settings.circuit_breaker_recovery_timeout,
-        redis_client=redis_client
+        overrides=settings.circuit_breaker_overrides,
+        per_host=settings.circuit_breaker_per_host,
+        flush_interval=settings.circuit_breaker_flush_interval,
+        mode=settings.circuit_breaker_mode,
+        window_size=settings.circuit_breaker_window_size,
+        window_buckets=settings.circuit_breaker_window_buckets,
+        minimum_calls=settings.circuit_breaker_minimum_calls,
+        failure_rate_threshold=settings.circuit_breaker_failure_rate_threshold,
+        slow_call_rate_threshold=settings.circuit_breaker_slow_call_rate_threshold,
+        slow_call_duration=settings.circuit_breaker_slow_call_duration,
+        half_open_max_probes=settings.circuit_breaker_half_open_max_probes,
+        half_open_success_threshold=settings.circuit_breaker_half_open_success_threshold,
+        probe_timeout=settings.circuit_breaker_probe_timeout,
+        redis_retry_interval=settings.circuit_breaker_redis_retry_interval,
+        classifier=classifier
     )
-    logger.info("Circuit breaker initialized")
\ No newline at end of file
+
+def get_circuit_breaker_registry() -> CircuitBreakerRegistry:
+    """Get or create the circuit breaker registry"""
+    global circuit_breaker_registry
+    if circuit_breaker_registry is None:
+        circuit_breaker_registry = _create_registry(None)
+    return circuit_breaker_registry
+
+def get_circuit_breaker(operation: str, host: Optional[str] = None) -> CircuitBreaker:
+    """Get the circuit breaker guarding an operation"""
+    return get_circuit_breaker_registry().get(operation, host)
+
+async def initialize_circuit_breakers(
+    redis_client: Optional[redis.Redis],
+    operations: Iterable[str] = (),
+    host: Optional[str] = None,
+    classifier: Optional[OutcomeClassifier] = None
+):
+    """Initialize the circuit breaker registry with Redis client"""
+    global circuit_breaker_registry
+    if circuit_breaker_registry is not None:
+        await circuit_breaker_registry.stop()
+    circuit_breaker_registry = _create_registry(redis_client, classifier)
+    # Create known breakers up front so their state is loaded before the first call
+    for operation in operations:
+        circuit_breaker_registry.get(operation, host)
+    await circuit_breaker_registry.start()
+    logger.info("Circuit breakers initialized")
+
+async def close_circuit_breakers():
+    """Stop the circuit breaker event listener"""
+    if circuit_breaker_registry is not None:
+        await circuit_breaker_registry.stop()
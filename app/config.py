@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, List
 import os
 
 class Settings(BaseSettings):
@@ -24,6 +24,65 @@ class Settings(BaseSettings):
     hikcentral_org_index_code: str = "1"
     hikcentral_verify_ssl: bool = False
     
+    # HikCentral connection pool settings
+    hikcentral_pool_limit: int = 100
+    hikcentral_pool_limit_per_host: int = 30
+    hikcentral_keepalive_timeout: int = 30  # seconds
+    hikcentral_dns_cache_ttl: int = 300  # seconds
+    
+    # HikCentral retry settings
+    hikcentral_max_retries: int = 3
+    hikcentral_retry_base_delay: float = 0.2  # seconds
+    hikcentral_retry_max_delay: float = 2.0  # seconds
+    hikcentral_retry_deadline: float = 30.0  # seconds, across all attempts
+    
+    # HikCentral bulkheads: concurrent calls, waiting callers and max wait per operation class
+    hikcentral_bulkhead_qr_concurrency: int = 10
+    hikcentral_bulkhead_qr_queue: int = 50
+    hikcentral_bulkhead_qr_queue_timeout: float = 2.0  # seconds
+    hikcentral_bulkhead_write_concurrency: int = 10
+    hikcentral_bulkhead_write_queue: int = 100
+    hikcentral_bulkhead_write_queue_timeout: float = 5.0  # seconds
+    hikcentral_bulkhead_read_concurrency: int = 8
+    hikcentral_bulkhead_read_queue: int = 100
+    hikcentral_bulkhead_read_queue_timeout: float = 5.0  # seconds
+    hikcentral_bulkhead_bulk_concurrency: int = 2
+    hikcentral_bulkhead_bulk_queue: int = 20
+    hikcentral_bulkhead_bulk_queue_timeout: float = 60.0  # seconds
+    
+    # HikCentral outbound rate limit, shared by all workers through Redis
+    hikcentral_rate_limit_enabled: bool = True
+    hikcentral_rate_limit_per_second: float = 20.0
+    hikcentral_rate_limit_burst: int = 40
+    hikcentral_rate_limit_max_wait: float = 5.0  # seconds a call may queue for a token
+    hikcentral_rate_limit_workers: int = 4  # workers sharing the limit when Redis is down
+    
+    # HikCentral wire logging: off, metadata, sampled or full
+    hikcentral_wire_log_level: str = "metadata"
+    hikcentral_wire_log_sample_rate: float = 0.01  # fraction of calls logged with bodies in sampled mode
+    hikcentral_wire_log_max_field_length: int = 256  # longer string fields are truncated
+    
+    # HikCentral timeouts, per attempt; read timeouts can be overridden per operation
+    hikcentral_connect_timeout: float = 3.0  # seconds
+    hikcentral_read_timeout: float = 10.0  # seconds
+    hikcentral_read_timeouts: Dict[str, float] = {
+        "generate_qr_code": 5.0,
+        "add_persons_batch": 60.0,
+        "delete_persons_batch": 60.0,
+    }
+    
+    # Adaptive read timeouts: percentile of recent latency times a multiplier, within floor and ceiling
+    hikcentral_adaptive_timeouts: bool = False
+    hikcentral_adaptive_timeout_percentile: float = 99.0
+    hikcentral_adaptive_timeout_multiplier: float = 1.5
+    hikcentral_adaptive_timeout_floor: float = 1.0  # seconds
+    hikcentral_adaptive_timeout_ceiling: float = 30.0  # seconds
+    hikcentral_adaptive_timeout_window: int = 200  # latencies kept per operation
+    hikcentral_adaptive_timeout_min_samples: int = 20  # static timeout applies until this many
+    
+    # HikCentral batch settings
+    hikcentral_batch_size: int = 100  # persons per batch add/delete request
+    
     # Security settings
     api_key: str = "demo-key"
     require_api_key: bool = True
@@ -31,8 +90,77 @@ class Settings(BaseSettings):
     # Circuit breaker settings
     circuit_breaker_failure_threshold: int = 5
     circuit_breaker_recovery_timeout: int = 60  # seconds
+    # Per-operation overrides, e.g. {"generate_qr_code": {"failure_threshold": 10, "recovery_timeout": 30}}
+    circuit_breaker_overrides: Dict[str, Dict[str, int]] = {
+        "add_persons_batch": {"failure_threshold": 3, "recovery_timeout": 120},
+        "delete_persons_batch": {"failure_threshold": 3, "recovery_timeout": 120},
+    }
+    circuit_breaker_per_host: bool = False  # separate breakers per HikCentral host
+    
+    # Circuit breaker trip mode: "consecutive" (failure_threshold failures in a row)
+    # or "sliding_window" (failure or slow call rate over the last window_size seconds)
+    circuit_breaker_mode: str = "consecutive"
+    circuit_breaker_window_size: int = 60  # seconds
+    circuit_breaker_window_buckets: int = 6
+    circuit_breaker_minimum_calls: int = 20  # calls in the window before rates are evaluated
+    circuit_breaker_failure_rate_threshold: float = 50.0  # percent
+    circuit_breaker_slow_call_rate_threshold: float = 80.0  # percent
+    circuit_breaker_slow_call_duration: float = 5.0  # seconds
+    circuit_breaker_flush_interval: float = 1.0  # seconds between pushes of in-process counts to Redis
+    
+    # Half-open probing: concurrent trial calls across the cluster and successes needed to close
+    circuit_breaker_half_open_max_probes: int = 1
+    circuit_breaker_half_open_success_threshold: int = 3
+    circuit_breaker_probe_timeout: int = 30  # seconds before an unreported probe slot is reclaimed
+    
+    # "hybrid" shares breaker state through Redis and keeps working in memory while Redis is down;
+    # "memory" keeps every worker's breakers in process only
+    circuit_breaker_backend: str = "hybrid"
+    circuit_breaker_redis_retry_interval: float = 5.0  # seconds before Redis is retried after an error
+    # Artemis result codes that count as HikCentral failures (transport errors, timeouts and 5xx always do)
+    circuit_breaker_failure_codes: List[str] = []
+    
+    # Resident lookup cache in Redis; misses are cached for negative_ttl
+    resident_cache_enabled: bool = True
+    resident_cache_ttl: int = 300  # seconds
+    resident_cache_negative_ttl: int = 30  # seconds
+    resident_cache_redis_retry_interval: float = 5.0  # seconds before Redis is retried after an error
+    
+    # In-process resident index in front of the Redis cache and the database, per worker
+    resident_index_enabled: bool = True
+    resident_index_max_entries: int = 10000
+    resident_index_max_bytes: int = 16 * 1024 * 1024
+    resident_index_ttl: float = 60.0  # seconds; bounds staleness if an invalidation is missed
+    
+    # Sync log (audit) writer: rows are queued and bulk-inserted in the background
+    sync_log_async: bool = True
+    sync_log_queue_size: int = 10000
+    sync_log_batch_size: int = 200
+    sync_log_flush_interval: float = 1.0  # seconds
+    sync_log_enqueue_timeout: float = 0.05  # seconds a request waits on a full queue before the row is dropped
+    sync_log_drain_timeout: float = 10.0  # seconds allowed to write out the queue on shutdown
+    
+    # sync_logs partitions: "day" or "month" ranges, created ahead and dropped after retention
+    sync_log_partition_interval: str = "month"
+    sync_log_partitions_ahead: int = 2
+    sync_log_retention_days: int = 90
+    sync_log_maintenance_interval: float = 3600.0  # seconds between partition maintenance runs
+    
+    # Bulk resident import
+    bulk_import_max_residents: int = 50000  # per request
+    bulk_import_concurrency: int = 2  # HikCentral batches in flight per import
+    bulk_import_timeout: float = 1800.0  # seconds per bulk request, replacing request_timeout; 0 = no limit
+    bulk_import_batch_timeout: float = 60.0  # seconds per HikCentral batch, counted once it starts
+    
+    # Resident export: rows fetched per server-side cursor round trip
+    export_batch_size: int = 1000
+    
+    # Resident listing (keyset pages)
+    resident_page_size: int = 50
+    resident_page_size_max: int = 500
     
     # API settings
+    request_timeout: float = 25.0  # seconds per API request; clients may lower it with X-Request-Timeout
     qr_code_validity_minutes: int = 60
     qr_code_image_size: int = 300
     
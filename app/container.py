@@ -0,0 +1,134 @@
+import logging
+from typing import Optional
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app import models
+from app.config import Settings, settings
+from app.circuit_breaker import CircuitBreakerRegistry, get_circuit_breaker_registry, initialize_circuit_breakers, close_circuit_breakers
+from app.hikcentral_client import OPERATION_CLASSES, HikCentralClient, classify_outcome, get_hikcentral_client, initialize_hikcentral_client, close_hikcentral_client
+from app.resident_cache import ResidentCache
+from app.resident_index import ResidentIndex
+from app.resident_service import ResidentService
+from app.sync_log_writer import SyncLogWriter
+from app.sync_log_partitions import SyncLogRetention
+
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """Application-scoped service graph, built once at startup and shared by every request.
+    
+    Holds the HikCentral client, the circuit breakers, the resident caches and
+    the sync log writer and retention job.
+    Only the database session is request-scoped; it comes from the get_db
+    dependency and is passed to the service per call.
+    """
+    
+    def __init__(
+        self,
+        hikcentral_client: HikCentralClient,
+        circuit_breakers: CircuitBreakerRegistry,
+        redis_client: Optional[redis.Redis] = None,
+        database_engine: Optional[AsyncEngine] = None,
+        app_settings: Settings = settings
+    ):
+        self.settings = app_settings
+        self.redis_client = redis_client
+        self.database_engine = database_engine
+        self.hikcentral_client = hikcentral_client
+        self.circuit_breakers = circuit_breakers
+        self.resident_cache = None
+        if redis_client is not None and app_settings.resident_cache_enabled:
+            self.resident_cache = ResidentCache(
+                redis_client,
+                ttl=app_settings.resident_cache_ttl,
+                negative_ttl=app_settings.resident_cache_negative_ttl,
+                redis_retry_interval=app_settings.resident_cache_redis_retry_interval
+            )
+        self.resident_index = None
+        if app_settings.resident_index_enabled:
+            self.resident_index = ResidentIndex(
+                max_entries=app_settings.resident_index_max_entries,
+                max_bytes=app_settings.resident_index_max_bytes,
+                ttl=app_settings.resident_index_ttl,
+                redis_client=redis_client,
+                redis_retry_interval=app_settings.resident_cache_redis_retry_interval
+            )
+        self.sync_log_writer = None
+        if app_settings.sync_log_async and models.AsyncSessionLocal is not None:
+            self.sync_log_writer = SyncLogWriter(
+                models.AsyncSessionLocal,
+                max_queue=app_settings.sync_log_queue_size,
+                batch_size=app_settings.sync_log_batch_size,
+                flush_interval=app_settings.sync_log_flush_interval,
+                enqueue_timeout=app_settings.sync_log_enqueue_timeout,
+                drain_timeout=app_settings.sync_log_drain_timeout
+            )
+        self.sync_log_retention = None
+        if database_engine is not None and database_engine.dialect.name == "postgresql":
+            self.sync_log_retention = SyncLogRetention(
+                database_engine,
+                interval=app_settings.sync_log_partition_interval,
+                ahead=app_settings.sync_log_partitions_ahead,
+                retention_days=app_settings.sync_log_retention_days,
+                maintenance_interval=app_settings.sync_log_maintenance_interval
+            )
+        self.resident_service = ResidentService(
+            hikcentral_client,
+            circuit_breakers,
+            self.resident_cache,
+            self.resident_index,
+            self.sync_log_writer
+        )
+
+# Global service container
+service_container = None
+
+def get_container() -> ServiceContainer:
+    """Get or create the service container (FastAPI dependency)"""
+    global service_container
+    if service_container is None:
+        service_container = ServiceContainer(get_hikcentral_client(), get_circuit_breaker_registry())
+    return service_container
+
+def get_resident_service() -> ResidentService:
+    """Shared resident service (FastAPI dependency)"""
+    return get_container().resident_service
+
+async def initialize_container(
+    redis_client: Optional[redis.Redis] = None,
+    database_engine: Optional[AsyncEngine] = None
+) -> ServiceContainer:
+    """Start the circuit breakers and HikCentral client and wire them into the container"""
+    global service_container
+    hikcentral_client = get_hikcentral_client()
+    await initialize_circuit_breakers(redis_client, OPERATION_CLASSES, hikcentral_client.host, classify_outcome)
+    await initialize_hikcentral_client(redis_client)
+    service_container = ServiceContainer(
+        hikcentral_client=hikcentral_client,
+        circuit_breakers=get_circuit_breaker_registry(),
+        redis_client=redis_client,
+        database_engine=database_engine
+    )
+    if service_container.resident_index is not None:
+        await service_container.resident_index.start()
+    if service_container.sync_log_writer is not None:
+        await service_container.sync_log_writer.start()
+    if service_container.sync_log_retention is not None:
+        await service_container.sync_log_retention.start()
+    logger.info("Service container initialized")
+    return service_container
+
+async def close_container():
+    """Drain the sync log queue, close the HikCentral client and stop the background tasks"""
+    global service_container
+    if service_container is not None:
+        if service_container.sync_log_retention is not None:
+            await service_container.sync_log_retention.stop()
+        if service_container.sync_log_writer is not None:
+            await service_container.sync_log_writer.stop()
+        if service_container.resident_index is not None:
+            await service_container.resident_index.stop()
+    await close_hikcentral_client()
+    await close_circuit_breakers()
+    service_container = None
@@ -0,0 +1,24 @@
+import json
+import base64
+import binascii
+from typing import Dict, Any
+
+class InvalidCursorError(ValueError):
+    """Cursor token that cannot be decoded or does not fit the request"""
+    pass
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """Opaque, URL-safe token for a position in an ordered listing"""
+    raw = json.dumps(position, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    """Position encoded by encode_cursor; raises InvalidCursorError for anything else"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError, binascii.Error) as e:
+        raise InvalidCursorError("Malformed cursor") from e
+    if not isinstance(position, dict):
+        raise InvalidCursorError("Malformed cursor")
+    return position
@@ -1,101 +1,632 @@
+import asyncio
 import aiohttp
+import redis.asyncio as redis
 import hashlib
 import hmac
 import base64
+import ssl
 import time
 import json
+import uuid
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from urllib.parse import urlparse
 from app.config import settings
+from app.single_flight import SingleFlight
+from app.retry import RetryPolicy, RETRYABLE_STATUSES, UNPROCESSED_STATUSES
+from app.bulkhead import Bulkhead, BulkheadFullError
+from app.rate_limiter import DistributedRateLimiter, RateLimitExceededError
+from app.wire_logging import WireLogger
+from app.circuit_breaker import SUCCESS, FAILURE, IGNORED
+from app.timeouts import TimeoutPolicy, remaining_request_time
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# HikCentral Artemis endpoints
+PERSON_ADD_URI = "/artemis/api/resource/v1/person/single/add"
+PERSON_UPDATE_URI = "/artemis/api/resource/v1/person/single/update"
+PERSON_DELETE_URI = "/artemis/api/resource/v1/person/single/delete"
+PERSON_INFO_URI = "/artemis/api/resource/v1/person/single/info"
+PERSON_BATCH_ADD_URI = "/artemis/api/resource/v1/person/batch/add"
+PERSON_BATCH_DELETE_URI = "/artemis/api/resource/v1/person/batch/delete"
+QR_CODE_GENERATE_URI = "/artemis/api/visitor/access/qrCode/generate"
+
+# Operation classes that get their own bulkhead, so a burst in one class
+# (e.g. QR codes or a bulk import) cannot starve the others
+OPERATION_CLASSES = {
+    "generate_qr_code": "qr",
+    "add_person": "person_write",
+    "update_person": "person_write",
+    "delete_person": "person_write",
+    "get_person": "read",
+    "add_persons_batch": "bulk",
+    "delete_persons_batch": "bulk",
+}
+
+SIGNATURE_HEADERS = "x-ca-key,x-ca-nonce,x-ca-timestamp"
+ACCEPT = "application/json"
+CONTENT_TYPE = "application/json;charset=UTF-8"
+
+# Result codes that mean HikCentral could not serve the call, as opposed to
+# rejecting the request itself; only these count against the circuit breaker
+TRANSPORT_FAILURE_CODES = frozenset({"NETWORK_ERROR", "INVALID_RESPONSE"})
+# Calls rejected locally never reached HikCentral and say nothing about its health;
+# DEADLINE_EXCEEDED means the caller's budget ran out, before sending or during an
+# attempt that the caller's deadline had cut shorter than the timeout policy allows
+LOCAL_REJECTION_CODES = frozenset({"BULKHEAD_FULL", "RATE_LIMITED", "DEADLINE_EXCEEDED"})
+# Event loop timers may fire up to the clock resolution early
+TIMER_SLACK = 0.001
+
+def classify_outcome(result: Any, error: Optional[BaseException]) -> str:
+    """Circuit breaker outcome of a HikCentralClient call.
+    
+    Transport errors, timeouts, HTTP 5xx and the Artemis codes listed in
+    circuit_breaker_failure_codes are failures; validation and other
+    business errors are not. Batch calls fail if any chunk failed.
+    """
+    if error is not None:
+        return FAILURE
+    
+    results = result if isinstance(result, list) else [result]
+    outcomes = set()
+    for item in results:
+        if not isinstance(item, dict) or item.get("success"):
+            outcomes.add(SUCCESS)
+            continue
+        
+        code = str(item.get("code") or "")
+        if code in TRANSPORT_FAILURE_CODES or code in settings.circuit_breaker_failure_codes:
+            outcomes.add(FAILURE)
+        elif code.isdigit() and 500 <= int(code) <= 599:
+            outcomes.add(FAILURE)
+        elif code in LOCAL_REJECTION_CODES:
+            outcomes.add(IGNORED)
+        else:
+            outcomes.add(SUCCESS)
+    
+    if FAILURE in outcomes:
+        return FAILURE
+    if outcomes == {IGNORED}:
+        return IGNORED
+    return SUCCESS
+
+class DeadlineExceededError(Exception):
+    """Raised when the caller's deadline has passed before a call could be sent"""
+
+def _json_dumps(data: Any) -> bytes:
+    """Serialize a request body to compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def _json_loads(raw: bytes) -> Any:
+    """Decode a response body"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
 class HikCentralClient:
     def __init__(self):
         self.base_url = self._clean_base_url(settings.hikcentral_base_url)
+        self.host = urlparse(self.base_url).netloc
         self.app_key = settings.hikcentral_app_key
         self.app_secret = settings.hikcentral_app_secret
         self.user_id = settings.hikcentral_user_id
         self.org_index_code = settings.hikcentral_org_index_code
         self.verify_ssl = settings.hikcentral_verify_ssl
+        self.batch_size = max(1, settings.hikcentral_batch_size)
+        
+        # Precomputed signing state: the keyed HMAC is copied per request
+        # instead of re-encoding the secret, and headers start from a template
+        self._hmac_key = hmac.new(self.app_secret.encode('utf-8'), digestmod=hashlib.sha256)
+        self._header_template = {
+            'Accept': ACCEPT,
+            'Content-Type': CONTENT_TYPE,
+            'X-Ca-Key': self.app_key,
+            'X-Ca-Signature-Headers': SIGNATURE_HEADERS,
+            'userId': self.user_id
+        }
+        self._sign_key_line = f"x-ca-key:{self.app_key}"
+        self._operation_metrics: Dict[str, Dict[str, Any]] = {}
+        self.wire_logger = WireLogger(
+            level=settings.hikcentral_wire_log_level,
+            sample_rate=settings.hikcentral_wire_log_sample_rate,
+            max_field_length=settings.hikcentral_wire_log_max_field_length
+        )
+        
+        # Concurrent identical reads share one in-flight request
+        self._single_flight = SingleFlight()
+        self.bulkheads = self._create_bulkheads()
+        self.rate_limiter = DistributedRateLimiter(
+            rate=settings.hikcentral_rate_limit_per_second,
+            burst=settings.hikcentral_rate_limit_burst,
+            max_wait=settings.hikcentral_rate_limit_max_wait,
+            local_share=settings.hikcentral_rate_limit_workers
+        ) if settings.hikcentral_rate_limit_enabled else None
+        self.retry_policy = RetryPolicy(
+            max_retries=settings.hikcentral_max_retries,
+            base_delay=settings.hikcentral_retry_base_delay,
+            max_delay=settings.hikcentral_retry_max_delay,
+            deadline=settings.hikcentral_retry_deadline
+        )
+        self.timeout_policy = TimeoutPolicy(
+            connect_timeout=settings.hikcentral_connect_timeout,
+            read_timeout=settings.hikcentral_read_timeout,
+            read_timeouts=settings.hikcentral_read_timeouts,
+            adaptive=settings.hikcentral_adaptive_timeouts,
+            percentile=settings.hikcentral_adaptive_timeout_percentile,
+            multiplier=settings.hikcentral_adaptive_timeout_multiplier,
+            floor=settings.hikcentral_adaptive_timeout_floor,
+            ceiling=settings.hikcentral_adaptive_timeout_ceiling,
+            window=settings.hikcentral_adaptive_timeout_window,
+            min_samples=settings.hikcentral_adaptive_timeout_min_samples
+        )
+        
+        # Shared connection pool, created by start() or lazily on first request
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ssl_context = self._create_ssl_context()
+        self._pool_counters = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+        # Requests between on_request_start and on_request_end/exception, i.e. connections in use
+        self._in_flight = 0
+    
+    def _create_bulkheads(self) -> Dict[str, Bulkhead]:
+        """Create one bulkhead per operation class"""
+        return {
+            "qr": Bulkhead(
+                "qr",
+                settings.hikcentral_bulkhead_qr_concurrency,
+                settings.hikcentral_bulkhead_qr_queue,
+                settings.hikcentral_bulkhead_qr_queue_timeout
+            ),
+            "person_write": Bulkhead(
+                "person_write",
+                settings.hikcentral_bulkhead_write_concurrency,
+                settings.hikcentral_bulkhead_write_queue,
+                settings.hikcentral_bulkhead_write_queue_timeout
+            ),
+            "read": Bulkhead(
+                "read",
+                settings.hikcentral_bulkhead_read_concurrency,
+                settings.hikcentral_bulkhead_read_queue,
+                settings.hikcentral_bulkhead_read_queue_timeout
+            ),
+            "bulk": Bulkhead(
+                "bulk",
+                settings.hikcentral_bulkhead_bulk_concurrency,
+                settings.hikcentral_bulkhead_bulk_queue,
+                settings.hikcentral_bulkhead_bulk_queue_timeout
+            ),
+        }
+    
+    def _create_ssl_context(self) -> ssl.SSLContext:
+        """Create one SSL context shared by every pooled connection"""
+        context = ssl.create_default_context()
+        if not self.verify_ssl:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        return context
+    
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        """Trace hooks feeding the pool statistics"""
+        trace_config = aiohttp.TraceConfig()
+        
+        async def on_request_start(session, ctx, params):
+            self._pool_counters["requests"] += 1
+            self._in_flight += 1
+        
+        async def on_request_done(session, ctx, params):
+            self._in_flight -= 1
+        
+        async def on_connection_create_end(session, ctx, params):
+            self._pool_counters["connections_created"] += 1
+        
+        async def on_connection_reuseconn(session, ctx, params):
+            self._pool_counters["connections_reused"] += 1
+        
+        async def on_dns_cache_hit(session, ctx, params):
+            self._pool_counters["dns_cache_hits"] += 1
+        
+        async def on_dns_cache_miss(session, ctx, params):
+            self._pool_counters["dns_cache_misses"] += 1
+        
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_done)
+        trace_config.on_request_exception.append(on_request_done)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+    
+    async def start(self):
+        """Create the long-lived session and connection pool"""
+        if self._session is not None and not self._session.closed:
+            return
+        
+        connector = aiohttp.TCPConnector(
+            limit=settings.hikcentral_pool_limit,
+            limit_per_host=settings.hikcentral_pool_limit_per_host,
+            keepalive_timeout=settings.hikcentral_keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=settings.hikcentral_dns_cache_ttl,
+            ssl=self._ssl_context
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            trace_configs=[self._create_trace_config()]
+        )
+        logger.info(
+            f"HikCentral connection pool started (limit={settings.hikcentral_pool_limit}, "
+            f"limit_per_host={settings.hikcentral_pool_limit_per_host})"
+        )
+    
+    async def close(self):
+        """Close the session and release pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("HikCentral connection pool closed")
+        self._session = None
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, starting it if needed"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Return connection pool statistics"""
+        connector = self._session.connector if self._session is not None and not self._session.closed else None
+        
+        # aiohttp has no public view of its idle pool; report None if its internals change
+        idle_connections = 0 if connector is None else None
+        try:
+            if connector is not None:
+                idle_connections = sum(len(conns) for conns in connector._conns.values())
+        except (AttributeError, TypeError):
+            pass
+        
+        stats = {
+            "active": connector is not None,
+            "limit": settings.hikcentral_pool_limit,
+            "limit_per_host": settings.hikcentral_pool_limit_per_host,
+            "keepalive_timeout": settings.hikcentral_keepalive_timeout,
+            "dns_cache_ttl": settings.hikcentral_dns_cache_ttl,
+            "acquired_connections": self._in_flight,
+            "idle_connections": idle_connections,
+        }
+        stats.update(self._pool_counters)
+        return stats
     
     def _clean_base_url(self, url: str) -> str:
         """Ensures base URL is just scheme://host:port"""
         parsed = urlparse(url)
         return f"{parsed.scheme}://{parsed.netloc}"
     
-    def _get_content_md5(self, body: str) -> str:
+    def _get_content_md5(self, body: bytes) -> str:
         """Calculate Content-MD5 header value"""
-        md5_hash = hashlib.md5(body.encode('utf-8')).digest()
-        return base64.b64encode(md5_hash).decode('utf-8')
+        md5_hash = hashlib.md5(body).digest()
+        return base64.b64encode(md5_hash).decode('ascii')
     
-    def _generate_signature(self, method: str, uri: str, headers: Dict[str, str]) -> str:
+    def _canonical_query(self, params: Optional[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """Sort query parameters so the signed and the sent query string match"""
+        if not params:
+            return []
+        return sorted((str(key), str(value)) for key, value in params.items() if value is not None)
+    
+    def _generate_signature(self, method: str, resource: str, content_md5: str, nonce: str, timestamp: str) -> str:
         """Generate HMAC-SHA256 signature required by HikCentral"""
-        # 1. Construct the string to sign
-        parts = [
+        # Accept, Content-MD5, Content-Type, Date, x-ca-* headers, then the resource path
+        string_to_sign = '\n'.join((
             method,
-            headers.get('Accept', '*/*'),
-            headers.get('Content-MD5', ''),
-            headers.get('Content-Type', ''),
-            headers.get('Date', ''),
-        ]
-        
-        # 2. Add custom x-ca-* headers (sorted alphabetically)
-        # Note: HikCentral Python demos often put x-ca- headers directly in the string
-        # Standard format: header_name:header_value
-        x_ca_headers = [
-            f"x-ca-key:{headers.get('X-Ca-Key')}",
-            f"x-ca-nonce:{headers.get('X-Ca-Nonce')}",
-            f"x-ca-timestamp:{headers.get('X-Ca-Timestamp')}",
-        ]
-        parts.extend(x_ca_headers)
+            ACCEPT,
+            content_md5,
+            CONTENT_TYPE,
+            '',
+            self._sign_key_line,
+            f"x-ca-nonce:{nonce}",
+            f"x-ca-timestamp:{timestamp}",
+            resource,
+        ))
         
-        # 3. Add the URI (resource path)
-        parts.append(uri)
-        
-        string_to_sign = '\n'.join(parts)
-        
-        # 4. Compute HMAC-SHA256
-        signature = hmac.new(
-            self.app_secret.encode('utf-8'),
-            string_to_sign.encode('utf-8'),
-            hashlib.sha256
-        ).digest()
-        
-        return base64.b64encode(signature).decode('utf-8')
+        mac = self._hmac_key.copy()
+        mac.update(string_to_sign.encode('utf-8'))
+        return base64.b64encode(mac.digest()).decode('ascii')
     
-    def _build_headers(self, method: str, uri: str, body_str: str = "") -> Dict[str, str]:
+    def _build_headers(self, method: str, uri: str, body: bytes = b"", query: Optional[List[Tuple[str, str]]] = None) -> Dict[str, str]:
         """Builds the complete set of headers for the request"""
         timestamp = str(int(time.time() * 1000))
-        nonce = str(int(time.time()))
+        # uuid4 nonces stay unique across concurrent requests in the same millisecond
+        nonce = uuid.uuid4().hex
         
-        headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/json;charset=UTF-8',
-            'X-Ca-Key': self.app_key,
-            'X-Ca-Nonce': nonce,
-            'X-Ca-Timestamp': timestamp,
-            'X-Ca-Signature-Headers': 'x-ca-key,x-ca-nonce,x-ca-timestamp',
-            'userId': self.user_id
-        }
+        headers = self._header_template.copy()
+        headers['X-Ca-Nonce'] = nonce
+        headers['X-Ca-Timestamp'] = timestamp
         
-        if body_str:
-            headers['Content-MD5'] = self._get_content_md5(body_str)
+        content_md5 = ''
+        if body:
+            content_md5 = self._get_content_md5(body)
+            headers['Content-MD5'] = content_md5
         
-        # Generate signature
-        signature = self._generate_signature(method, uri, headers)
-        headers['X-Ca-Signature'] = signature
+        # GET parameters are part of the signed resource
+        resource = uri
+        if query:
+            resource = f"{uri}?" + '&'.join(f"{key}={value}" for key, value in query)
         
+        headers['X-Ca-Signature'] = self._generate_signature(method, resource, content_md5, nonce, timestamp)
         return headers
     
-    async def add_person(self, person_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Add person to HikCentral"""
-        uri = "/artemis/api/resource/v1/person/single/add"
+    def _record_metrics(self, operation: str, result: Dict[str, Any], latency_ms: float):
+        """Record per-operation call metrics"""
+        metrics = self._operation_metrics.get(operation)
+        if metrics is None:
+            metrics = self._operation_metrics[operation] = {
+                "calls": 0,
+                "successes": 0,
+                "failures": 0,
+                "network_errors": 0,
+                "total_latency_ms": 0.0,
+                "max_latency_ms": 0.0,
+            }
+        
+        metrics["calls"] += 1
+        if result["success"]:
+            metrics["successes"] += 1
+        else:
+            metrics["failures"] += 1
+            if result.get("code") == "NETWORK_ERROR":
+                metrics["network_errors"] += 1
+        metrics["total_latency_ms"] += latency_ms
+        metrics["max_latency_ms"] = max(metrics["max_latency_ms"], latency_ms)
+    
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-operation call metrics"""
+        metrics = {}
+        for operation, values in self._operation_metrics.items():
+            metrics[operation] = dict(values)
+            metrics[operation]["total_latency_ms"] = round(values["total_latency_ms"], 2)
+            metrics[operation]["max_latency_ms"] = round(values["max_latency_ms"], 2)
+            metrics[operation]["avg_latency_ms"] = round(values["total_latency_ms"] / values["calls"], 2) if values["calls"] else 0.0
+        return metrics
+    
+    def get_retry_stats(self) -> Dict[str, Any]:
+        """Return per-operation retry statistics"""
+        return self.retry_policy.get_stats()
+    
+    def get_bulkhead_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-class bulkhead statistics"""
+        return {name: bulkhead.get_stats() for name, bulkhead in self.bulkheads.items()}
+    
+    def get_rate_limit_stats(self) -> Optional[Dict[str, Any]]:
+        """Return outbound rate limiter statistics"""
+        return self.rate_limiter.get_stats() if self.rate_limiter is not None else None
+    
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """Return request coalescing statistics for reads"""
+        return self._single_flight.get_stats()
+    
+    def get_timeout_stats(self) -> Dict[str, Any]:
+        """Return the per-operation timeouts in effect"""
+        return self.timeout_policy.get_stats()
+    
+    def _remaining_budget(self, started_at: float) -> float:
+        """Seconds left for this call: the retry deadline or the caller's request deadline, whichever is sooner"""
+        remaining = self.retry_policy.remaining(started_at)
+        request_remaining = remaining_request_time()
+        if request_remaining is not None:
+            remaining = min(remaining, request_remaining)
+        return remaining
+    
+    async def _request(
+        self,
+        operation: str,
+        method: str,
+        uri: str,
+        body: Optional[Any] = None,
+        params: Optional[Dict[str, Any]] = None,
+        success_message: str = "Request successful"
+    ) -> Dict[str, Any]:
+        """Sign and send a request to HikCentral and normalize the response.
+        
+        Transient failures are retried according to the retry policy; every
+        attempt is signed just before it is sent, after any rate limit wait,
+        so it carries a fresh nonce and timestamp. Each attempt's timeout is
+        capped by the caller's remaining request deadline; an attempt that
+        times out because of that cap is DEADLINE_EXCEEDED, not a network error.
+        """
+        start_time = time.perf_counter()
+        started_at = time.monotonic()
+        
+        body_bytes = _json_dumps(body) if body is not None else b""
+        query = self._canonical_query(params)
         url = f"{self.base_url}{uri}"
+        bulkhead = self.bulkheads[OPERATION_CLASSES.get(operation, "read")]
+        
+        log_bodies = self.wire_logger.should_log_bodies()
+        self.wire_logger.log_request(operation, method, url, body, len(body_bytes), query or None, log_bodies)
+        
+        attempt = 0
+        while True:
+            attempt += 1
+            retryable = False
+            unprocessed = False
+            attempt_started = None
+            deadline_capped = False
+            
+            try:
+                session = await self._get_session()
+                # Wait for a rate limit token before taking a bulkhead slot, so throttled
+                # callers don't hold slots idle, and never wait past the deadline
+                remaining = self._remaining_budget(started_at)
+                if remaining <= 0:
+                    raise DeadlineExceededError(f"No time left for HikCentral {operation}")
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire(max_wait=remaining)
+                async with bulkhead.acquire():
+                    remaining = self._remaining_budget(started_at)
+                    if remaining <= 0:
+                        raise DeadlineExceededError(f"No time left for HikCentral {operation}")
+                    connect_timeout, read_timeout, total_timeout = self.timeout_policy.timeouts_for(operation, remaining)
+                    # Whether the caller's deadline, rather than the policy or retry deadline, bounds this attempt
+                    request_remaining = remaining_request_time()
+                    _, _, policy_total = self.timeout_policy.timeouts_for(operation, self.retry_policy.remaining(started_at))
+                    deadline_capped = request_remaining is not None and request_remaining < policy_total
+                    headers = self._build_headers(method, uri, body_bytes, query)
+                    self.wire_logger.log_headers(operation, attempt, headers)
+                    attempt_started = time.perf_counter()
+                    async with session.request(
+                        method,
+                        url,
+                        data=body_bytes or None,
+                        params=query or None,
+                        headers=headers,
+                        timeout=aiohttp.ClientTimeout(
+                            total=total_timeout,
+                            sock_connect=connect_timeout,
+                            sock_read=read_timeout
+                        )
+                    ) as response:
+                        raw = await response.read()
+                        status = response.status
+                
+                latency = time.perf_counter() - attempt_started
+                self.timeout_policy.record(operation, latency)
+                self.wire_logger.log_response(operation, status, raw, latency * 1000, log_bodies)
+                result = self._parse_response(status, raw, success_message)
+                retryable = status in RETRYABLE_STATUSES
+                unprocessed = status in UNPROCESSED_STATUSES
+                
+            except BulkheadFullError as e:
+                # Local saturation: HikCentral was never called, so fail fast without retrying
+                logger.warning(f"HikCentral {operation} rejected: {e}")
+                result = {
+                    "success": False,
+                    "message": str(e),
+                    "code": "BULKHEAD_FULL"
+                }
+                
+            except RateLimitExceededError as e:
+                logger.warning(f"HikCentral {operation} rejected: {e}")
+                result = {
+                    "success": False,
+                    "message": str(e),
+                    "code": "RATE_LIMITED"
+                }
+                
+            except DeadlineExceededError as e:
+                logger.warning(f"HikCentral {operation} abandoned: {e}")
+                result = {
+                    "success": False,
+                    "message": str(e),
+                    "code": "DEADLINE_EXCEEDED"
+                }
+                
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # A capped attempt that ran for its whole total timeout was ended by the caller's
+                # deadline; an earlier timeout is the policy's own connect or read timeout
+                if (
+                    isinstance(e, asyncio.TimeoutError)
+                    and deadline_capped
+                    and time.perf_counter() - attempt_started >= total_timeout - TIMER_SLACK
+                ):
+                    # The caller's short deadline says nothing about HikCentral's latency
+                    # or health, so the attempt is neither sampled nor retried
+                    logger.warning(f"HikCentral {operation} abandoned: caller deadline reached after {total_timeout:.3f}s")
+                    result = {
+                        "success": False,
+                        "message": f"Deadline exceeded during HikCentral {operation}",
+                        "code": "DEADLINE_EXCEEDED"
+                    }
+                else:
+                    if isinstance(e, asyncio.TimeoutError) and attempt_started is not None:
+                        # Count the timeout as a slow sample so adaptive timeouts back off
+                        self.timeout_policy.record(operation, time.perf_counter() - attempt_started, timed_out=True)
+                    logger.error(f"Error calling HikCentral {operation}: {str(e) or type(e).__name__}")
+                    result = {
+                        "success": False,
+                        "message": f"Network error: {str(e) or type(e).__name__}",
+                        "code": "NETWORK_ERROR"
+                    }
+                    retryable = True
+                    # The connection was never established, so nothing reached HikCentral
+                    unprocessed = isinstance(e, aiohttp.ClientConnectorError)
+                
+            except Exception as e:
+                logger.error(f"Error calling HikCentral {operation}: {e}")
+                result = {
+                    "success": False,
+                    "message": f"Network error: {str(e)}",
+                    "code": "NETWORK_ERROR"
+                }
+            
+            self.retry_policy.record_attempt(operation, attempt, result["success"], result.get("code") or "success")
+            if not retryable:
+                break
+            
+            delay = self.retry_policy.next_delay(operation, attempt, started_at, unprocessed)
+            if delay is None:
+                break
+            request_remaining = remaining_request_time()
+            if request_remaining is not None and request_remaining <= delay:
+                break
+            
+            logger.warning(f"Retrying HikCentral {operation} in {delay:.2f}s after attempt {attempt} failed: {result['message']}")
+            await asyncio.sleep(delay)
+        
+        self._record_metrics(operation, result, (time.perf_counter() - start_time) * 1000)
+        return result
+    
+    def _parse_response(self, status: int, raw: bytes, success_message: str) -> Dict[str, Any]:
+        """Turn an HTTP status and body into the client's result format"""
+        if status != 200:
+            return {
+                "success": False,
+                "message": f"HTTP {status}: {raw.decode('utf-8', errors='replace')}",
+                "code": str(status)
+            }
+        
+        try:
+            response_data = _json_loads(raw)
+        except ValueError:
+            return {
+                "success": False,
+                "message": f"Invalid JSON response: {raw[:200].decode('utf-8', errors='replace')}",
+                "code": "INVALID_RESPONSE"
+            }
+        
+        if not isinstance(response_data, dict):
+            return {
+                "success": False,
+                "message": f"Unexpected response body: {raw[:200].decode('utf-8', errors='replace')}",
+                "code": "INVALID_RESPONSE"
+            }
+        
+        if response_data.get("code") == "0":
+            return {
+                "success": True,
+                "data": response_data.get("data", {}),
+                "message": success_message
+            }
         
-        # Prepare person data for HikCentral
-        hikcentral_data = {
+        return {
+            "success": False,
+            "message": response_data.get("msg", "Unknown error"),
+            "code": response_data.get("code")
+        }
+    
+    def _person_payload(self, person_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Prepare person data for HikCentral"""
+        return {
             "personCode": person_data.get("personCode", ""),
             "personFamilyName": person_data.get("personFamilyName", ""),
             "personGivenName": person_data.get("personGivenName", ""),
@@ -110,61 +641,75 @@ class HikCentralClient:
             "endTime": person_data.get("endTime", ""),
             "faces": person_data.get("faces", [])
         }
+    
+    async def add_person(self, person_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Add person to HikCentral"""
+        return await self._request(
+            "add_person", "POST", PERSON_ADD_URI,
+            body=self._person_payload(person_data),
+            success_message="Person added successfully"
+        )
+    
+    async def add_persons_batch(self, persons_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add persons to HikCentral in chunks of batch_size.
         
-        body_str = json.dumps(hikcentral_data, separators=(',', ':'))
-        headers = self._build_headers("POST", uri, body_str)
+        Returns one result per input person, in input order.
+        """
+        results: List[Dict[str, Any]] = []
         
-        logger.info(f"Requesting: {url}")
-        logger.info(f"Headers: {headers}")
-        logger.info(f"Body: {body_str}")
+        for offset in range(0, len(persons_data), self.batch_size):
+            chunk = persons_data[offset:offset + self.batch_size]
+            # clientId ties each item in the HikCentral response back to its input
+            body = [
+                dict(self._person_payload(person_data), clientId=index)
+                for index, person_data in enumerate(chunk)
+            ]
+            
+            response = await self._request(
+                "add_persons_batch", "POST", PERSON_BATCH_ADD_URI,
+                body=body,
+                success_message="Persons added successfully"
+            )
+            results.extend(self._map_batch_add_results(response, len(chunk)))
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url,
-                    data=body_str,
-                    headers=headers,
-                    ssl=self.verify_ssl,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    response_text = await response.text()
-                    logger.info(f"HikCentral add_person response: {response.status} - {response_text}")
-                    
-                    if response.status == 200:
-                        response_data = await response.json()
-                        if response_data.get("code") == "0":
-                            return {
-                                "success": True,
-                                "data": response_data.get("data", {}),
-                                "message": "Person added successfully"
-                            }
-                        else:
-                            return {
-                                "success": False,
-                                "message": response_data.get("msg", "Unknown error"),
-                                "code": response_data.get("code")
-                            }
-                    else:
-                        return {
-                            "success": False,
-                            "message": f"HTTP {response.status}: {response_text}",
-                            "code": str(response.status)
-                        }
-                        
-        except Exception as e:
-            logger.error(f"Error adding person to HikCentral: {e}")
-            return {
-                "success": False,
-                "message": f"Network error: {str(e)}",
-                "code": "NETWORK_ERROR"
-            }
+        return results
+    
+    def _map_batch_add_results(self, response: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+        """Map a batch add response to per-person results"""
+        if not response.get("success"):
+            return [
+                {"success": False, "message": response.get("message"), "code": response.get("code")}
+                for _ in range(count)
+            ]
+        
+        data = response.get("data") or {}
+        results: List[Dict[str, Any]] = [
+            {"success": False, "message": "No result returned for person", "code": "MISSING_RESULT"}
+            for _ in range(count)
+        ]
+        
+        for item in data.get("successes") or []:
+            index = item.get("clientId")
+            if isinstance(index, int) and 0 <= index < count:
+                results[index] = {
+                    "success": True,
+                    "data": {"personId": item.get("personId")},
+                    "message": "Person added successfully"
+                }
+        
+        for item in data.get("failures") or []:
+            index = item.get("clientId")
+            if isinstance(index, int) and 0 <= index < count:
+                results[index] = {
+                    "success": False,
+                    "message": item.get("msg") or item.get("errorMsg", "Unknown error"),
+                    "code": str(item.get("code") or item.get("errorCode", ""))
+                }
+        
+        return results
     
     async def update_person(self, person_id: str, person_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update person in HikCentral"""
-        uri = "/artemis/api/resource/v1/person/single/update"
-        url = f"{self.base_url}{uri}"
-        
-        # Prepare update data
         update_data = {
             "personId": person_id,
             "personFamilyName": person_data.get("personFamilyName", ""),
@@ -179,222 +724,116 @@ class HikCentralClient:
             "endTime": person_data.get("endTime", "")
         }
         
-        body_str = json.dumps(update_data, separators=(',', ':'))
-        headers = self._build_headers("PUT", uri, body_str)
-        
-        logger.info(f"Requesting: {url}")
-        logger.info(f"Headers: {headers}")
-        logger.info(f"Body: {body_str}")
-        
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.put(
-                    url,
-                    data=body_str,
-                    headers=headers,
-                    ssl=self.verify_ssl,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    response_text = await response.text()
-                    logger.info(f"HikCentral update_person response: {response.status} - {response_text}")
-                    
-                    if response.status == 200:
-                        response_data = await response.json()
-                        if response_data.get("code") == "0":
-                            return {
-                                "success": True,
-                                "data": response_data.get("data", {}),
-                                "message": "Person updated successfully"
-                            }
-                        else:
-                            return {
-                                "success": False,
-                                "message": response_data.get("msg", "Unknown error"),
-                                "code": response_data.get("code")
-                            }
-                    else:
-                        return {
-                            "success": False,
-                            "message": f"HTTP {response.status}: {response_text}",
-                            "code": str(response.status)
-                        }
-                        
-        except Exception as e:
-            logger.error(f"Error updating person in HikCentral: {e}")
-            return {
-                "success": False,
-                "message": f"Network error: {str(e)}",
-                "code": "NETWORK_ERROR"
-            }
+        return await self._request(
+            "update_person", "PUT", PERSON_UPDATE_URI,
+            body=update_data,
+            success_message="Person updated successfully"
+        )
     
     async def delete_person(self, person_id: str) -> Optional[Dict[str, Any]]:
         """Delete person from HikCentral"""
-        uri = "/artemis/api/resource/v1/person/single/delete"
-        url = f"{self.base_url}{uri}"
-        
-        delete_data = {
-            "personId": person_id
-        }
+        return await self._request(
+            "delete_person", "DELETE", PERSON_DELETE_URI,
+            body={"personId": person_id},
+            success_message="Person deleted successfully"
+        )
+    
+    async def delete_persons_batch(self, person_ids: List[str]) -> List[Dict[str, Any]]:
+        """Delete persons from HikCentral in chunks of batch_size.
         
-        body_str = json.dumps(delete_data, separators=(',', ':'))
-        headers = self._build_headers("DELETE", uri, body_str)
+        Returns one result per input person ID, in input order.
+        """
+        results: List[Dict[str, Any]] = []
         
-        logger.info(f"Requesting: {url}")
-        logger.info(f"Headers: {headers}")
-        logger.info(f"Body: {body_str}")
+        for offset in range(0, len(person_ids), self.batch_size):
+            chunk = person_ids[offset:offset + self.batch_size]
+            
+            response = await self._request(
+                "delete_persons_batch", "POST", PERSON_BATCH_DELETE_URI,
+                body={"personIds": chunk},
+                success_message="Persons deleted successfully"
+            )
+            results.extend(self._map_batch_delete_results(response, chunk))
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.delete(
-                    url,
-                    data=body_str,
-                    headers=headers,
-                    ssl=self.verify_ssl,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    response_text = await response.text()
-                    logger.info(f"HikCentral delete_person response: {response.status} - {response_text}")
-                    
-                    if response.status == 200:
-                        response_data = await response.json()
-                        if response_data.get("code") == "0":
-                            return {
-                                "success": True,
-                                "data": response_data.get("data", {}),
-                                "message": "Person deleted successfully"
-                            }
-                        else:
-                            return {
-                                "success": False,
-                                "message": response_data.get("msg", "Unknown error"),
-                                "code": response_data.get("code")
-                            }
-                    else:
-                        return {
-                            "success": False,
-                            "message": f"HTTP {response.status}: {response_text}",
-                            "code": str(response.status)
-                        }
-                        
-        except Exception as e:
-            logger.error(f"Error deleting person from HikCentral: {e}")
-            return {
-                "success": False,
-                "message": f"Network error: {str(e)}",
-                "code": "NETWORK_ERROR"
-            }
+        return results
     
-    async def get_person(self, person_id: str) -> Optional[Dict[str, Any]]:
-        """Get person from HikCentral"""
-        uri = "/artemis/api/resource/v1/person/single/info"
-        url = f"{self.base_url}{uri}"
+    def _map_batch_delete_results(self, response: Dict[str, Any], person_ids: List[str]) -> List[Dict[str, Any]]:
+        """Map a batch delete response to per-person results"""
+        if not response.get("success"):
+            return [
+                {"success": False, "message": response.get("message"), "code": response.get("code")}
+                for _ in person_ids
+            ]
         
-        params = {
-            "personId": person_id
+        # HikCentral only reports the failed IDs
+        data = response.get("data") or {}
+        failures = {
+            item.get("personId"): item
+            for item in (data.get("failures") or [])
+            if isinstance(item, dict)
         }
         
-        headers = self._build_headers("GET", uri)
-        
-        logger.info(f"Requesting: {url}")
-        logger.info(f"Headers: {headers}")
-        logger.info(f"Params: {params}")
+        results = []
+        for person_id in person_ids:
+            failure = failures.get(person_id)
+            if failure is None:
+                results.append({"success": True, "data": {"personId": person_id}, "message": "Person deleted successfully"})
+            else:
+                results.append({
+                    "success": False,
+                    "message": failure.get("msg") or failure.get("errorMsg", "Unknown error"),
+                    "code": str(failure.get("code") or failure.get("errorCode", ""))
+                })
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    url,
-                    params=params,
-                    headers=headers,
-                    ssl=self.verify_ssl,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    response_text = await response.text()
-                    logger.info(f"HikCentral get_person response: {response.status} - {response_text}")
-                    
-                    if response.status == 200:
-                        response_data = await response.json()
-                        if response_data.get("code") == "0":
-                            return {
-                                "success": True,
-                                "data": response_data.get("data", {}),
-                                "message": "Person retrieved successfully"
-                            }
-                        else:
-                            return {
-                                "success": False,
-                                "message": response_data.get("msg", "Unknown error"),
-                                "code": response_data.get("code")
-                            }
-                    else:
-                        return {
-                            "success": False,
-                            "message": f"HTTP {response.status}: {response_text}",
-                            "code": str(response.status)
-                        }
-                        
-        except Exception as e:
-            logger.error(f"Error getting person from HikCentral: {e}")
-            return {
-                "success": False,
-                "message": f"Network error: {str(e)}",
-                "code": "NETWORK_ERROR"
-            }
+        return results
+    
+    async def get_person(self, person_id: str) -> Optional[Dict[str, Any]]:
+        """Get person from HikCentral"""
+        return await self._single_flight.do(
+            ("get_person", person_id),
+            self._request,
+            "get_person", "GET", PERSON_INFO_URI,
+            params={"personId": person_id},
+            success_message="Person retrieved successfully"
+        )
     
     async def generate_qr_code(self, person_id: str, unit_id: str, validity_minutes: int = 60) -> Optional[Dict[str, Any]]:
         """Generate QR code for person in HikCentral"""
-        uri = "/artemis/api/visitor/access/qrCode/generate"
-        url = f"{self.base_url}{uri}"
-        
         qr_data = {
             "personId": person_id,
             "unitId": unit_id,
             "validityMinutes": validity_minutes
         }
         
-        body_str = json.dumps(qr_data, separators=(',', ':'))
-        headers = self._build_headers("POST", uri, body_str)
-        
-        logger.info(f"Requesting: {url}")
-        logger.info(f"Headers: {headers}")
-        logger.info(f"Body: {body_str}")
-        
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url,
-                    data=body_str,
-                    headers=headers,
-                    ssl=self.verify_ssl,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    response_text = await response.text()
-                    logger.info(f"HikCentral generate_qr_code response: {response.status} - {response_text}")
-                    
-                    if response.status == 200:
-                        response_data = await response.json()
-                        if response_data.get("code") == "0":
-                            return {
-                                "success": True,
-                                "data": response_data.get("data", {}),
-                                "message": "QR code generated successfully"
-                            }
-                        else:
-                            return {
-                                "success": False,
-                                "message": response_data.get("msg", "Unknown error"),
-                                "code": response_data.get("code")
-                            }
-                    else:
-                        return {
-                            "success": False,
-                            "message": f"HTTP {response.status}: {response_text}",
-                            "code": str(response.status)
-                        }
-                        
-        except Exception as e:
-            logger.error(f"Error generating QR code in HikCentral: {e}")
-            return {
-                "success": False,
-                "message": f"Network error: {str(e)}",
-                "code": "NETWORK_ERROR"
-            }
\ No newline at end of file
+        return await self._request(
+            "generate_qr_code", "POST", QR_CODE_GENERATE_URI,
+            body=qr_data,
+            success_message="QR code generated successfully"
+        )
+
+
+# Global HikCentral client instance
+hikcentral_client = None
+
+def get_hikcentral_client() -> HikCentralClient:
+    """Get or create the shared HikCentral client"""
+    global hikcentral_client
+    if hikcentral_client is None:
+        hikcentral_client = HikCentralClient()
+    return hikcentral_client
+
+async def initialize_hikcentral_client(redis_client: Optional[redis.Redis] = None) -> HikCentralClient:
+    """Initialize the shared HikCentral client and its connection pool"""
+    client = get_hikcentral_client()
+    if client.rate_limiter is not None:
+        client.rate_limiter.set_redis(redis_client)
+    await client.start()
+    logger.info("HikCentral client initialized")
+    return client
+
+async def close_hikcentral_client():
+    """Close the shared HikCentral client connection pool"""
+    global hikcentral_client
+    if hikcentral_client is not None:
+        await hikcentral_client.close()
+        hikcentral_client = None
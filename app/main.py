@@ -1,17 +1,23 @@
-from fastapi import FastAPI, HTTPException, Depends, Header, status
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Depends, Header, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 import redis.asyncio as redis
+import io
+import csv
+import math
 import logging
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any
 
 from app.config import settings
-from app.models import ResidentMapping, SyncLog, QrCode, get_db, create_database_engine, test_database_connection
+from app.models import ResidentMapping, SyncLog, QrCode, get_db, open_session, create_database_engine, test_database_connection
 from app.resident_service import ResidentService
-from app.circuit_breaker import initialize_circuit_breaker
+from app.container import ServiceContainer, get_container, get_resident_service, initialize_container, close_container
+from app.timeouts import set_request_deadline, reset_request_deadline
+from app.cursors import InvalidCursorError, encode_cursor, decode_cursor
+from app.resident_index import RESIDENT_FIELDS
 
 # Configure logging
 logging.basicConfig(
@@ -33,6 +39,30 @@ app = FastAPI(
 redis_client = None
 database_engine = None
 
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    """Bound each request's time budget; downstream HikCentral calls never outlive it"""
+    budget = settings.request_timeout
+    if request.url.path == "/api/v1/residents/bulk":
+        # Large imports run for minutes; each HikCentral batch gets its own deadline within this one
+        budget = settings.bulk_import_timeout
+    budget = budget if budget > 0 else None
+    header = request.headers.get("X-Request-Timeout")
+    if header:
+        try:
+            requested = float(header)
+        except ValueError:
+            requested = None
+        # Clients may only shorten the budget; zero, negative, nan and inf are ignored
+        if requested is not None and math.isfinite(requested) and requested > 0:
+            budget = min(budget, requested) if budget is not None else requested
+    
+    token = set_request_deadline(budget)
+    try:
+        return await call_next(request)
+    finally:
+        reset_request_deadline(token)
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
@@ -64,20 +94,23 @@ async def startup_event():
         await redis_client.ping()
         logger.info("✅ Redis connected successfully")
         
-        # Initialize circuit breaker
-        await initialize_circuit_breaker(redis_client)
-        logger.info("✅ Circuit breaker initialized")
-        
     except Exception as e:
         logger.warning(f"⚠️ Redis connection failed: {e}")
-        logger.info("💡 Circuit breaker will use in-memory fallback")
-        await initialize_circuit_breaker(None)
+        logger.info("💡 Circuit breakers will run in memory until Redis is reachable")
+    
+    # Build the shared services: HikCentral connection pool, circuit breakers and resident service
+    logger.info("🔌 Initializing services...")
+    await initialize_container(redis_client, database_engine)
+    logger.info("✅ HikCentral connection pool and circuit breakers ready")
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("🛑 Shutting down Hydepark Lyve Middleware...")
     
+    await close_container()
+    logger.info("✅ HikCentral connection pool closed")
+    
     if redis_client:
         await redis_client.close()
         logger.info("✅ Redis connection closed")
@@ -147,13 +180,67 @@ async def health_check():
     
     return health_status
 
+@app.get("/api/v1/hikcentral/stats")
+async def hikcentral_stats(
+    api_key: str = Depends(verify_api_key),
+    container: ServiceContainer = Depends(get_container)
+):
+    """HikCentral client statistics"""
+    client = container.hikcentral_client
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "pool": client.get_pool_stats(),
+        "operations": client.get_metrics(),
+        "retries": client.get_retry_stats(),
+        "bulkheads": client.get_bulkhead_stats(),
+        "rate_limit": client.get_rate_limit_stats(),
+        "coalescing": client.get_coalescing_stats(),
+        "timeouts": client.get_timeout_stats()
+    }
+
+@app.get("/api/v1/circuit-breakers")
+async def circuit_breaker_states(
+    api_key: str = Depends(verify_api_key),
+    container: ServiceContainer = Depends(get_container)
+):
+    """State of every HikCentral circuit breaker"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "breakers": container.circuit_breakers.get_stats()
+    }
+
+@app.get("/api/v1/cache/stats")
+async def cache_stats(
+    api_key: str = Depends(verify_api_key),
+    container: ServiceContainer = Depends(get_container)
+):
+    """Resident lookup cache statistics"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "resident_index": container.resident_index.get_stats() if container.resident_index is not None else {"enabled": False},
+        "resident_cache": container.resident_cache.get_stats() if container.resident_cache is not None else {"backend": "disabled"}
+    }
+
+@app.get("/api/v1/audit/stats")
+async def audit_stats(
+    api_key: str = Depends(verify_api_key),
+    container: ServiceContainer = Depends(get_container)
+):
+    """Sync log writer statistics"""
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "sync_log": container.sync_log_writer.get_stats() if container.sync_log_writer is not None else {"mode": "inline"},
+        "retention": container.sync_log_retention.get_stats() if container.sync_log_retention is not None else {"enabled": False}
+    }
+
 # API Endpoints as specified in MVP
 
 @app.post("/api/v1/residents/check")
 async def check_resident(
     request: Dict[str, Any],
     api_key: str = Depends(verify_api_key),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    service: ResidentService = Depends(get_resident_service)
 ):
     """
     Check if resident exists in local database
@@ -172,8 +259,7 @@ async def check_resident(
         
         logger.info(f"🔍 Checking resident: {email}@{community}")
         
-        service = ResidentService(db)
-        resident = await service.check_resident(email, community)
+        resident = await service.check_resident(db, email, community)
         
         if not resident:
             logger.warning(f"❌ Resident not found: {email}@{community}")
@@ -183,7 +269,7 @@ async def check_resident(
             )
         
         logger.info(f"✅ Resident found: {email}@{community}")
-        return resident.to_dict()
+        return resident
         
     except HTTPException:
         raise
@@ -198,7 +284,8 @@ async def check_resident(
 async def create_resident(
     request: Dict[str, Any],
     api_key: str = Depends(verify_api_key),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    service: ResidentService = Depends(get_resident_service)
 ):
     """
     Create resident
@@ -217,11 +304,16 @@ async def create_resident(
         
         logger.info(f"👤 Creating resident: {request['email']}@{request['community']}")
         
-        service = ResidentService(db)
-        result = await service.create_resident(request)
+        result = await service.create_resident(db, request)
         
         if not result["success"]:
-            if result.get("status_code") == 409:
+            if result.get("status_code") == 400:
+                logger.warning(f"⚠️ Invalid resident: {result['error']}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=result["error"]
+                )
+            elif result.get("status_code") == 409:
                 logger.warning(f"⚠️ Resident already exists: {request['email']}@{request['community']}")
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT,
@@ -233,6 +325,12 @@ async def create_resident(
                     status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                     detail=result["error"]
                 )
+            elif result.get("status_code") == 504:
+                logger.error(f"⏱️ Request deadline exceeded: {result['error']}")
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail=result["error"]
+                )
             else:
                 logger.error(f"❌ Failed to create resident: {result['error']}")
                 raise HTTPException(
@@ -252,11 +350,216 @@ async def create_resident(
             detail="Internal server error"
         )
 
+@app.post("/api/v1/residents/bulk")
+async def bulk_create_residents(
+    request: Dict[str, Any],
+    api_key: str = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db),
+    service: ResidentService = Depends(get_resident_service)
+):
+    """
+    Bulk import residents
+    Input: {"residents": [{"name": "...", "email": "...", "community": "...", ...}, ...]}, same fields as create
+    Output: {"success": ..., "total": ..., "created": ..., "failed": ..., "results": [...]}, one result per resident in input order
+    """
+    try:
+        residents = request.get("residents")
+        
+        if not isinstance(residents, list) or not residents:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="residents must be a non-empty list"
+            )
+        if len(residents) > settings.bulk_import_max_residents:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"At most {settings.bulk_import_max_residents} residents per request"
+            )
+        if not all(isinstance(resident, dict) for resident in residents):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Each resident must be an object"
+            )
+        
+        logger.info(f"👥 Bulk importing {len(residents)} residents")
+        
+        result = await service.create_residents(db, residents)
+        
+        logger.info(f"✅ Bulk import finished: {result['created']} created, {result['failed']} failed")
+        return JSONResponse(
+            status_code=status.HTTP_201_CREATED if result["success"] else status.HTTP_207_MULTI_STATUS,
+            content=result
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error importing residents: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@app.get("/api/v1/residents")
+async def list_residents(
+    community: Optional[str] = None,
+    unit_id: Optional[str] = None,
+    owner_type: Optional[str] = None,
+    valid_from: Optional[datetime] = None,
+    valid_to: Optional[datetime] = None,
+    active: Optional[bool] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    api_key: str = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db),
+    service: ResidentService = Depends(get_resident_service)
+):
+    """
+    List resident mappings, ordered by community then id
+    Query: community, unit_id, owner_type, valid_from/valid_to (validity overlapping the window), active,
+           limit, cursor (next_cursor of the previous page), include_total (approximate count of all matches)
+    Output: {"success": true, "count": n, "residents": [...], "next_cursor": "..." or null}
+    """
+    try:
+        if limit is None:
+            limit = settings.resident_page_size
+        if not 1 <= limit <= settings.resident_page_size_max:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"limit must be between 1 and {settings.resident_page_size_max}"
+            )
+        
+        # Validity dates are stored as naive UTC
+        valid_from, valid_to = (
+            value.astimezone(timezone.utc).replace(tzinfo=None) if value is not None and value.tzinfo else value
+            for value in (valid_from, valid_to)
+        )
+        if valid_from is not None and valid_to is not None and valid_from > valid_to:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="valid_from must not be after valid_to"
+            )
+        
+        after = None
+        if cursor:
+            try:
+                position = decode_cursor(cursor)
+                after = (position["community"], position["id"])
+            except (InvalidCursorError, KeyError):
+                after = None
+            if after is None or not isinstance(after[0], str) or not isinstance(after[1], int):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid cursor"
+                )
+        
+        page = await service.list_residents(
+            db,
+            community=community,
+            unit_id=unit_id,
+            owner_type=owner_type,
+            valid_from=valid_from,
+            valid_to=valid_to,
+            active=active,
+            after=after,
+            limit=limit,
+            include_total=include_total
+        )
+        
+        response = {
+            "success": True,
+            "count": len(page["residents"]),
+            "limit": limit,
+            "residents": page["residents"],
+            "next_cursor": encode_cursor({"community": page["next"][0], "id": page["next"][1]}) if page["next"] else None
+        }
+        if include_total:
+            response["approximate_total"] = page["approximate_total"]
+        return response
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error listing residents: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@app.get("/api/v1/residents/export")
+async def export_residents(
+    format: str = "ndjson",
+    community: Optional[str] = None,
+    active: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    api_key: str = Depends(verify_api_key),
+    service: ResidentService = Depends(get_resident_service)
+):
+    """
+    Export resident mappings as a stream
+    Query: format=ndjson|csv, community, active, cursor (to resume an interrupted export)
+    Output: one resident per line in id order; each carries the cursor that resumes after it
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format must be ndjson or csv"
+        )
+    
+    after_id = None
+    if cursor:
+        try:
+            after_id = int(decode_cursor(cursor)["id"])
+        except (InvalidCursorError, KeyError, TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+    
+    logger.info(f"📤 Exporting residents: community={community} active={active} format={format} resume={after_id is not None}")
+    
+    async def stream():
+        # The request's session may be closed before the body is sent, so the export opens its own
+        async with open_session() as db:
+            try:
+                if format == "csv":
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    writer.writerow(list(RESIDENT_FIELDS) + ["cursor"])
+                    yield buffer.getvalue()
+                
+                async for batch in service.export_residents(db, community, active, after_id, settings.export_batch_size):
+                    if format == "csv":
+                        buffer = io.StringIO()
+                        writer = csv.writer(buffer)
+                        writer.writerows(
+                            [resident.get(field) for field in RESIDENT_FIELDS] + [encode_cursor({"id": resident["id"]})]
+                            for resident in batch
+                        )
+                        yield buffer.getvalue()
+                    else:
+                        yield "".join(
+                            json.dumps(dict(resident, cursor=encode_cursor({"id": resident["id"]}))) + "\n"
+                            for resident in batch
+                        )
+            except Exception as e:
+                # Headers are already sent; the client sees a truncated stream and resumes from its last cursor
+                logger.error(f"❌ Resident export failed: {e}")
+                raise
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename=residents.{format}"}
+    )
+
 @app.delete("/api/v1/residents/")
 async def delete_resident(
     request: Dict[str, Any],
     api_key: str = Depends(verify_api_key),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    service: ResidentService = Depends(get_resident_service)
 ):
     """
     Delete resident
@@ -275,8 +578,7 @@ async def delete_resident(
         
         logger.info(f"🗑️ Deleting resident: {owner_id}@{unit_id}")
         
-        service = ResidentService(db)
-        result = await service.delete_resident(owner_id, unit_id)
+        result = await service.delete_resident(db, owner_id, unit_id)
         
         if not result["success"]:
             if result.get("status_code") == 404:
@@ -291,6 +593,12 @@ async def delete_resident(
                     status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                     detail=result["error"]
                 )
+            elif result.get("status_code") == 504:
+                logger.error(f"⏱️ Request deadline exceeded: {result['error']}")
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail=result["error"]
+                )
             else:
                 logger.error(f"❌ Failed to delete resident: {result['error']}")
                 raise HTTPException(
@@ -314,7 +622,8 @@ async def delete_resident(
 async def generate_qr_code(
     request: Dict[str, Any],
     api_key: str = Depends(verify_api_key),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    service: ResidentService = Depends(get_resident_service)
 ):
     """
     Generate QR code for resident
@@ -334,8 +643,7 @@ async def generate_qr_code(
         
         logger.info(f"📱 Generating QR code for: {owner_id}@{unit_id}")
         
-        service = ResidentService(db)
-        result = await service.generate_qr_code(unit_id, owner_id, validity_minutes)
+        result = await service.generate_qr_code(db, unit_id, owner_id, validity_minutes)
         
         if not result["success"]:
             if result.get("status_code") == 404:
@@ -350,6 +658,12 @@ async def generate_qr_code(
                     status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                     detail=result["error"]
                 )
+            elif result.get("status_code") == 504:
+                logger.error(f"⏱️ Request deadline exceeded: {result['error']}")
+                raise HTTPException(
+                    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                    detail=result["error"]
+                )
             else:
                 logger.error(f"❌ Failed to generate QR code: {result['error']}")
                 raise HTTPException(
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Index
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, Index, text, func, literal_column, case
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
@@ -6,12 +6,23 @@ import uuid
 
 Base = declarative_base()
 
+def validity_range(from_date, to_date):
+    """Inclusive tsrange over a validity window; a None bound is open-ended"""
+    return func.tsrange(from_date, to_date, literal_column("'[]'"))
+
+def stored_validity_range(from_date, to_date):
+    """validity_range of stored rows; an inverted row is an empty range (never valid) rather than an error.
+    
+    Window filters must use this same expression to match idx_validity_range.
+    """
+    return case((from_date > to_date, literal_column("'empty'::tsrange")), else_=validity_range(from_date, to_date))
+
 class ResidentMapping(Base):
     __tablename__ = "resident_mappings"
     
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), nullable=False, index=True)
-    community = Column(String(255), nullable=False, index=True)
+    community = Column(String(255), nullable=False)
     hikcentral_person_id = Column(String(255), nullable=False, unique=True, index=True)
     owner_id = Column(String(255), nullable=False, unique=True, index=True)
     unit_id = Column(String(255), nullable=False)
@@ -36,7 +47,12 @@ class ResidentMapping(Base):
     __table_args__ = (
         Index('idx_email_community', 'email', 'community', unique=True),
         Index('idx_owner_id', 'owner_id'),
-        Index('idx_unit_id', 'unit_id'),
+        # Listing filters, each followed by the (community, id) keyset order. These replace the
+        # single-column community and idx_unit_id indexes, which they cover as leading columns
+        Index('idx_community_id', 'community', 'id'),
+        Index('idx_unit_community_id', 'unit_id', 'community', 'id'),
+        Index('idx_owner_type_community_id', 'owner_type', 'community', 'id'),
+        Index('idx_validity_range', stored_validity_range(from_date, to_date), postgresql_using='gist'),
     )
     
     def to_dict(self):
@@ -60,14 +76,16 @@ class ResidentMapping(Base):
         }
 
 class SyncLog(Base):
+    """Audit trail, range-partitioned by created_at (see app/sync_log_partitions.py)"""
     __tablename__ = "sync_logs"
     
-    id = Column(Integer, primary_key=True, index=True)
-    operation = Column(String(50), nullable=False, index=True)  # CREATE, UPDATE, DELETE, CHECK, QR_CODE
-    email = Column(String(255), nullable=True, index=True)
-    community = Column(String(255), nullable=True, index=True)
-    owner_id = Column(String(255), nullable=True, index=True)
-    unit_id = Column(String(255), nullable=True, index=True)
+    # The partition key must be part of the primary key
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    operation = Column(String(50), nullable=False)  # CREATE, UPDATE, DELETE, CHECK, QR_CODE
+    email = Column(String(255), nullable=True)
+    community = Column(String(255), nullable=True)
+    owner_id = Column(String(255), nullable=True)
+    unit_id = Column(String(255), nullable=True)
     
     # Request/response data
     request_data = Column(Text, nullable=True)
@@ -76,13 +94,28 @@ class SyncLog(Base):
     error_message = Column(Text, nullable=True)
     
     # HikCentral specific
-    hikcentral_person_id = Column(String(255), nullable=True, index=True)
+    hikcentral_person_id = Column(String(255), nullable=True)
     hikcentral_response = Column(Text, nullable=True)
     
     # Timing and performance
-    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
     response_time_ms = Column(Integer, nullable=True)
     
+    # Indexes follow the audit queries: one resident's or owner's history, recent
+    # failures and time ranges. Partition pruning narrows every query by created_at
+    # first, so a compact BRIN index is enough for plain time scans.
+    __table_args__ = (
+        Index('idx_sync_logs_email_community_created', 'email', 'community', 'created_at'),
+        Index('idx_sync_logs_owner_created', 'owner_id', 'created_at'),
+        Index(
+            'idx_sync_logs_failures_created',
+            'created_at',
+            postgresql_where=text('status_code >= 400')
+        ),
+        Index('idx_sync_logs_created_brin', 'created_at', postgresql_using='brin'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+    
     def to_dict(self):
         return {
             "id": self.id,
@@ -168,6 +201,10 @@ async def get_db():
         finally:
             await session.close()
 
+def open_session() -> AsyncSession:
+    """New session outside a request's dependency scope, e.g. for a streaming response that outlives it"""
+    return AsyncSessionLocal()
+
 async def test_database_connection():
     """Test database connectivity"""
     try:
@@ -0,0 +1,165 @@
+import asyncio
+import time
+import logging
+from typing import Optional, Dict, Any
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+# Token bucket with reservations, evaluated atomically inside Redis.
+# Callers that find the bucket empty borrow a future token (the balance goes
+# negative) and are told how long to wait, so each call costs exactly one
+# round trip and waiting callers are served in arrival order. A caller whose
+# wait would exceed max_wait is rejected without taking a token.
+#
+# KEYS[1] = bucket key
+# ARGV[1] = refill rate (tokens per second)
+# ARGV[2] = capacity (burst)
+# ARGV[3] = max wait in milliseconds
+# Returns {allowed (1/0), wait_ms}
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local max_wait_ms = tonumber(ARGV[3])
+
+local time = redis.call('TIME')
+local now_ms = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now_ms
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now_ms - ts) * rate / 1000)
+
+local wait_ms = 0
+if tokens < 1 then
+    wait_ms = math.ceil((1 - tokens) * 1000 / rate)
+    if wait_ms > max_wait_ms then
+        redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now_ms)
+        redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + max_wait_ms + 1000)
+        return {0, wait_ms}
+    end
+end
+
+tokens = tokens - 1
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now_ms)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + max_wait_ms + 1000)
+return {1, wait_ms}
+"""
+
+class RateLimitExceededError(Exception):
+    """Raised when a call would have to wait longer than allowed for a token"""
+
+class LocalTokenBucket:
+    """In-process token bucket with the same reservation semantics as the Redis script"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Take a token, returning the seconds to wait for it, or None if the wait exceeds max_wait"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+        wait = 0.0
+        if self._tokens < 1:
+            wait = (1 - self._tokens) / self.rate
+            if wait > max_wait:
+                return None
+
+        self._tokens -= 1
+        return wait
+
+class DistributedRateLimiter:
+    """Cluster-wide token bucket in Redis, falling back to a local bucket when Redis is unavailable"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_wait: float,
+        local_share: int = 1,
+        redis_client: Optional[redis.Redis] = None,
+        key: str = "rate_limit:hikcentral",
+        redis_retry_interval: float = 5.0
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.key = key
+        self.redis_retry_interval = redis_retry_interval
+        # Without Redis each worker only gets its share of the cluster limit
+        share = max(1, local_share)
+        self._local_bucket = LocalTokenBucket(rate / share, max(1.0, burst / share))
+        self._redis_client = None
+        self._script = None
+        self._redis_down_until = 0.0
+        self._stats = {
+            "acquired": 0,
+            "rejected": 0,
+            "delayed": 0,
+            "total_wait_ms": 0.0,
+            "redis_errors": 0,
+            "local_fallbacks": 0,
+        }
+        self.set_redis(redis_client)
+
+    def set_redis(self, redis_client: Optional[redis.Redis]):
+        """Attach (or detach) the shared Redis client"""
+        self._redis_client = redis_client
+        self._script = redis_client.register_script(TOKEN_BUCKET_SCRIPT) if redis_client else None
+        self._redis_down_until = 0.0
+
+    async def _reserve(self, max_wait: float) -> Optional[float]:
+        """Reserve a token in Redis if available, otherwise locally"""
+        if self._script is not None and time.monotonic() >= self._redis_down_until:
+            try:
+                allowed, wait_ms = await self._script(
+                    keys=[self.key],
+                    args=[self.rate, self.burst, int(max_wait * 1000)]
+                )
+                return int(wait_ms) / 1000 if int(allowed) else None
+            except Exception as e:
+                self._stats["redis_errors"] += 1
+                self._redis_down_until = time.monotonic() + self.redis_retry_interval
+                logger.warning(f"Rate limiter Redis unavailable, using local bucket for {self.redis_retry_interval}s: {e}")
+
+        self._stats["local_fallbacks"] += 1
+        return self._local_bucket.reserve(max_wait)
+
+    async def acquire(self, max_wait: Optional[float] = None):
+        """Wait for a token, raising RateLimitExceededError if it is too far away.
+
+        max_wait can only shorten the configured limit, e.g. to the caller's remaining deadline.
+        """
+        max_wait = self.max_wait if max_wait is None else max(0.0, min(self.max_wait, max_wait))
+        wait = await self._reserve(max_wait)
+        if wait is None:
+            self._stats["rejected"] += 1
+            raise RateLimitExceededError(f"HikCentral rate limit exceeded (max wait {max_wait:.3g}s)")
+
+        self._stats["acquired"] += 1
+        if wait > 0:
+            self._stats["delayed"] += 1
+            self._stats["total_wait_ms"] += wait * 1000
+            await asyncio.sleep(wait)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return rate limiter statistics"""
+        stats = {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "max_wait": self.max_wait,
+            "backend": "redis" if self._script is not None and time.monotonic() >= self._redis_down_until else "local",
+        }
+        stats.update(self._stats)
+        stats["total_wait_ms"] = round(self._stats["total_wait_ms"], 2)
+        return stats
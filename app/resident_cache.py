@@ -0,0 +1,204 @@
+import json
+import time
+import logging
+from typing import Optional, Dict, Any, Iterable, Tuple
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+# Resident lookups are cached per (email, community) under a per-community
+# version, so bumping the version flushes every entry of a community at once;
+# stale entries are never read again and simply expire.
+#
+# Each entry also has a generation, bumped by every invalidation. A reader
+# fills the cache only if the generation is still the one it saw before
+# reading the database, so a fill racing a write cannot store the old row.
+#
+# KEYS[1] = community version key
+# KEYS[2] = entry generation key
+# ARGV[1] = entry key prefix (up to the version)
+# ARGV[2] = entry key suffix (after the version)
+# Returns {version, generation, cached value or false}
+LOOKUP_SCRIPT = """
+local version = redis.call('GET', KEYS[1]) or '0'
+local generation = redis.call('GET', KEYS[2]) or '0'
+return {version, generation, redis.call('GET', ARGV[1] .. version .. ARGV[2])}
+"""
+
+# KEYS[1] = entry generation key
+# ARGV[1] = generation seen by the lookup
+# ARGV[2] = entry key
+# ARGV[3] = value
+# ARGV[4] = ttl in seconds
+# Returns 1 if stored, 0 if an invalidation happened since the lookup
+FILL_SCRIPT = """
+if (redis.call('GET', KEYS[1]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', ARGV[2], ARGV[3], 'EX', ARGV[4])
+return 1
+"""
+
+# Same keys and prefix/suffix as LOOKUP_SCRIPT, plus ARGV[3] = generation ttl in seconds;
+# bumps the generation and drops the entry under the current version
+INVALIDATE_SCRIPT = """
+local version = redis.call('GET', KEYS[1]) or '0'
+redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return redis.call('DEL', ARGV[1] .. version .. ARGV[2])
+"""
+
+# Cached value recorded for a resident that does not exist
+MISSING = "null"
+
+class ResidentCache:
+    """Read-through Redis cache of resident records keyed by (email, community).
+    
+    Misses are cached too, for a shorter TTL. Redis errors never fail a lookup:
+    the cache steps aside for redis_retry_interval seconds and callers read the
+    database directly.
+    """
+    
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis],
+        ttl: int = 300,
+        negative_ttl: int = 30,
+        prefix: str = "resident_cache",
+        redis_retry_interval: float = 5.0
+    ):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.prefix = prefix
+        self.redis_retry_interval = redis_retry_interval
+        self._lookup_script = redis_client.register_script(LOOKUP_SCRIPT) if redis_client else None
+        self._fill_script = redis_client.register_script(FILL_SCRIPT) if redis_client else None
+        self._invalidate_script = redis_client.register_script(INVALIDATE_SCRIPT) if redis_client else None
+        self._redis_down_until = 0.0
+        self._stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "stale_fills_skipped": 0,
+            "invalidations": 0,
+            "community_flushes": 0,
+            "redis_errors": 0,
+        }
+    
+    @property
+    def enabled(self) -> bool:
+        """Whether Redis should be tried for the next operation"""
+        return self.redis_client is not None and time.monotonic() >= self._redis_down_until
+    
+    def _redis_failed(self, error: Exception):
+        self._stats["redis_errors"] += 1
+        self._redis_down_until = time.monotonic() + self.redis_retry_interval
+        logger.warning(f"Resident cache Redis unavailable, reading the database for {self.redis_retry_interval}s: {error}")
+    
+    def version_key(self, community: str) -> str:
+        return f"{self.prefix}:version:{community}"
+    
+    def generation_key(self, email: str, community: str) -> str:
+        return f"{self.prefix}:generation:{community}:{email}"
+    
+    def _entry_key_parts(self, email: str, community: str) -> Tuple[str, str]:
+        return f"{self.prefix}:{community}:v", f":{email}"
+    
+    async def get(self, email: str, community: str) -> Tuple[bool, Optional[Dict[str, Any]], Optional[Tuple[str, str]]]:
+        """Look up a resident, returning (hit, resident or None for a cached miss, fill token).
+        
+        The fill token is the (version, generation) seen by this lookup; pass it to set().
+        """
+        if not self.enabled:
+            return False, None, None
+        
+        try:
+            version, generation, value = await self._lookup_script(
+                keys=[self.version_key(community), self.generation_key(email, community)],
+                args=list(self._entry_key_parts(email, community))
+            )
+        except Exception as e:
+            self._redis_failed(e)
+            return False, None, None
+        
+        if value is None:
+            self._stats["misses"] += 1
+            return False, None, (version, generation)
+        if value == MISSING:
+            self._stats["negative_hits"] += 1
+            return True, None, (version, generation)
+        self._stats["hits"] += 1
+        return True, json.loads(value), (version, generation)
+    
+    async def set(self, email: str, community: str, resident: Optional[Dict[str, Any]], token: Optional[Tuple[str, str]]) -> bool:
+        """Store a lookup result, unless the resident was invalidated since the lookup that returned token.
+        
+        Returns whether the result was stored; False also when Redis could not be asked.
+        """
+        if token is None or not self.enabled:
+            return False
+        
+        version, generation = token
+        prefix, suffix = self._entry_key_parts(email, community)
+        if resident is None:
+            value, ttl = MISSING, self.negative_ttl
+        else:
+            value, ttl = json.dumps(resident), self.ttl
+        try:
+            stored = await self._fill_script(
+                keys=[self.generation_key(email, community)],
+                args=[generation, prefix + version + suffix, value, ttl]
+            )
+        except Exception as e:
+            self._redis_failed(e)
+            return False
+        if int(stored):
+            self._stats["stores"] += 1
+            return True
+        self._stats["stale_fills_skipped"] += 1
+        return False
+    
+    async def invalidate(self, email: str, community: str):
+        """Drop the cached lookup for one resident"""
+        if not self.enabled:
+            return
+        
+        try:
+            # The generation only has to outlive fills that started before this write
+            await self._invalidate_script(
+                keys=[self.version_key(community), self.generation_key(email, community)],
+                args=list(self._entry_key_parts(email, community)) + [max(self.ttl, self.negative_ttl)]
+            )
+            self._stats["invalidations"] += 1
+        except Exception as e:
+            self._redis_failed(e)
+    
+    async def invalidate_communities(self, communities: Iterable[str]):
+        """Flush every cached lookup of the given communities by bumping their versions"""
+        communities = set(communities)
+        if not communities or not self.enabled:
+            return
+        
+        try:
+            async with self.redis_client.pipeline(transaction=False) as pipe:
+                for community in communities:
+                    pipe.incr(self.version_key(community))
+                await pipe.execute()
+            self._stats["community_flushes"] += len(communities)
+        except Exception as e:
+            self._redis_failed(e)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return cache statistics"""
+        lookups = self._stats["hits"] + self._stats["negative_hits"] + self._stats["misses"]
+        hits = self._stats["hits"] + self._stats["negative_hits"]
+        stats = {
+            "backend": "redis" if self.enabled else "disabled",
+            "ttl": self.ttl,
+            "negative_ttl": self.negative_ttl,
+            "hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
+        stats.update(self._stats)
+        return stats
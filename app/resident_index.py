@@ -0,0 +1,260 @@
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Iterable, Tuple
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "resident_index:invalidate"
+
+# Record fields in ResidentMapping.to_dict order; entries store their values as a tuple
+RESIDENT_FIELDS = (
+    "id", "email", "community", "hikcentral_person_id", "owner_id", "unit_id",
+    "name", "first_name", "last_name", "phone", "owner_type",
+    "from_date", "to_date", "is_active", "created_at", "updated_at",
+)
+_EMAIL = RESIDENT_FIELDS.index("email")
+_COMMUNITY = RESIDENT_FIELDS.index("community")
+_UNIT_ID = RESIDENT_FIELDS.index("unit_id")
+
+class _Entry:
+    __slots__ = ("values", "expires_at", "size")
+    
+    def __init__(self, values: Tuple[Any, ...], expires_at: float, size: int):
+        self.values = values
+        self.expires_at = expires_at
+        self.size = size
+
+def _record_size(values: Tuple[Any, ...]) -> int:
+    """Approximate bytes held by an entry's values"""
+    return sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+
+class ResidentIndex:
+    """Bounded in-process LRU of resident records, looked up by (email, community) or (owner_id, unit_id).
+    
+    Entries expire after ttl seconds and the least recently used are evicted
+    beyond max_entries or max_bytes. Writes on any worker are broadcast over
+    Redis pub/sub so every worker drops its copy; after losing the subscription
+    the index is cleared, since invalidations may have been missed.
+    
+    Every invalidation also bumps a generation. A reader takes fill_token()
+    before going to Redis or the database and passes it to put(), which
+    refuses the record if anything was invalidated in between, so a fill
+    racing a write cannot bring the old row back.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl: float = 60.0,
+        redis_client: Optional[redis.Redis] = None,
+        redis_retry_interval: float = 5.0
+    ):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self.redis_retry_interval = redis_retry_interval
+        self.worker_id = uuid.uuid4().hex
+        # Keyed by owner_id, which is unique; (email, community) resolves through _by_email
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_email: Dict[Tuple[str, str], str] = {}
+        self._bytes = 0
+        # Bumped by every invalidation, local or remote
+        self._generation = 0
+        self._listener_task: Optional[asyncio.Task] = None
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "remote_invalidations": 0,
+            "stale_fills_skipped": 0,
+            "publish_errors": 0,
+        }
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _lookup(self, owner_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(owner_id) if owner_id is not None else None
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            self._remove(owner_id)
+            return None
+        self._entries.move_to_end(owner_id)
+        self._stats["hits"] += 1
+        return dict(zip(RESIDENT_FIELDS, entry.values))
+    
+    def get_by_email(self, email: str, community: str) -> Optional[Dict[str, Any]]:
+        """Cached record for (email, community), or None"""
+        return self._lookup(self._by_email.get((email, community)))
+    
+    def get_by_owner(self, owner_id: str, unit_id: str) -> Optional[Dict[str, Any]]:
+        """Cached record for (owner_id, unit_id), or None"""
+        entry = self._entries.get(owner_id)
+        if entry is not None and entry.values[_UNIT_ID] != unit_id:
+            self._stats["misses"] += 1
+            return None
+        return self._lookup(owner_id)
+    
+    def fill_token(self) -> int:
+        """Token to take before reading a record elsewhere; pass it to put()"""
+        return self._generation
+    
+    def put(self, record: Dict[str, Any], token: Optional[int] = None):
+        """Cache an active resident record, evicting the least recently used beyond the limits.
+        
+        With a token from fill_token(), the record is dropped if anything was invalidated since.
+        """
+        owner_id = record.get("owner_id")
+        if owner_id is None or not record.get("is_active", True):
+            return
+        if token is not None and token != self._generation:
+            self._stats["stale_fills_skipped"] += 1
+            return
+        
+        self._remove(owner_id)
+        values = tuple(record.get(field) for field in RESIDENT_FIELDS)
+        entry = _Entry(values, time.monotonic() + self.ttl, _record_size(values))
+        self._entries[owner_id] = entry
+        self._by_email[(record.get("email"), record.get("community"))] = owner_id
+        self._bytes += entry.size
+        
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats["evictions"] += 1
+    
+    def _remove(self, owner_id: str):
+        entry = self._entries.pop(owner_id, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        email_key = (entry.values[_EMAIL], entry.values[_COMMUNITY])
+        if self._by_email.get(email_key) == owner_id:
+            del self._by_email[email_key]
+    
+    def discard(self, email: Optional[str] = None, community: Optional[str] = None, owner_id: Optional[str] = None):
+        """Drop a resident from this worker's index"""
+        # Bumped even if the resident is not indexed yet: a fill may be on its way
+        self._generation += 1
+        if owner_id is None and email is not None:
+            owner_id = self._by_email.get((email, community))
+        if owner_id is not None and owner_id in self._entries:
+            self._remove(owner_id)
+            self._stats["invalidations"] += 1
+    
+    def discard_communities(self, communities: Iterable[str]):
+        """Drop every resident of the given communities from this worker's index"""
+        communities = set(communities)
+        self._generation += 1
+        for owner_id in [key for key, entry in self._entries.items() if entry.values[_COMMUNITY] in communities]:
+            self._remove(owner_id)
+            self._stats["invalidations"] += 1
+    
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+        self._by_email.clear()
+        self._bytes = 0
+    
+    async def invalidate(self, email: Optional[str] = None, community: Optional[str] = None, owner_id: Optional[str] = None):
+        """Drop a resident here and on every other worker"""
+        self.discard(email, community, owner_id)
+        await self._publish({"email": email, "community": community, "owner_id": owner_id})
+    
+    async def invalidate_communities(self, communities: Iterable[str]):
+        """Drop whole communities here and on every other worker"""
+        communities = sorted(set(communities))
+        if not communities:
+            return
+        self.discard_communities(communities)
+        await self._publish({"communities": communities})
+    
+    async def _publish(self, message: Dict[str, Any]):
+        if not self.redis_client:
+            return
+        try:
+            await self.redis_client.publish(INVALIDATION_CHANNEL, json.dumps(dict(message, origin=self.worker_id)))
+        except Exception as e:
+            # Other workers fall back on the TTL
+            self._stats["publish_errors"] += 1
+            logger.warning(f"Resident index invalidation could not be published: {e}")
+    
+    async def start(self):
+        """Follow invalidations published by other workers"""
+        if self.redis_client and self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+    
+    async def stop(self):
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+    
+    async def _listen(self):
+        """Apply invalidations from other workers, resubscribing after connection loss"""
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Invalidations may have been missed while unsubscribed
+                self.clear()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=30.0)
+                    if message is not None:
+                        self._dispatch(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Resident index listener error, resubscribing in {self.redis_retry_interval}s: {e}")
+                await asyncio.sleep(self.redis_retry_interval)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+    
+    def _dispatch(self, data: Any):
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed resident index invalidation: {data!r}")
+            return
+        
+        if message.get("origin") == self.worker_id:
+            return
+        self._stats["remote_invalidations"] += 1
+        if "communities" in message:
+            self.discard_communities(message["communities"])
+        else:
+            self.discard(message.get("email"), message.get("community"), message.get("owner_id"))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return index size, memory and hit-rate statistics"""
+        lookups = self._stats["hits"] + self._stats["misses"]
+        stats = {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None,
+        }
+        stats.update(self._stats)
+        return stats
@@ -1,25 +1,220 @@
 import uuid
+import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_
-from app.models import ResidentMapping, SyncLog, QrCode
-from app.hikcentral_client import HikCentralClient
-from app.circuit_breaker import get_circuit_breaker
+from sqlalchemy import select, update, and_, or_, func, bindparam, String, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from app.models import ResidentMapping, SyncLog, QrCode, validity_range, stored_validity_range
+from app.hikcentral_client import LOCAL_REJECTION_CODES, HikCentralClient
+from app.circuit_breaker import CircuitBreaker, CircuitBreakerRegistry
+from app.resident_cache import ResidentCache
+from app.resident_index import ResidentIndex
+from app.sync_log_writer import SyncLogWriter
+from app.timeouts import set_request_deadline, reset_request_deadline, remaining_request_time
 from app.config import settings
 import json
 
 logger = logging.getLogger(__name__)
 
+class _Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) of a statement, keeping its bound parameters"""
+    inherit_cache = False
+    
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+REQUIRED_RESIDENT_FIELDS = ["name", "email", "community", "fromDate", "toDate", "ownerType", "unitId"]
+
+# PostgreSQL accepts at most this many bind parameters in one statement
+MAX_STATEMENT_PARAMETERS = 32767
+
 class ResidentService:
-    def __init__(self, db: AsyncSession):
-        self.db = db
-        self.hikcentral_client = HikCentralClient()
-        self.circuit_breaker = get_circuit_breaker()
+    """Resident operations shared by every request; the DB session is passed per call"""
+    
+    def __init__(
+        self,
+        hikcentral_client: HikCentralClient,
+        circuit_breakers: CircuitBreakerRegistry,
+        cache: Optional[ResidentCache] = None,
+        index: Optional[ResidentIndex] = None,
+        sync_log_writer: Optional[SyncLogWriter] = None
+    ):
+        self.hikcentral_client = hikcentral_client
+        self.circuit_breakers = circuit_breakers
+        self.cache = cache
+        self.index = index
+        self.sync_log_writer = sync_log_writer
+    
+    def _breaker(self, operation: str) -> CircuitBreaker:
+        """Circuit breaker for a HikCentral operation, so one failing endpoint does not block the others"""
+        return self.circuit_breakers.get(operation, self.hikcentral_client.host)
     
-    async def check_resident(self, email: str, community: str) -> Optional[ResidentMapping]:
-        """Check if resident exists in local database"""
+    async def check_resident(self, db: AsyncSession, email: str, community: str) -> Optional[Dict[str, Any]]:
+        """Check if resident exists, reading through the in-process index and the Redis cache"""
+        index_token = None
+        if self.index is not None:
+            resident_dict = self.index.get_by_email(email, community)
+            if resident_dict is not None:
+                return resident_dict
+            index_token = self.index.fill_token()
+        
+        fill_token = None
+        if self.cache is not None:
+            hit, resident_dict, fill_token = await self.cache.get(email, community)
+            if hit:
+                if resident_dict is not None and self.index is not None:
+                    self.index.put(resident_dict, index_token)
+                return resident_dict
+        
+        resident = await self._find_resident(db, email, community)
+        resident_dict = resident.to_dict() if resident else None
+        stored = True
+        if self.cache is not None:
+            stored = await self.cache.set(email, community, resident_dict, fill_token)
+        # A refused fill raced an invalidation (or Redis could not tell), so the row may be stale
+        if stored and resident_dict is not None and self.index is not None:
+            self.index.put(resident_dict, index_token)
+        return resident_dict
+    
+    async def _find_resident_by_owner(self, db: AsyncSession, owner_id: str, unit_id: str) -> Optional[Dict[str, Any]]:
+        """Look up an active resident by owner and unit, through the in-process index"""
+        index_token = None
+        if self.index is not None:
+            resident_dict = self.index.get_by_owner(owner_id, unit_id)
+            if resident_dict is not None:
+                return resident_dict
+            index_token = self.index.fill_token()
+        
+        stmt = select(ResidentMapping).where(
+            and_(
+                ResidentMapping.owner_id == owner_id,
+                ResidentMapping.unit_id == unit_id,
+                ResidentMapping.is_active == True
+            )
+        )
+        result = await db.execute(stmt)
+        resident = result.scalar_one_or_none()
+        if resident is None:
+            return None
+        
+        resident_dict = resident.to_dict()
+        if self.index is not None:
+            self.index.put(resident_dict, index_token)
+        return resident_dict
+    
+    async def export_residents(
+        self,
+        db: AsyncSession,
+        community: Optional[str] = None,
+        active: Optional[bool] = None,
+        after_id: Optional[int] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream resident mappings in id order through a server-side cursor, batch_size rows at a time"""
+        stmt = select(ResidentMapping).where(*self._resident_filters(community=community, active=active)).order_by(ResidentMapping.id)
+        if after_id is not None:
+            stmt = stmt.where(ResidentMapping.id > after_id)
+        
+        result = await db.stream_scalars(stmt.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            # The identity map holds rows weakly, so sent batches are freed as the stream moves on
+            yield [resident.to_dict() for resident in partition]
+    
+    def _resident_filters(
+        self,
+        community: Optional[str] = None,
+        unit_id: Optional[str] = None,
+        owner_type: Optional[str] = None,
+        valid_from: Optional[datetime] = None,
+        valid_to: Optional[datetime] = None,
+        active: Optional[bool] = None
+    ) -> list:
+        """WHERE clauses for the listing filters that were given"""
+        filters = []
+        if community is not None:
+            filters.append(ResidentMapping.community == community)
+        if unit_id is not None:
+            filters.append(ResidentMapping.unit_id == unit_id)
+        if owner_type is not None:
+            filters.append(ResidentMapping.owner_type == owner_type)
+        if valid_from is not None or valid_to is not None:
+            # Validity overlapping the window; same expression as idx_validity_range
+            filters.append(
+                stored_validity_range(ResidentMapping.from_date, ResidentMapping.to_date).op("&&")(validity_range(valid_from, valid_to))
+            )
+        if active is not None:
+            filters.append(ResidentMapping.is_active == active)
+        return filters
+    
+    async def list_residents(
+        self,
+        db: AsyncSession,
+        community: Optional[str] = None,
+        unit_id: Optional[str] = None,
+        owner_type: Optional[str] = None,
+        valid_from: Optional[datetime] = None,
+        valid_to: Optional[datetime] = None,
+        active: Optional[bool] = None,
+        after: Optional[Tuple[str, int]] = None,
+        limit: int = 50,
+        include_total: bool = False
+    ) -> Dict[str, Any]:
+        """One page of resident mappings in (community, id) order, starting after the key `after`.
+        
+        Returns the residents, the key to continue from (None on the last page)
+        and, if asked for, the planner's estimate of all matching rows.
+        """
+        filters = self._resident_filters(community, unit_id, owner_type, valid_from, valid_to, active)
+        stmt = select(ResidentMapping).where(*filters)
+        if after is not None:
+            stmt = stmt.where(tuple_(ResidentMapping.community, ResidentMapping.id) > tuple_(*after))
+        # One extra row tells whether another page follows
+        stmt = stmt.order_by(ResidentMapping.community, ResidentMapping.id).limit(limit + 1)
+        
+        result = await db.execute(stmt)
+        residents = list(result.scalars().all())
+        next_key = None
+        if len(residents) > limit:
+            residents = residents[:limit]
+            next_key = (residents[-1].community, residents[-1].id)
+        
+        page = {
+            "residents": [resident.to_dict() for resident in residents],
+            "next": next_key,
+        }
+        if include_total:
+            page["approximate_total"] = await self._estimate_count(db, select(ResidentMapping.id).where(*filters))
+        return page
+    
+    async def _estimate_count(self, db: AsyncSession, stmt) -> Optional[int]:
+        """Planner's row estimate for stmt, from EXPLAIN without running it; None if unavailable"""
+        try:
+            result = await db.execute(_Explain(stmt))
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        except Exception as e:
+            logger.warning(f"Could not estimate resident count: {e}")
+            return None
+    
+    async def _invalidate_cache(self, email: str, community: str, owner_id: Optional[str] = None):
+        """Drop a resident's cached lookups after it was written; Redis first so other workers cannot refill from it"""
+        if self.cache is not None:
+            await self.cache.invalidate(email, community)
+        if owner_id is not None and self.index is not None:
+            await self.index.invalidate(email, community, owner_id)
+    
+    async def _find_resident(self, db: AsyncSession, email: str, community: str) -> Optional[ResidentMapping]:
+        """Look up an active resident in the local database"""
         try:
             stmt = select(ResidentMapping).where(
                 and_(
@@ -28,12 +223,21 @@ class ResidentService:
                     ResidentMapping.is_active == True
                 )
             )
-            result = await self.db.execute(stmt)
+            result = await db.execute(stmt)
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error(f"Error checking resident {email}@{community}: {e}")
             return None
     
+    def _failure_status_code(self, hikcentral_response: Optional[Dict[str, Any]]) -> int:
+        """HTTP status for a failed HikCentral call; local load shedding maps to 503, an exhausted deadline to 504"""
+        code = hikcentral_response.get("code") if hikcentral_response else None
+        if code == "DEADLINE_EXCEEDED":
+            return 504
+        if code in LOCAL_REJECTION_CODES:
+            return 503
+        return 500
+    
     def split_name(self, full_name: str) -> tuple[str, str]:
         """Split full name into first and last name"""
         if not full_name:
@@ -48,7 +252,76 @@ class ResidentService:
             # For names with more than 2 parts, first is first name, rest is last name
             return parts[0], " ".join(parts[1:])
     
-    async def create_resident(self, resident_data: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_person_data(self, resident_data: Dict[str, Any], hikcentral_person_id: str, first_name: str, last_name: str) -> Dict[str, Any]:
+        """Build the HikCentral person payload for a resident"""
+        return {
+            "personCode": hikcentral_person_id,
+            "personFamilyName": last_name,
+            "personGivenName": first_name,
+            "gender": 1,  # Default to male
+            "orgIndexCode": self.hikcentral_client.org_index_code,
+            "phoneNo": resident_data.get("phone", ""),
+            "email": resident_data["email"],
+            "certificateType": 111,  # ID card
+            "certificateNum": "",  # Could be added if needed
+            "personType": 1,  # Normal person
+            "beginTime": resident_data.get("fromDate", datetime.now().strftime("%Y-%m-%dT%H:%M:%S")),
+            "endTime": resident_data.get("toDate", (datetime.now() + timedelta(days=365)).strftime("%Y-%m-%dT%H:%M:%S"))
+        }
+    
+    def _validity_dates(self, resident_data: Dict[str, Any]) -> Tuple[datetime, datetime]:
+        """Parse fromDate/toDate as naive UTC; raises ValueError for bad or inverted dates"""
+        dates = []
+        for field, default in (("fromDate", datetime.now()), ("toDate", datetime.now() + timedelta(days=365))):
+            try:
+                value = datetime.fromisoformat(resident_data.get(field, default.isoformat()))
+            except (TypeError, ValueError):
+                raise ValueError("fromDate and toDate must be ISO 8601 dates")
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            dates.append(value)
+        if dates[0] > dates[1]:
+            raise ValueError("fromDate must not be after toDate")
+        return dates[0], dates[1]
+    
+    def _build_resident_mapping(self, resident_data: Dict[str, Any], owner_id: str, hikcentral_person_id: str, first_name: str, last_name: str) -> ResidentMapping:
+        """Build the local mapping row for a resident; raises ValueError for bad validity dates"""
+        from_date, to_date = self._validity_dates(resident_data)
+        return ResidentMapping(
+            email=resident_data["email"],
+            community=resident_data["community"],
+            hikcentral_person_id=hikcentral_person_id,
+            owner_id=owner_id,
+            unit_id=resident_data.get("unitId", ""),
+            name=resident_data["name"],
+            first_name=first_name,
+            last_name=last_name,
+            phone=resident_data.get("phone", ""),
+            owner_type=resident_data.get("ownerType", ""),
+            from_date=from_date,
+            to_date=to_date,
+            is_active=True
+        )
+    
+    def _created_resident_result(self, resident: ResidentMapping) -> Dict[str, Any]:
+        """Response payload for a created resident"""
+        return {
+            "success": True,
+            "ownerId": resident.owner_id,
+            "email": resident.email,
+            "community": resident.community,
+            "name": resident.name,
+            "firstName": resident.first_name,
+            "lastName": resident.last_name,
+            "phone": resident.phone,
+            "ownerType": resident.owner_type,
+            "unitId": resident.unit_id,
+            "fromDate": resident.from_date.isoformat(),
+            "toDate": resident.to_date.isoformat(),
+            "status_code": 201
+        }
+    
+    async def create_resident(self, db: AsyncSession, resident_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create resident in HikCentral and store mapping"""
         start_time = datetime.now()
         operation = "CREATE"
@@ -59,9 +332,10 @@ class ResidentService:
             name = resident_data["name"]
             
             # Check if resident already exists
-            existing_resident = await self.check_resident(email, community)
+            existing_resident = await self._find_resident(db, email, community)
             if existing_resident:
                 await self._log_sync(
+                    db,
                     operation=operation,
                     email=email,
                     community=community,
@@ -83,30 +357,37 @@ class ResidentService:
             # Split name for HikCentral
             first_name, last_name = self.split_name(name)
             
+            # Validate dates before anything is created in HikCentral
+            try:
+                resident = self._build_resident_mapping(resident_data, owner_id, hikcentral_person_id, first_name, last_name)
+            except ValueError as e:
+                await self._log_sync(
+                    db,
+                    operation=operation,
+                    email=email,
+                    community=community,
+                    status_code=400,
+                    error_message=str(e),
+                    response_time_ms=int((datetime.now() - start_time).total_seconds() * 1000)
+                )
+                return {
+                    "success": False,
+                    "error": str(e),
+                    "status_code": 400
+                }
+            
             # Prepare HikCentral person data
-            person_data = {
-                "personCode": hikcentral_person_id,
-                "personFamilyName": last_name,
-                "personGivenName": first_name,
-                "gender": 1,  # Default to male
-                "orgIndexCode": self.hikcentral_client.org_index_code,
-                "phoneNo": resident_data.get("phone", ""),
-                "email": email,
-                "certificateType": 111,  # ID card
-                "certificateNum": "",  # Could be added if needed
-                "personType": 1,  # Normal person
-                "beginTime": resident_data.get("fromDate", datetime.now().strftime("%Y-%m-%dT%H:%M:%S")),
-                "endTime": resident_data.get("toDate", (datetime.now() + timedelta(days=365)).strftime("%Y-%m-%dT%H:%M:%S"))
-            }
+            person_data = self._build_person_data(resident_data, hikcentral_person_id, first_name, last_name)
             
             # Create person in HikCentral with circuit breaker
             try:
-                hikcentral_response = await self.circuit_breaker.call(
+                hikcentral_response = await self._breaker("add_person").call(
                     self.hikcentral_client.add_person,
                     person_data
                 )
             except Exception as e:
                 await self._log_sync(
+                    db,
                     operation=operation,
                     email=email,
                     community=community,
@@ -122,6 +403,7 @@ class ResidentService:
             
             # Log HikCentral response
             await self._log_sync(
+                db,
                 operation=operation,
                 email=email,
                 community=community,
@@ -129,7 +411,7 @@ class ResidentService:
                 unit_id=resident_data.get("unitId"),
                 hikcentral_person_id=hikcentral_person_id,
                 hikcentral_response=json.dumps(hikcentral_response) if hikcentral_response else None,
-                status_code=201 if hikcentral_response and hikcentral_response.get("success") else 500,
+                status_code=201 if hikcentral_response and hikcentral_response.get("success") else self._failure_status_code(hikcentral_response),
                 error_message=hikcentral_response.get("message") if hikcentral_response and not hikcentral_response.get("success") else None,
                 response_time_ms=int((datetime.now() - start_time).total_seconds() * 1000)
             )
@@ -139,50 +421,22 @@ class ResidentService:
                 return {
                     "success": False,
                     "error": error_msg,
-                    "status_code": 500
+                    "status_code": self._failure_status_code(hikcentral_response)
                 }
             
             # Create resident mapping in local database
-            resident = ResidentMapping(
-                email=email,
-                community=community,
-                hikcentral_person_id=hikcentral_person_id,
-                owner_id=owner_id,
-                unit_id=resident_data.get("unitId", ""),
-                name=name,
-                first_name=first_name,
-                last_name=last_name,
-                phone=resident_data.get("phone", ""),
-                owner_type=resident_data.get("ownerType", ""),
-                from_date=datetime.fromisoformat(resident_data.get("fromDate", datetime.now().isoformat())),
-                to_date=datetime.fromisoformat(resident_data.get("toDate", (datetime.now() + timedelta(days=365)).isoformat())),
-                is_active=True
-            )
+            db.add(resident)
+            await db.commit()
+            await db.refresh(resident)
+            await self._invalidate_cache(email, community)
             
-            self.db.add(resident)
-            await self.db.commit()
-            await self.db.refresh(resident)
-            
-            return {
-                "success": True,
-                "ownerId": owner_id,
-                "email": email,
-                "community": community,
-                "name": name,
-                "firstName": first_name,
-                "lastName": last_name,
-                "phone": resident.phone,
-                "ownerType": resident.owner_type,
-                "unitId": resident.unit_id,
-                "fromDate": resident.from_date.isoformat(),
-                "toDate": resident.to_date.isoformat(),
-                "status_code": 201
-            }
+            return self._created_resident_result(resident)
             
         except Exception as e:
             logger.error(f"Error creating resident {email}@{community}: {e}")
-            await self.db.rollback()
+            await db.rollback()
             await self._log_sync(
+                db,
                 operation=operation,
                 email=email,
                 community=community,
@@ -196,25 +450,274 @@ class ResidentService:
                 "status_code": 500
             }
     
-    async def delete_resident(self, owner_id: str, unit_id: str) -> Dict[str, Any]:
+    async def _find_existing_residents(self, db: AsyncSession, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], ResidentMapping]:
+        """Existing mappings for many (email, community) pairs in one query, joined against unnested arrays"""
+        if not keys:
+            return {}
+        
+        wanted = func.unnest(
+            bindparam("emails", [email for email, _ in keys], type_=ARRAY(String)),
+            bindparam("communities", [community for _, community in keys], type_=ARRAY(String))
+        ).table_valued("email", "community").render_derived(name="wanted")
+        stmt = select(
+            ResidentMapping.email,
+            ResidentMapping.community,
+            ResidentMapping.owner_id,
+            ResidentMapping.is_active
+        ).join(
+            wanted,
+            and_(
+                ResidentMapping.email == wanted.c.email,
+                ResidentMapping.community == wanted.c.community
+            )
+        )
+        result = await db.execute(stmt)
+        # Inactive rows count too: (email, community) stays unique after a delete
+        return {(row.email, row.community): row for row in result}
+    
+    async def _insert_mappings(self, db: AsyncSession, residents: List[ResidentMapping]) -> set:
+        """Insert mappings with multi-row INSERTs under the parameter limit; returns the (email, community) pairs actually written"""
+        if not residents:
+            return set()
+        
+        now = datetime.utcnow()
+        rows = [
+            {
+                column.key: getattr(resident, column.key)
+                for column in ResidentMapping.__table__.columns
+                if column.key not in ("id", "created_at", "updated_at")
+            } | {"created_at": now, "updated_at": now}
+            for resident in residents
+        ]
+        rows_per_statement = max(1, MAX_STATEMENT_PARAMETERS // len(rows[0]))
+        inserted = set()
+        for offset in range(0, len(rows), rows_per_statement):
+            stmt = (
+                pg_insert(ResidentMapping)
+                .values(rows[offset:offset + rows_per_statement])
+                .on_conflict_do_nothing(index_elements=["email", "community"])
+                .returning(ResidentMapping.email, ResidentMapping.community)
+            )
+            result = await db.execute(stmt)
+            inserted.update((row.email, row.community) for row in result)
+        return inserted
+    
+    async def _remove_hikcentral_persons(self, person_ids: List[str], reason: str):
+        """Delete HikCentral persons created for residents that ended up without a mapping"""
+        if not person_ids:
+            return
+        
+        # Cleanup gets a batch budget of its own, even when the import ran out of time
+        deadline = set_request_deadline(settings.bulk_import_batch_timeout if settings.bulk_import_batch_timeout > 0 else None)
+        try:
+            await self._breaker("delete_persons_batch").call(
+                self.hikcentral_client.delete_persons_batch,
+                person_ids
+            )
+        except Exception as e:
+            logger.error(f"Failed to remove {len(person_ids)} {reason} HikCentral persons: {e}")
+        finally:
+            reset_request_deadline(deadline)
+    
+    async def create_residents(self, db: AsyncSession, residents_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Bulk import residents.
+        
+        Existing residents are found with one set-based query, new ones are pushed
+        to HikCentral in batches with bounded concurrency, and each successful
+        batch is written with a single multi-row insert and committed. Returns
+        one result per input item, in input order. If writing a batch fails,
+        no further batches are sent and the HikCentral persons of every batch
+        that was not committed are deleted again.
+        """
+        start_time = datetime.now()
+        operation = "BATCH_CREATE"
+        results: List[Optional[Dict[str, Any]]] = [None] * len(residents_data)
+        candidates = []
+        seen = set()
+        
+        for index, resident_data in enumerate(residents_data):
+            missing = [field for field in REQUIRED_RESIDENT_FIELDS if not resident_data.get(field)]
+            if missing:
+                results[index] = {"success": False, "error": f"{missing[0]} is required", "status_code": 400}
+                continue
+            key = (resident_data["email"], resident_data["community"])
+            if key in seen:
+                results[index] = {"success": False, "error": "Duplicate resident in request", "status_code": 409}
+                continue
+            seen.add(key)
+            candidates.append((index, resident_data))
+        
+        tasks: List[asyncio.Task] = []
+        # Set when the import fails, so batches still waiting for their turn are not sent
+        aborted = asyncio.Event()
+        # Batches whose results were written (or found to have created nothing)
+        handled_chunks = set()
+        # HikCentral persons whose resident turned out to exist already
+        orphaned_person_ids: List[str] = []
+        try:
+            existing = await self._find_existing_residents(db, [(data["email"], data["community"]) for _, data in candidates])
+            
+            pending = []
+            for index, resident_data in candidates:
+                existing_resident = existing.get((resident_data["email"], resident_data["community"]))
+                if existing_resident is not None:
+                    results[index] = {
+                        "success": False,
+                        "error": "Resident already exists",
+                        "ownerId": existing_resident.owner_id,
+                        "status_code": 409
+                    }
+                    continue
+                
+                owner_id = str(uuid.uuid4())
+                hikcentral_person_id = f"LYVE_{owner_id}"
+                first_name, last_name = self.split_name(resident_data["name"])
+                try:
+                    resident = self._build_resident_mapping(resident_data, owner_id, hikcentral_person_id, first_name, last_name)
+                except ValueError as e:
+                    results[index] = {"success": False, "error": str(e), "status_code": 400}
+                    continue
+                pending.append((index, resident_data, resident))
+            
+            semaphore = asyncio.Semaphore(max(1, settings.bulk_import_concurrency))
+            
+            async def push(chunk):
+                persons_data = [
+                    self._build_person_data(resident_data, resident.hikcentral_person_id, resident.first_name, resident.last_name)
+                    for _, resident_data, resident in chunk
+                ]
+                async with semaphore:
+                    if aborted.is_set():
+                        return chunk, None
+                    # The batch deadline starts once the batch runs, not while it waits for its turn
+                    budget = settings.bulk_import_batch_timeout if settings.bulk_import_batch_timeout > 0 else None
+                    remaining = remaining_request_time()
+                    if remaining is not None:
+                        budget = remaining if budget is None else min(budget, remaining)
+                    deadline = set_request_deadline(budget)
+                    try:
+                        return chunk, await self._breaker("add_persons_batch").call(
+                            self.hikcentral_client.add_persons_batch,
+                            persons_data
+                        )
+                    except Exception as e:
+                        logger.error(f"Circuit breaker rejected bulk create batch: {e}")
+                        return chunk, None
+                    finally:
+                        reset_request_deadline(deadline)
+            
+            batch_size = self.hikcentral_client.batch_size
+            tasks = [
+                asyncio.create_task(push(pending[offset:offset + batch_size]))
+                for offset in range(0, len(pending), batch_size)
+            ]
+            
+            communities = set()
+            # HikCentral batches run concurrently; the session is only used here, one batch at a time
+            for completed in asyncio.as_completed(tasks):
+                chunk, hikcentral_results = await completed
+                
+                created = []
+                for position, (index, _, resident) in enumerate(chunk):
+                    if hikcentral_results is None:
+                        results[index] = {
+                            "success": False,
+                            "error": "Service temporarily unavailable",
+                            "status_code": 503
+                        }
+                        continue
+                    
+                    hikcentral_result = hikcentral_results[position]
+                    if not hikcentral_result.get("success"):
+                        results[index] = {
+                            "success": False,
+                            "error": hikcentral_result.get("message") or "Failed to create person in HikCentral",
+                            "status_code": self._failure_status_code(hikcentral_result)
+                        }
+                        continue
+                    
+                    created.append((index, resident))
+                
+                if not created:
+                    handled_chunks.add(id(chunk))
+                    continue
+                
+                inserted = await self._insert_mappings(db, [resident for _, resident in created])
+                await db.commit()
+                handled_chunks.add(id(chunk))
+                for index, resident in created:
+                    if (resident.email, resident.community) in inserted:
+                        results[index] = self._created_resident_result(resident)
+                        communities.add(resident.community)
+                    else:
+                        # Created concurrently by another request after the dedupe query
+                        results[index] = {"success": False, "error": "Resident already exists", "status_code": 409}
+                        orphaned_person_ids.append(resident.hikcentral_person_id)
+            
+            if communities and self.cache is not None:
+                # One version bump per community instead of one delete per resident
+                await self.cache.invalidate_communities(communities)
+            
+            await self._remove_hikcentral_persons(orphaned_person_ids, "duplicate")
+            
+        except Exception as e:
+            logger.error(f"Error creating residents in bulk: {e}")
+            aborted.set()
+            await db.rollback()
+            # Let batches already at HikCentral finish, then remove every person no mapping was committed for
+            unwritten_person_ids = list(orphaned_person_ids)
+            for outcome in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(outcome, BaseException):
+                    continue
+                chunk, hikcentral_results = outcome
+                if id(chunk) in handled_chunks or hikcentral_results is None:
+                    continue
+                unwritten_person_ids.extend(
+                    resident.hikcentral_person_id
+                    for (_, _, resident), hikcentral_result in zip(chunk, hikcentral_results)
+                    if hikcentral_result.get("success")
+                )
+            await self._remove_hikcentral_persons(unwritten_person_ids, "unwritten")
+            # Batches committed before the error keep their results
+            for index in range(len(results)):
+                if results[index] is None:
+                    results[index] = {
+                        "success": False,
+                        "error": "Internal server error",
+                        "status_code": 500
+                    }
+        
+        created_count = sum(1 for result in results if result and result.get("success"))
+        failed_count = len(results) - created_count
+        
+        await self._log_sync(
+            db,
+            operation=operation,
+            status_code=201 if failed_count == 0 else 207,
+            response_data={"total": len(results), "created": created_count, "failed": failed_count},
+            response_time_ms=int((datetime.now() - start_time).total_seconds() * 1000)
+        )
+        
+        return {
+            "success": failed_count == 0,
+            "total": len(results),
+            "created": created_count,
+            "failed": failed_count,
+            "results": results
+        }
+    
+    async def delete_resident(self, db: AsyncSession, owner_id: str, unit_id: str) -> Dict[str, Any]:
         """Delete resident from HikCentral and local database"""
         start_time = datetime.now()
         operation = "DELETE"
         
         try:
             # Find resident by owner_id and unit_id
-            stmt = select(ResidentMapping).where(
-                and_(
-                    ResidentMapping.owner_id == owner_id,
-                    ResidentMapping.unit_id == unit_id,
-                    ResidentMapping.is_active == True
-                )
-            )
-            result = await self.db.execute(stmt)
-            resident = result.scalar_one_or_none()
+            resident = await self._find_resident_by_owner(db, owner_id, unit_id)
             
             if not resident:
                 await self._log_sync(
+                    db,
                     operation=operation,
                     owner_id=owner_id,
                     unit_id=unit_id,
@@ -230,16 +733,17 @@ class ResidentService:
             
             # Delete from HikCentral with circuit breaker
             try:
-                hikcentral_response = await self.circuit_breaker.call(
+                hikcentral_response = await self._breaker("delete_person").call(
                     self.hikcentral_client.delete_person,
-                    resident.hikcentral_person_id
+                    resident["hikcentral_person_id"]
                 )
             except Exception as e:
                 await self._log_sync(
+                    db,
                     operation=operation,
                     owner_id=owner_id,
                     unit_id=unit_id,
-                    hikcentral_person_id=resident.hikcentral_person_id,
+                    hikcentral_person_id=resident["hikcentral_person_id"],
                     status_code=503,
                     error_message=f"Circuit breaker open: {str(e)}",
                     response_time_ms=int((datetime.now() - start_time).total_seconds() * 1000)
@@ -252,14 +756,15 @@ class ResidentService:
             
             # Log HikCentral response
             await self._log_sync(
+                db,
                 operation=operation,
-                email=resident.email,
-                community=resident.community,
+                email=resident["email"],
+                community=resident["community"],
                 owner_id=owner_id,
                 unit_id=unit_id,
-                hikcentral_person_id=resident.hikcentral_person_id,
+                hikcentral_person_id=resident["hikcentral_person_id"],
                 hikcentral_response=json.dumps(hikcentral_response) if hikcentral_response else None,
-                status_code=200 if hikcentral_response and hikcentral_response.get("success") else 500,
+                status_code=200 if hikcentral_response and hikcentral_response.get("success") else self._failure_status_code(hikcentral_response),
                 error_message=hikcentral_response.get("message") if hikcentral_response and not hikcentral_response.get("success") else None,
                 response_time_ms=int((datetime.now() - start_time).total_seconds() * 1000)
             )
@@ -269,12 +774,23 @@ class ResidentService:
                 return {
                     "success": False,
                     "error": error_msg,
-                    "status_code": 500
+                    "status_code": self._failure_status_code(hikcentral_response)
                 }
             
             # Mark as inactive in local database
-            resident.is_active = False
-            await self.db.commit()
+            await db.execute(
+                update(ResidentMapping)
+                .where(
+                    and_(
+                        ResidentMapping.owner_id == owner_id,
+                        ResidentMapping.unit_id == unit_id,
+                        ResidentMapping.is_active == True
+                    )
+                )
+                .values(is_active=False)
+            )
+            await db.commit()
+            await self._invalidate_cache(resident["email"], resident["community"], owner_id)
             
             return {
                 "success": True,
@@ -283,8 +799,9 @@ class ResidentService:
             
         except Exception as e:
             logger.error(f"Error deleting resident {owner_id}@{unit_id}: {e}")
-            await self.db.rollback()
+            await db.rollback()
             await self._log_sync(
+                db,
                 operation=operation,
                 owner_id=owner_id,
                 unit_id=unit_id,
@@ -298,25 +815,18 @@ class ResidentService:
                 "status_code": 500
             }
     
-    async def generate_qr_code(self, unit_id: str, owner_id: str, validity_minutes: int = 60) -> Dict[str, Any]:
+    async def generate_qr_code(self, db: AsyncSession, unit_id: str, owner_id: str, validity_minutes: int = 60) -> Dict[str, Any]:
         """Generate QR code for resident"""
         start_time = datetime.now()
         operation = "QR_CODE"
         
         try:
             # Find resident
-            stmt = select(ResidentMapping).where(
-                and_(
-                    ResidentMapping.owner_id == owner_id,
-                    ResidentMapping.unit_id == unit_id,
-                    ResidentMapping.is_active == True
-                )
-            )
-            result = await self.db.execute(stmt)
-            resident = result.scalar_one_or_none()
+            resident = await self._find_resident_by_owner(db, owner_id, unit_id)
             
             if not resident:
                 await self._log_sync(
+                    db,
                     operation=operation,
                     owner_id=owner_id,
                     unit_id=unit_id,
@@ -332,20 +842,21 @@ class ResidentService:
             
             # Generate QR code with circuit breaker
             try:
-                hikcentral_response = await self.circuit_breaker.call(
+                hikcentral_response = await self._breaker("generate_qr_code").call(
                     self.hikcentral_client.generate_qr_code,
-                    resident.hikcentral_person_id,
+                    resident["hikcentral_person_id"],
                     unit_id,
                     validity_minutes
                 )
             except Exception as e:
                 await self._log_sync(
+                    db,
                     operation=operation,
-                    email=resident.email,
-                    community=resident.community,
+                    email=resident["email"],
+                    community=resident["community"],
                     owner_id=owner_id,
                     unit_id=unit_id,
-                    hikcentral_person_id=resident.hikcentral_person_id,
+                    hikcentral_person_id=resident["hikcentral_person_id"],
                     status_code=503,
                     error_message=f"Circuit breaker open: {str(e)}",
                     response_time_ms=int((datetime.now() - start_time).total_seconds() * 1000)
@@ -358,14 +869,15 @@ class ResidentService:
             
             # Log HikCentral response
             await self._log_sync(
+                db,
                 operation=operation,
-                email=resident.email,
-                community=resident.community,
+                email=resident["email"],
+                community=resident["community"],
                 owner_id=owner_id,
                 unit_id=unit_id,
-                hikcentral_person_id=resident.hikcentral_person_id,
+                hikcentral_person_id=resident["hikcentral_person_id"],
                 hikcentral_response=json.dumps(hikcentral_response) if hikcentral_response else None,
-                status_code=200 if hikcentral_response and hikcentral_response.get("success") else 500,
+                status_code=200 if hikcentral_response and hikcentral_response.get("success") else self._failure_status_code(hikcentral_response),
                 error_message=hikcentral_response.get("message") if hikcentral_response and not hikcentral_response.get("success") else None,
                 response_time_ms=int((datetime.now() - start_time).total_seconds() * 1000)
             )
@@ -375,7 +887,7 @@ class ResidentService:
                 return {
                     "success": False,
                     "error": error_msg,
-                    "status_code": 500
+                    "status_code": self._failure_status_code(hikcentral_response)
                 }
             
             # Extract QR code data
@@ -406,8 +918,8 @@ class ResidentService:
                 is_used=False
             )
             
-            self.db.add(qr_code)
-            await self.db.commit()
+            db.add(qr_code)
+            await db.commit()
             
             return {
                 "success": True,
@@ -418,8 +930,9 @@ class ResidentService:
             
         except Exception as e:
             logger.error(f"Error generating QR code for {owner_id}@{unit_id}: {e}")
-            await self.db.rollback()
+            await db.rollback()
             await self._log_sync(
+                db,
                 operation=operation,
                 owner_id=owner_id,
                 unit_id=unit_id,
@@ -433,27 +946,32 @@ class ResidentService:
                 "status_code": 500
             }
     
-    async def _log_sync(self, operation: str, **kwargs) -> None:
-        """Log sync operation for audit trail"""
+    async def _log_sync(self, db: AsyncSession, operation: str, **kwargs) -> None:
+        """Log sync operation for audit trail; queued for the background writer when there is one"""
+        row = {
+            "operation": operation,
+            "email": kwargs.get("email"),
+            "community": kwargs.get("community"),
+            "owner_id": kwargs.get("owner_id"),
+            "unit_id": kwargs.get("unit_id"),
+            "hikcentral_person_id": kwargs.get("hikcentral_person_id"),
+            "hikcentral_response": kwargs.get("hikcentral_response"),
+            "status_code": kwargs.get("status_code"),
+            "error_message": kwargs.get("error_message"),
+            "response_time_ms": kwargs.get("response_time_ms"),
+            "request_data": json.dumps(kwargs.get("request_data", {})) if kwargs.get("request_data") else None,
+            "response_data": json.dumps(kwargs.get("response_data", {})) if kwargs.get("response_data") else None
+        }
+        if self.sync_log_writer is not None:
+            await self.sync_log_writer.submit(row)
+            return
+        
         try:
-            log_entry = SyncLog(
-                operation=operation,
-                email=kwargs.get("email"),
-                community=kwargs.get("community"),
-                owner_id=kwargs.get("owner_id"),
-                unit_id=kwargs.get("unit_id"),
-                hikcentral_person_id=kwargs.get("hikcentral_person_id"),
-                hikcentral_response=kwargs.get("hikcentral_response"),
-                status_code=kwargs.get("status_code"),
-                error_message=kwargs.get("error_message"),
-                response_time_ms=kwargs.get("response_time_ms"),
-                request_data=json.dumps(kwargs.get("request_data", {})) if kwargs.get("request_data") else None,
-                response_data=json.dumps(kwargs.get("response_data", {})) if kwargs.get("response_data") else None
-            )
+            log_entry = SyncLog(**row)
             
-            self.db.add(log_entry)
-            await self.db.commit()
+            db.add(log_entry)
+            await db.commit()
             
         except Exception as e:
             logger.error(f"Error logging sync operation: {e}")
-            await self.db.rollback()
\ No newline at end of file
+            await db.rollback()
\ No newline at end of file
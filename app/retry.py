@@ -0,0 +1,100 @@
+import random
+import time
+import logging
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Operations that can be repeated without changing the outcome.
+# Adds and QR generation create new state in HikCentral, so they are only
+# retried when the request provably never reached the server.
+IDEMPOTENT_OPERATIONS = frozenset({
+    "get_person",
+    "update_person",
+    "delete_person",
+    "delete_persons_batch",
+})
+
+# HTTP statuses worth retrying; 429 means the request was rejected unprocessed
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+UNPROCESSED_STATUSES = frozenset({429})
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and an overall deadline"""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        deadline: float = 30.0
+    ):
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def is_idempotent(self, operation: str) -> bool:
+        """Check if an operation is safe to repeat"""
+        return operation in IDEMPOTENT_OPERATIONS
+
+    def remaining(self, started_at: float) -> float:
+        """Seconds left before the overall deadline"""
+        return self.deadline - (time.monotonic() - started_at)
+
+    def backoff(self, retry_number: int) -> float:
+        """Full-jitter delay before the given retry (1-based)"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (retry_number - 1)))
+        return random.uniform(0, ceiling)
+
+    def next_delay(self, operation: str, attempt: int, started_at: float, unprocessed: bool = False) -> Optional[float]:
+        """Return the delay before the next attempt, or None to give up.
+
+        attempt is the number of attempts made so far. unprocessed marks
+        failures where HikCentral never acted on the request, which makes
+        them safe to retry for any operation.
+        """
+        stats = self._operation_stats(operation)
+
+        if not unprocessed and not self.is_idempotent(operation):
+            stats["not_retried_unsafe"] += 1
+            return None
+
+        if attempt > self.max_retries:
+            stats["retries_exhausted"] += 1
+            return None
+
+        delay = self.backoff(attempt)
+        if self.remaining(started_at) <= delay:
+            stats["deadline_exceeded"] += 1
+            return None
+
+        stats["retries"] += 1
+        return delay
+
+    def record_attempt(self, operation: str, attempt: int, success: bool, outcome: str):
+        """Record the outcome of one attempt"""
+        stats = self._operation_stats(operation)
+        stats["attempts"] += 1
+        if not success:
+            stats["failed_attempts"] += 1
+        if attempt > 1:
+            logger.info(f"HikCentral {operation} attempt {attempt}: {outcome}")
+
+    def _operation_stats(self, operation: str) -> Dict[str, int]:
+        stats = self._stats.get(operation)
+        if stats is None:
+            stats = self._stats[operation] = {
+                "attempts": 0,
+                "failed_attempts": 0,
+                "retries": 0,
+                "retries_exhausted": 0,
+                "deadline_exceeded": 0,
+                "not_retried_unsafe": 0,
+            }
+        return stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return per-operation retry statistics"""
+        return {operation: dict(stats) for operation, stats in self._stats.items()}
@@ -0,0 +1,281 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "sync_logs"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+LEGACY_TABLE = f"{PARENT_TABLE}_legacy"
+
+# Serialises partition maintenance across workers (pg_try_advisory_xact_lock key)
+MAINTENANCE_LOCK_ID = 0x53594E43
+
+# Partition name suffix formats; the suffix encodes the range start
+_FORMATS = {"day": "%Y%m%d", "month": "%Y%m"}
+
+_COLUMNS = (
+    "id, operation, email, community, owner_id, unit_id, request_data, response_data, status_code, "
+    "error_message, hikcentral_person_id, hikcentral_response, created_at, response_time_ms"
+)
+
+def partition_start(moment: datetime, interval: str) -> datetime:
+    """Start of the partition range containing moment"""
+    if interval == "day":
+        return datetime(moment.year, moment.month, moment.day)
+    return datetime(moment.year, moment.month, 1)
+
+def next_partition_start(start: datetime, interval: str) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+def partition_name(start: datetime, interval: str) -> str:
+    return f"{PARENT_TABLE}_p{start.strftime(_FORMATS[interval])}"
+
+def parse_partition_name(name: str) -> Optional[Tuple[datetime, datetime]]:
+    """Range (start, end) of a partition created by this module, or None for any other table"""
+    prefix = f"{PARENT_TABLE}_p"
+    if not name.startswith(prefix):
+        return None
+    suffix = name[len(prefix):]
+    for interval, fmt in _FORMATS.items():
+        if len(suffix) == len(datetime(2000, 1, 1).strftime(fmt)):
+            try:
+                start = datetime.strptime(suffix, fmt)
+            except ValueError:
+                return None
+            return start, next_partition_start(start, interval)
+    return None
+
+async def is_partitioned(conn: AsyncConnection) -> Optional[bool]:
+    """Whether sync_logs is partitioned; None if it does not exist"""
+    result = await conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relnamespace = 'public'::regnamespace"),
+        {"name": PARENT_TABLE}
+    )
+    relkind = result.scalar_one_or_none()
+    if relkind is None:
+        return None
+    return relkind == "p"
+
+async def list_partitions(conn: AsyncConnection) -> List[str]:
+    result = await conn.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :name ORDER BY child.relname"
+        ),
+        {"name": PARENT_TABLE}
+    )
+    return [row[0] for row in result]
+
+async def create_partition(conn: AsyncConnection, name: str, start: datetime, end: datetime, has_default: bool) -> int:
+    """Create the partition for [start, end); returns the rows moved into it from the default partition.
+    
+    PostgreSQL refuses a new range while the default partition holds rows for
+    it, so those rows are moved across with the default partition detached.
+    """
+    create = text(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+    )
+    bounds = {"start": start, "end": end}
+    stranded = False
+    if has_default:
+        result = await conn.execute(
+            text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end)"),
+            bounds
+        )
+        stranded = bool(result.scalar())
+    if not stranded:
+        await conn.execute(create)
+        return 0
+    
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    await conn.execute(create)
+    result = await conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end "
+            f"RETURNING {_COLUMNS}) INSERT INTO {PARENT_TABLE} ({_COLUMNS}) SELECT {_COLUMNS} FROM moved"
+        ),
+        bounds
+    )
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    logger.info(f"Moved {result.rowcount} sync log rows from {DEFAULT_PARTITION} into {name}")
+    return result.rowcount
+
+async def ensure_partitions(conn: AsyncConnection, interval: str = "month", ahead: int = 2, now: Optional[datetime] = None) -> List[str]:
+    """Create the current partition, `ahead` future ones and the default partition; returns those created"""
+    existing = set(await list_partitions(conn))
+    created = []
+    
+    start = partition_start(now or datetime.utcnow(), interval)
+    for _ in range(ahead + 1):
+        end = next_partition_start(start, interval)
+        name = partition_name(start, interval)
+        if name not in existing:
+            await create_partition(conn, name, start, end, DEFAULT_PARTITION in existing)
+            created.append(name)
+        start = end
+    
+    # Catches rows outside every range (clock skew, a lapsed maintenance job) instead of failing the insert;
+    # create_partition later moves them into their range, purge_default_partition applies retention
+    if DEFAULT_PARTITION not in existing:
+        await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+        created.append(DEFAULT_PARTITION)
+    return created
+
+async def drop_expired_partitions(conn: AsyncConnection, retention_days: int, now: Optional[datetime] = None) -> List[str]:
+    """Drop partitions whose whole range is older than the retention period; returns those dropped"""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    dropped = []
+    for name in await list_partitions(conn):
+        bounds = parse_partition_name(name)
+        if bounds is None or bounds[1] > cutoff:
+            continue
+        await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        await conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
+
+async def purge_default_partition(conn: AsyncConnection, retention_days: int, now: Optional[datetime] = None) -> int:
+    """Delete default partition rows older than the retention period; returns the rows deleted"""
+    if DEFAULT_PARTITION not in await list_partitions(conn):
+        return 0
+    result = await conn.execute(
+        text(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < :cutoff"),
+        {"cutoff": (now or datetime.utcnow()) - timedelta(days=retention_days)}
+    )
+    return result.rowcount
+
+async def convert_legacy_table(conn: AsyncConnection) -> bool:
+    """Rename an unpartitioned sync_logs out of the way so the partitioned table can be created.
+    
+    Returns True if a legacy table was renamed; copy_legacy_rows moves its
+    recent rows once the new table and its partitions exist.
+    """
+    if await is_partitioned(conn) is not False:
+        return False
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {LEGACY_TABLE}"))
+    await conn.execute(text(f"ALTER SEQUENCE IF EXISTS {PARENT_TABLE}_id_seq RENAME TO {LEGACY_TABLE}_id_seq"))
+    # Indexes keep their sync_logs_* / ix_sync_logs_* names; rename them so nothing collides
+    result = await conn.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = :name"),
+        {"name": LEGACY_TABLE}
+    )
+    for (index_name,) in result.all():
+        if PARENT_TABLE in index_name and LEGACY_TABLE not in index_name:
+            await conn.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name.replace(PARENT_TABLE, LEGACY_TABLE, 1)}"))
+    logger.info(f"Renamed unpartitioned {PARENT_TABLE} to {LEGACY_TABLE}")
+    return True
+
+async def copy_legacy_rows(conn: AsyncConnection, retention_days: int) -> int:
+    """Copy rows still within retention from the legacy table; the legacy table is left for the operator to drop"""
+    result = await conn.execute(
+        text(
+            f"INSERT INTO {PARENT_TABLE} ({_COLUMNS}) SELECT {_COLUMNS} FROM {LEGACY_TABLE} "
+            f"WHERE created_at >= :cutoff"
+        ),
+        {"cutoff": datetime.utcnow() - timedelta(days=retention_days)}
+    )
+    await conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{PARENT_TABLE}', 'id'), "
+        f"GREATEST((SELECT COALESCE(MAX(id), 0) FROM {LEGACY_TABLE}), 1))"
+    ))
+    return result.rowcount
+
+class SyncLogRetention:
+    """Background job keeping sync_logs partitions ahead of time and dropping expired ones.
+    
+    Every worker runs it; a transaction-scoped advisory lock lets only one of
+    them do the DDL per round.
+    """
+    
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        interval: str = "month",
+        ahead: int = 2,
+        retention_days: int = 90,
+        maintenance_interval: float = 3600.0
+    ):
+        if interval not in _FORMATS:
+            raise ValueError(f"Unsupported sync log partition interval: {interval}")
+        self.engine = engine
+        self.interval = interval
+        self.ahead = ahead
+        self.retention_days = retention_days
+        self.maintenance_interval = maintenance_interval
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {
+            "runs": 0,
+            "skipped": 0,
+            "errors": 0,
+            "partitions_created": 0,
+            "partitions_dropped": 0,
+            "default_rows_purged": 0,
+            "last_run": None,
+        }
+    
+    async def run_once(self) -> Dict[str, List[str]]:
+        """Create upcoming partitions and drop expired ones, unless another worker is doing it"""
+        async with self.engine.begin() as conn:
+            locked = await conn.execute(text("SELECT pg_try_advisory_xact_lock(:id)"), {"id": MAINTENANCE_LOCK_ID})
+            if not locked.scalar():
+                self._stats["skipped"] += 1
+                return {"created": [], "dropped": []}
+            if not await is_partitioned(conn):
+                logger.warning(f"{PARENT_TABLE} is not partitioned; run init_db.py to convert it")
+                self._stats["skipped"] += 1
+                return {"created": [], "dropped": []}
+            
+            created = await ensure_partitions(conn, self.interval, self.ahead)
+            dropped = await drop_expired_partitions(conn, self.retention_days)
+            purged = await purge_default_partition(conn, self.retention_days)
+        
+        self._stats["runs"] += 1
+        self._stats["default_rows_purged"] += purged
+        self._stats["partitions_created"] += len(created)
+        self._stats["partitions_dropped"] += len(dropped)
+        self._stats["last_run"] = datetime.utcnow().isoformat()
+        if created or dropped or purged:
+            logger.info(f"Sync log partitions created: {created}, dropped: {dropped}; {purged} expired rows purged from {DEFAULT_PARTITION}")
+        return {"created": created, "dropped": dropped}
+    
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["errors"] += 1
+                logger.error(f"Sync log partition maintenance failed: {e}")
+            await asyncio.sleep(self.maintenance_interval)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            "interval": self.interval,
+            "ahead": self.ahead,
+            "retention_days": self.retention_days,
+        }
+        stats.update(self._stats)
+        return stats
@@ -0,0 +1,160 @@
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Callable
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import SyncLog
+
+logger = logging.getLogger(__name__)
+
+class SyncLogWriter:
+    """Audit pipeline for SyncLog rows, kept off the request path.
+    
+    Requests enqueue rows into a bounded in-memory queue and a background task
+    bulk-inserts them in one statement per batch, flushing when batch_size rows
+    are waiting or flush_interval has passed. When the queue is full a caller
+    waits at most enqueue_timeout (backpressure) before the row is dropped.
+    """
+    
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        enqueue_timeout: float = 0.05,
+        drain_timeout: float = 10.0
+    ):
+        self.session_factory = session_factory
+        self.max_queue = max(1, max_queue)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.drain_timeout = drain_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task: Optional[asyncio.Task] = None
+        # Rows taken off the queue for the next batch, and the batch being written
+        self._pending: List[Dict[str, Any]] = []
+        self._inflight: Optional[asyncio.Future] = None
+        self._stats = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "backpressure_waits": 0,
+            "backpressure_wait_ms": 0.0,
+            "batches": 0,
+            "write_errors": 0,
+            "rows_lost": 0,
+            "max_queue_depth": 0,
+        }
+    
+    async def submit(self, row: Dict[str, Any]) -> bool:
+        """Queue a SyncLog row; returns False if it was dropped"""
+        row.setdefault("created_at", datetime.utcnow())
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            if self.enqueue_timeout <= 0:
+                self._stats["dropped"] += 1
+                return False
+            self._stats["backpressure_waits"] += 1
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(self._queue.put(row), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self._stats["dropped"] += 1
+                return False
+            finally:
+                self._stats["backpressure_wait_ms"] += (time.monotonic() - started) * 1000
+        
+        self._stats["enqueued"] += 1
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return True
+    
+    async def start(self):
+        """Start the background writer"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the background writer and write out everything still queued"""
+        if self._task is None:
+            return
+        
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        
+        rows, self._pending = self._pending, []
+        while not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        try:
+            await asyncio.wait_for(self._drain(rows), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Sync log queue not drained within {self.drain_timeout}s, some rows were lost")
+    
+    async def _drain(self, rows: List[Dict[str, Any]]):
+        # A batch interrupted mid-write finishes first
+        if self._inflight is not None:
+            await self._inflight
+            self._inflight = None
+        for start in range(0, len(rows), self.batch_size):
+            await self._write(rows[start:start + self.batch_size])
+    
+    async def _collect(self):
+        """Wait for a row, then collect until batch_size rows are pending or flush_interval has passed"""
+        self._pending.append(await self._queue.get())
+        deadline = time.monotonic() + self.flush_interval
+        while len(self._pending) < self.batch_size:
+            try:
+                self._pending.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                self._pending.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+    
+    async def _run(self):
+        while True:
+            await self._collect()
+            batch, self._pending = self._pending, []
+            # Shielded so that stopping the writer never abandons a batch halfway
+            self._inflight = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._inflight)
+            self._inflight = None
+    
+    async def _write(self, batch: List[Dict[str, Any]]):
+        """Insert a batch in one statement; a failed batch is logged and dropped"""
+        try:
+            async with self.session_factory() as session:
+                await session.execute(insert(SyncLog), batch)
+                await session.commit()
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+        except Exception as e:
+            self._stats["write_errors"] += 1
+            self._stats["rows_lost"] += len(batch)
+            logger.error(f"Error writing {len(batch)} sync log rows: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Return queue and writer statistics"""
+        stats = {
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+        }
+        stats.update(self._stats)
+        stats["backpressure_wait_ms"] = round(self._stats["backpressure_wait_ms"], 2)
+        return stats
@@ -0,0 +1,139 @@
+import math
+import time
+import logging
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Absolute time.monotonic() deadline of the API request being served, if any
+_request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+def set_request_deadline(seconds: Optional[float]):
+    """Give the current request (and everything it awaits) a time budget; None means no deadline"""
+    return _request_deadline.set(time.monotonic() + seconds if seconds is not None else None)
+
+def reset_request_deadline(token):
+    """Restore the deadline that was active before set_request_deadline"""
+    _request_deadline.reset(token)
+
+def remaining_request_time() -> Optional[float]:
+    """Seconds left in the current request's budget, or None without a deadline"""
+    deadline = _request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+class LatencyWindow:
+    """Rolling window of recent latencies for one operation"""
+
+    def __init__(self, size: int):
+        self._samples = deque(maxlen=max(1, size))
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None when empty"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(1, math.ceil(percentile / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+class TimeoutPolicy:
+    """Per-operation connect and read timeouts, optionally adapted to observed latency.
+
+    In adaptive mode the read timeout is the configured percentile of recent
+    latencies times a multiplier, clamped between a floor and a ceiling. Until
+    enough samples exist the static read timeout applies.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float,
+        read_timeout: float,
+        read_timeouts: Optional[Dict[str, float]] = None,
+        adaptive: bool = False,
+        percentile: float = 99.0,
+        multiplier: float = 1.5,
+        floor: float = 1.0,
+        ceiling: float = 30.0,
+        window: int = 200,
+        min_samples: int = 20
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.read_timeouts = dict(read_timeouts or {})
+        self.adaptive = adaptive
+        self.percentile = percentile
+        self.multiplier = multiplier
+        self.floor = floor
+        self.ceiling = ceiling
+        self.window = window
+        self.min_samples = max(1, min_samples)
+        self._windows: Dict[str, LatencyWindow] = {}
+        self._timeouts_hit: Dict[str, int] = {}
+
+    def static_read_timeout(self, operation: str) -> float:
+        """Configured read timeout for an operation"""
+        return self.read_timeouts.get(operation, self.read_timeout)
+
+    def read_timeout_for(self, operation: str) -> float:
+        """Read timeout to use for the next call of an operation"""
+        static = self.static_read_timeout(operation)
+        if not self.adaptive:
+            return static
+
+        samples = self._windows.get(operation)
+        if samples is None or len(samples) < self.min_samples:
+            return static
+        return min(self.ceiling, max(self.floor, samples.percentile(self.percentile) * self.multiplier))
+
+    def timeouts_for(self, operation: str, remaining: Optional[float] = None) -> Tuple[float, float, float]:
+        """Return (connect, read, total) for one attempt, capped by the remaining budget"""
+        connect = self.connect_timeout
+        read = self.read_timeout_for(operation)
+        total = connect + read
+        if remaining is not None:
+            remaining = max(remaining, 0.001)
+            total = min(total, remaining)
+            connect = min(connect, remaining)
+            read = min(read, remaining)
+        return connect, read, total
+
+    def record(self, operation: str, latency: float, timed_out: bool = False):
+        """Record how long a call took; a timed-out call counts as its full timeout"""
+        samples = self._windows.get(operation)
+        if samples is None:
+            samples = self._windows[operation] = LatencyWindow(self.window)
+        samples.add(latency)
+        if timed_out:
+            self._timeouts_hit[operation] = self._timeouts_hit.get(operation, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return the timeouts currently in effect per operation"""
+        operations = {}
+        for operation in set(self._windows) | set(self.read_timeouts):
+            samples = self._windows.get(operation)
+            p50 = samples.percentile(50) if samples else None
+            pct = samples.percentile(self.percentile) if samples else None
+            operations[operation] = {
+                "samples": len(samples) if samples else 0,
+                "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+                f"p{self.percentile:g}_ms": round(pct * 1000, 2) if pct is not None else None,
+                "read_timeout": round(self.read_timeout_for(operation), 3),
+                "timeouts": self._timeouts_hit.get(operation, 0),
+            }
+        return {
+            "adaptive": self.adaptive,
+            "connect_timeout": self.connect_timeout,
+            "default_read_timeout": self.read_timeout,
+            "floor": self.floor,
+            "ceiling": self.ceiling,
+            "operations": operations,
+        }
@@ -0,0 +1,131 @@
+import json
+import random
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Wire log levels, from quietest to most verbose
+OFF = "off"
+METADATA = "metadata"
+SAMPLED = "sampled"
+FULL = "full"
+WIRE_LOG_LEVELS = (OFF, METADATA, SAMPLED, FULL)
+
+# Fields that carry images or secrets and are never written out
+REDACTED_FIELDS = frozenset({"faces", "faceData", "faceImages", "qrCode", "photo", "picture"})
+REDACTED_HEADERS = frozenset({"X-Ca-Signature"})
+
+def _redact(value: Any, max_field_length: int) -> Any:
+    """Copy a decoded JSON value with large and sensitive fields shortened"""
+    if isinstance(value, dict):
+        redacted = {}
+        for key, item in value.items():
+            if key in REDACTED_FIELDS and item:
+                size = len(item) if isinstance(item, (str, list)) else 1
+                redacted[key] = f"<redacted {type(item).__name__} of {size}>"
+            else:
+                redacted[key] = _redact(item, max_field_length)
+        return redacted
+    if isinstance(value, list):
+        return [_redact(item, max_field_length) for item in value]
+    if isinstance(value, str) and len(value) > max_field_length:
+        return f"{value[:max_field_length]}...<{len(value)} chars>"
+    return value
+
+class LazyBody:
+    """A request or response body that is only redacted and formatted when the log record is emitted"""
+
+    __slots__ = ("payload", "max_field_length")
+
+    def __init__(self, payload: Any, max_field_length: int):
+        self.payload = payload
+        self.max_field_length = max_field_length
+
+    def __str__(self) -> str:
+        payload = self.payload
+        if isinstance(payload, (bytes, bytearray)):
+            try:
+                payload = json.loads(payload)
+            except ValueError:
+                text = bytes(payload[:self.max_field_length]).decode("utf-8", errors="replace")
+                return f"{text}...<{len(self.payload)} bytes>" if len(self.payload) > self.max_field_length else text
+        return json.dumps(_redact(payload, self.max_field_length), ensure_ascii=False, default=str)
+
+class LazyHeaders:
+    """Request headers with signatures masked, formatted on demand"""
+
+    __slots__ = ("headers",)
+
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+
+    def __str__(self) -> str:
+        return str({
+            key: "<redacted>" if key in REDACTED_HEADERS else value
+            for key, value in self.headers.items()
+        })
+
+class WireLogger:
+    """Level- and sample-controlled logging of HikCentral requests and responses.
+
+    off logs nothing, metadata logs method, URL, status, sizes and latency,
+    sampled adds redacted bodies for a fraction of calls, and full adds
+    redacted bodies and headers for every call.
+    """
+
+    def __init__(self, level: str = METADATA, sample_rate: float = 0.01, max_field_length: int = 256):
+        if level not in WIRE_LOG_LEVELS:
+            logger.warning(f"Unknown wire log level '{level}', using '{METADATA}'")
+            level = METADATA
+        self.level = level
+        self.sample_rate = sample_rate
+        self.max_field_length = max_field_length
+
+    def should_log_bodies(self) -> bool:
+        """Decide once per call whether bodies are logged"""
+        if self.level == FULL:
+            return True
+        if self.level == SAMPLED:
+            return random.random() < self.sample_rate
+        return False
+
+    def log_request(
+        self,
+        operation: str,
+        method: str,
+        url: str,
+        body: Any,
+        body_size: int,
+        query: Optional[Any],
+        include_body: bool
+    ):
+        """Log an outgoing request"""
+        if self.level == OFF or not logger.isEnabledFor(logging.INFO):
+            return
+
+        if include_body:
+            logger.info(
+                "HikCentral %s request: %s %s params=%s body=%s",
+                operation, method, url, query, LazyBody(body, self.max_field_length)
+            )
+        else:
+            logger.info("HikCentral %s request: %s %s (%d bytes)", operation, method, url, body_size)
+
+    def log_headers(self, operation: str, attempt: int, headers: Dict[str, str]):
+        """Log signed request headers (full level only)"""
+        if self.level == FULL and logger.isEnabledFor(logging.INFO):
+            logger.info("HikCentral %s attempt %d headers: %s", operation, attempt, LazyHeaders(headers))
+
+    def log_response(self, operation: str, status: int, raw: bytes, latency_ms: float, include_body: bool):
+        """Log a received response"""
+        if self.level == OFF or not logger.isEnabledFor(logging.INFO):
+            return
+
+        if include_body:
+            logger.info(
+                "HikCentral %s response: %d in %.1fms body=%s",
+                operation, status, latency_ms, LazyBody(raw, self.max_field_length)
+            )
+        else:
+            logger.info("HikCentral %s response: %d in %.1fms (%d bytes)", operation, status, latency_ms, len(raw))
@@ -17,10 +17,14 @@ class Config:
     HIKCENTRAL_USER_ID = os.environ.get('HIKCENTRAL_USER_ID') or 'admin'
     HIKCENTRAL_ORG_INDEX_CODE = os.environ.get('HIKCENTRAL_ORG_INDEX_CODE') or '1'
     HIKCENTRAL_VERIFY_SSL = os.environ.get('HIKCENTRAL_VERIFY_SSL', 'False').lower() == 'true'
+    HIKCENTRAL_BATCH_SIZE = int(os.environ.get('HIKCENTRAL_BATCH_SIZE', '100'))  # persons per batch request
     
     # API Configuration
     API_TIMEOUT = int(os.environ.get('API_TIMEOUT', '30'))
     MAX_RETRIES = int(os.environ.get('MAX_RETRIES', '3'))
+    RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', '0.2'))  # seconds
+    RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', '2.0'))  # seconds
+    RETRY_DEADLINE = float(os.environ.get('RETRY_DEADLINE', '30'))  # seconds, across all attempts
     
     # Authentication Configuration
     LYVE_API_KEY = os.environ.get('LYVE_API_KEY') or 'demo-key'
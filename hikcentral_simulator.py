@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+HikCentral Artemis simulator for load and integration testing
+Verifies the X-Ca-Signature scheme and serves the person and QR code endpoints
+used by the middleware, with injectable latency, errors and throttling.
+
+Usage:
+    python hikcentral_simulator.py --port 9443 --latency lognormal:40:0.5 --error-rate 0.02 --rate-limit 50
+    HIKCENTRAL_BASE_URL=http://localhost:9443 uvicorn app.main:app --port 3000
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import random
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from aiohttp import web
+
+logger = logging.getLogger("hikcentral_simulator")
+
+ARTEMIS_PREFIX = "/artemis/api"
+
+class LatencyModel:
+    """Response latency distribution, in milliseconds"""
+
+    def __init__(self, spec: str = "fixed:0"):
+        self.spec = spec
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "normal", "lognormal", "exponential"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+
+    def sample(self) -> float:
+        """Draw one latency in seconds"""
+        p = self.params
+        if self.kind == "fixed":
+            ms = p[0] if p else 0
+        elif self.kind == "uniform":
+            ms = random.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            ms = random.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            # lognormal:<median ms>:<sigma>
+            ms = p[0] * random.lognormvariate(0, p[1])
+        else:
+            # exponential:<mean ms>
+            ms = random.expovariate(1 / p[0]) if p[0] > 0 else 0
+        return max(0.0, ms) / 1000
+
+class SimulatorConfig:
+    """Runtime-adjustable fault injection settings"""
+
+    def __init__(self, args):
+        self.app_key = args.app_key
+        self.app_secret = args.app_secret
+        self.verify_signature = not args.no_verify
+        self.latency = LatencyModel(args.latency)
+        self.error_rate = args.error_rate
+        self.http_error_rate = args.http_error_rate
+        self.reset_rate = args.reset_rate
+        self.rate_limit = args.rate_limit
+        self.max_timestamp_skew = args.max_timestamp_skew
+
+    def to_dict(self):
+        return {
+            "verify_signature": self.verify_signature,
+            "latency": self.latency.spec,
+            "error_rate": self.error_rate,
+            "http_error_rate": self.http_error_rate,
+            "reset_rate": self.reset_rate,
+            "rate_limit": self.rate_limit,
+            "max_timestamp_skew": self.max_timestamp_skew,
+        }
+
+    def update(self, data):
+        if "verify_signature" in data:
+            self.verify_signature = bool(data["verify_signature"])
+        if "latency" in data:
+            self.latency = LatencyModel(data["latency"])
+        for field in ("error_rate", "http_error_rate", "reset_rate", "rate_limit", "max_timestamp_skew"):
+            if field in data:
+                setattr(self, field, float(data[field]))
+
+class HikCentralSimulator:
+    """In-memory HikCentral Artemis stand-in"""
+
+    def __init__(self, config: SimulatorConfig):
+        self.config = config
+        self.persons = {}
+        self.person_codes = {}
+        self.seen_nonces = OrderedDict()
+        self.window_start = time.monotonic()
+        self.window_count = 0
+        self.stats = {
+            "requests": 0,
+            "signature_failures": 0,
+            "throttled": 0,
+            "injected_errors": 0,
+            "injected_http_errors": 0,
+            "injected_resets": 0,
+        }
+        self.endpoint_stats = {}
+
+    # Signature verification
+
+    def _expected_signature(self, request: web.Request, body: bytes) -> str:
+        headers = request.headers
+        signed_headers = sorted(h.strip().lower() for h in headers.get("X-Ca-Signature-Headers", "").split(",") if h.strip())
+
+        resource = request.path
+        if request.query:
+            resource += "?" + "&".join(f"{key}={value}" for key, value in sorted(request.query.items()))
+
+        parts = [
+            request.method,
+            headers.get("Accept", "*/*"),
+            headers.get("Content-MD5", ""),
+            headers.get("Content-Type", ""),
+            headers.get("Date", ""),
+        ]
+        parts.extend(f"{name}:{headers.get(name, '')}" for name in signed_headers)
+        parts.append(resource)
+
+        digest = hmac.new(self.config.app_secret.encode("utf-8"), "\n".join(parts).encode("utf-8"), hashlib.sha256).digest()
+        return base64.b64encode(digest).decode("ascii")
+
+    def _verify(self, request: web.Request, body: bytes):
+        """Return an error message if the request is not correctly signed"""
+        headers = request.headers
+        if headers.get("X-Ca-Key") != self.config.app_key:
+            return "Invalid X-Ca-Key"
+
+        if body:
+            content_md5 = base64.b64encode(hashlib.md5(body).digest()).decode("ascii")
+            if headers.get("Content-MD5") != content_md5:
+                return "Content-MD5 mismatch"
+
+        try:
+            timestamp = int(headers.get("X-Ca-Timestamp", "0"))
+        except ValueError:
+            return "Invalid X-Ca-Timestamp"
+        if abs(time.time() * 1000 - timestamp) > self.config.max_timestamp_skew * 1000:
+            return "X-Ca-Timestamp outside allowed skew"
+
+        nonce = headers.get("X-Ca-Nonce")
+        if not nonce:
+            return "Missing X-Ca-Nonce"
+        if nonce in self.seen_nonces:
+            return "Replayed X-Ca-Nonce"
+        self.seen_nonces[nonce] = time.monotonic()
+        while len(self.seen_nonces) > 100000:
+            self.seen_nonces.popitem(last=False)
+
+        if headers.get("X-Ca-Signature") != self._expected_signature(request, body):
+            return "Invalid X-Ca-Signature"
+        return None
+
+    # Fault injection
+
+    def _throttled(self) -> bool:
+        if not self.config.rate_limit:
+            return False
+        now = time.monotonic()
+        if now - self.window_start >= 1:
+            self.window_start = now
+            self.window_count = 0
+        self.window_count += 1
+        return self.window_count > self.config.rate_limit
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        if request.path.startswith("/_sim"):
+            return await handler(request)
+
+        self.stats["requests"] += 1
+        endpoint = self.endpoint_stats.setdefault(request.path, {"requests": 0, "errors": 0})
+        endpoint["requests"] += 1
+
+        if self._throttled():
+            self.stats["throttled"] += 1
+            return web.json_response({"code": "429", "msg": "Too many requests"}, status=429)
+
+        body = await request.read()
+        if self.config.verify_signature:
+            error = self._verify(request, body)
+            if error:
+                self.stats["signature_failures"] += 1
+                endpoint["errors"] += 1
+                return web.json_response({"code": "401", "msg": error}, status=401)
+
+        await asyncio.sleep(self.config.latency.sample())
+
+        roll = random.random()
+        if roll < self.config.reset_rate:
+            self.stats["injected_resets"] += 1
+            endpoint["errors"] += 1
+            request.transport.close()
+            raise ConnectionResetError("Injected connection reset")
+        roll -= self.config.reset_rate
+        if roll < self.config.http_error_rate:
+            self.stats["injected_http_errors"] += 1
+            endpoint["errors"] += 1
+            return web.json_response({"code": "503", "msg": "Injected service unavailable"}, status=503)
+        roll -= self.config.http_error_rate
+        if roll < self.config.error_rate:
+            self.stats["injected_errors"] += 1
+            endpoint["errors"] += 1
+            return self._fail("0x00052102", "Injected Artemis error")
+
+        request["body"] = json.loads(body) if body else None
+        return await handler(request)
+
+    # Artemis endpoints
+
+    def _ok(self, data=None):
+        return web.json_response({"code": "0", "msg": "Success", "data": data if data is not None else {}})
+
+    def _fail(self, code: str, msg: str):
+        return web.json_response({"code": code, "msg": msg, "data": None})
+
+    def _store_person(self, person):
+        person_code = person.get("personCode") or ""
+        if person_code and person_code in self.person_codes:
+            return None
+        person_id = str(uuid.uuid4().int)[:12]
+        record = dict(person, personId=person_id)
+        record.pop("clientId", None)
+        self.persons[person_id] = record
+        if person_code:
+            self.person_codes[person_code] = person_id
+        return person_id
+
+    def _remove_person(self, person_id) -> bool:
+        person = self.persons.pop(person_id, None)
+        if person is None:
+            return False
+        self.person_codes.pop(person.get("personCode"), None)
+        return True
+
+    def _resolve(self, person_id=None, person_code=None):
+        if person_id and person_id in self.persons:
+            return person_id
+        if person_id and person_id in self.person_codes:
+            return self.person_codes[person_id]
+        if person_code:
+            return self.person_codes.get(person_code)
+        return None
+
+    async def add_person(self, request):
+        person_id = self._store_person(request["body"] or {})
+        if person_id is None:
+            return self._fail("0x00052301", "Person code already exists")
+        return self._ok(person_id)
+
+    async def batch_add_persons(self, request):
+        successes, failures = [], []
+        for person in request["body"] or []:
+            person_id = self._store_person(person)
+            if person_id is None:
+                failures.append({"clientId": person.get("clientId"), "code": "0x00052301", "msg": "Person code already exists"})
+            else:
+                successes.append({"clientId": person.get("clientId"), "personId": person_id})
+        return self._ok({"successes": successes, "failures": failures})
+
+    async def update_person(self, request):
+        body = request["body"] or {}
+        person_id = self._resolve(body.get("personId"), body.get("personCode"))
+        if person_id is None:
+            return self._fail("0x00052304", "Person does not exist")
+        self.persons[person_id].update({k: v for k, v in body.items() if k != "personId"})
+        return self._ok()
+
+    async def delete_person(self, request):
+        body = request["body"] or {}
+        person_id = self._resolve(body.get("personId"), body.get("personCode"))
+        if person_id is None or not self._remove_person(person_id):
+            return self._fail("0x00052304", "Person does not exist")
+        return self._ok()
+
+    async def batch_delete_persons(self, request):
+        failures = []
+        for person_id in (request["body"] or {}).get("personIds", []):
+            resolved = self._resolve(person_id)
+            if resolved is None or not self._remove_person(resolved):
+                failures.append({"personId": person_id, "code": "0x00052304", "msg": "Person does not exist"})
+        return self._ok({"failures": failures})
+
+    async def person_info(self, request):
+        person_id = self._resolve(request.query.get("personId"))
+        if person_id is None:
+            return self._fail("0x00052304", "Person does not exist")
+        return self._ok(self.persons[person_id])
+
+    async def person_condition(self, request):
+        person_id = self._resolve(person_code=(request["body"] or {}).get("personCode"))
+        if person_id is None:
+            return self._fail("0x00052304", "Person does not exist")
+        return self._ok(self.persons[person_id])
+
+    async def generate_qr_code(self, request):
+        body = request["body"] or {}
+        if self._resolve(body.get("personId")) is None:
+            return self._fail("0x00052304", "Person does not exist")
+        validity = int(body.get("validityMinutes", 60))
+        payload = f"{body.get('personId')}|{body.get('unitId')}|{uuid.uuid4().hex}".encode("utf-8")
+        return self._ok({
+            "qrCode": base64.b64encode(payload).decode("ascii"),
+            "expiresAt": (datetime.utcnow() + timedelta(minutes=validity)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        })
+
+    # Simulator control endpoints
+
+    async def sim_stats(self, request):
+        return web.json_response({
+            "stats": self.stats,
+            "endpoints": self.endpoint_stats,
+            "persons": len(self.persons),
+            "config": self.config.to_dict()
+        })
+
+    async def sim_config(self, request):
+        try:
+            self.config.update(await request.json())
+        except (ValueError, TypeError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(self.config.to_dict())
+
+    async def sim_reset(self, request):
+        self.persons.clear()
+        self.person_codes.clear()
+        self.seen_nonces.clear()
+        for key in self.stats:
+            self.stats[key] = 0
+        self.endpoint_stats.clear()
+        return web.json_response({"success": True})
+
+    def create_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware], client_max_size=64 * 1024 * 1024)
+        routes = [
+            ("POST", "/resource/v1/person/single/add", self.add_person),
+            ("PUT", "/resource/v1/person/single/update", self.update_person),
+            ("POST", "/resource/v1/person/single/update", self.update_person),
+            ("DELETE", "/resource/v1/person/single/delete", self.delete_person),
+            ("POST", "/resource/v1/person/single/delete", self.delete_person),
+            ("GET", "/resource/v1/person/single/info", self.person_info),
+            ("POST", "/resource/v1/person/condition", self.person_condition),
+            ("POST", "/resource/v1/person/batch/add", self.batch_add_persons),
+            ("POST", "/resource/v1/person/batch/delete", self.batch_delete_persons),
+            ("POST", "/visitor/access/qrCode/generate", self.generate_qr_code),
+        ]
+        for method, path, handler in routes:
+            app.router.add_route(method, f"{ARTEMIS_PREFIX}{path}", handler)
+        app.router.add_get("/_sim/stats", self.sim_stats)
+        app.router.add_post("/_sim/config", self.sim_config)
+        app.router.add_post("/_sim/reset", self.sim_reset)
+        return app
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="HikCentral Artemis simulator")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=9443)
+    parser.add_argument("--app-key", default="27108141")
+    parser.add_argument("--app-secret", default="c3U7KikkPGo2Yka6GMZ5")
+    parser.add_argument("--no-verify", action="store_true", help="Accept unsigned requests")
+    parser.add_argument("--latency", default="fixed:0",
+                        help="fixed:<ms>, uniform:<min>:<max>, normal:<mean>:<stddev>, lognormal:<median>:<sigma> or exponential:<mean>")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with an Artemis error code")
+    parser.add_argument("--http-error-rate", type=float, default=0.0, help="Fraction of calls answered with HTTP 503")
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="Fraction of calls whose connection is reset")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Requests per second before HTTP 429 (0 = unlimited)")
+    parser.add_argument("--max-timestamp-skew", type=float, default=900, help="Allowed X-Ca-Timestamp skew in seconds")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    simulator = HikCentralSimulator(SimulatorConfig(args))
+    logger.info(f"HikCentral simulator listening on http://{args.host}:{args.port}{ARTEMIS_PREFIX}")
+    web.run_app(simulator.create_app(), host=args.host, port=args.port, access_log=None)
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,11 @@ Creates PostgreSQL database and tables
 import asyncio
 import asyncpg
 import sys
-from app.models import Base
+from app.models import Base, ResidentMapping
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine
 from app.config import settings
+from app.sync_log_partitions import convert_legacy_table, copy_legacy_rows, ensure_partitions, LEGACY_TABLE
 
 async def create_database():
     """Create PostgreSQL database if it doesn't exist"""
@@ -43,6 +45,11 @@ async def create_database():
     
     return True
 
+def create_missing_indexes(sync_conn):
+    """create_all skips tables that already exist; add resident indexes introduced since"""
+    for index in ResidentMapping.__table__.indexes:
+        index.create(sync_conn, checkfirst=True)
+
 async def create_tables():
     """Create database tables"""
     try:
@@ -51,7 +58,18 @@ async def create_tables():
         
         print("🔧 Creating tables...")
         async with engine.begin() as conn:
+            # sync_logs is partitioned by created_at; an older unpartitioned table is moved aside first
+            converted = await convert_legacy_table(conn)
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(create_missing_indexes)
+            # Superseded by idx_unit_community_id and idx_community_id
+            await conn.execute(text("DROP INDEX IF EXISTS idx_unit_id"))
+            await conn.execute(text("DROP INDEX IF EXISTS ix_resident_mappings_community"))
+            created = await ensure_partitions(conn, settings.sync_log_partition_interval, settings.sync_log_partitions_ahead)
+            print(f"📅 Sync log partitions created: {', '.join(created) or 'none'}")
+            if converted:
+                copied = await copy_legacy_rows(conn, settings.sync_log_retention_days)
+                print(f"📦 Copied {copied} sync log rows from {LEGACY_TABLE}; drop it once verified")
         
         print("✅ Tables created successfully")
         await engine.dispose()
@@ -5,10 +5,13 @@ import base64
 import uuid
 import json
 import requests
+from urllib3.exceptions import NewConnectionError
 from urllib.parse import urlparse
-from typing import Dict, Optional
+from typing import Dict, Optional, List
 import logging
 from config import Config
+from utils.single_flight import SingleFlight
+from utils.retry import RetryPolicy, RETRYABLE_STATUSES, UNPROCESSED_STATUSES
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +21,14 @@ class HikCentralClient:
         self.app_secret = Config.HIKCENTRAL_APP_SECRET
         self.base_url = self._clean_base_url(Config.HIKCENTRAL_BASE_URL)
         self.verify_ssl = Config.HIKCENTRAL_VERIFY_SSL
+        # Concurrent identical reads share one in-flight request
+        self._single_flight = SingleFlight()
+        self.retry_policy = RetryPolicy(
+            max_retries=Config.MAX_RETRIES,
+            base_delay=Config.RETRY_BASE_DELAY,
+            max_delay=Config.RETRY_MAX_DELAY,
+            deadline=Config.RETRY_DEADLINE
+        )
         
     def _clean_base_url(self, url: str) -> str:
         """Ensures base URL is just scheme://host:port"""
@@ -82,100 +93,218 @@ class HikCentralClient:
             
         return headers
     
-    def make_request(self, endpoint: str, body: Dict = None, method: str = 'POST') -> Optional[Dict]:
+    def _send(self, method: str, full_url: str, body_str: str, headers: Dict, timeout: float) -> requests.Response:
+        """Send one signed request"""
+        if method.upper() == 'POST':
+            return requests.post(
+                full_url,
+                data=body_str,
+                headers=headers,
+                verify=self.verify_ssl,
+                timeout=timeout
+            )
+        elif method.upper() == 'PUT':
+            return requests.put(
+                full_url,
+                data=body_str,
+                headers=headers,
+                verify=self.verify_ssl,
+                timeout=timeout
+            )
+        elif method.upper() == 'DELETE':
+            return requests.delete(
+                full_url,
+                headers=headers,
+                verify=self.verify_ssl,
+                timeout=timeout
+            )
+        elif method.upper() == 'GET':
+            return requests.get(
+                full_url,
+                headers=headers,
+                verify=self.verify_ssl,
+                timeout=timeout
+            )
+        else:
+            raise ValueError(f"Unsupported HTTP method: {method}")
+    
+    def _connection_not_established(self, error: requests.exceptions.RequestException) -> bool:
+        """Check if a request failed before reaching HikCentral"""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+    
+    def make_request(self, endpoint: str, body: Dict = None, method: str = 'POST', operation: str = None) -> Optional[Dict]:
         """
-        Execute the API request
+        Execute the API request, retrying transient failures
         endpoint: e.g., '/artemis/api/resource/v1/person/single/add'
+        operation: name used for retry classification and metrics
         """
+        operation = operation or endpoint
         full_url = f"{self.base_url}{endpoint}"
         body_str = json.dumps(body) if body else ""
         
-        # 1. Prepare Headers
-        headers = self._build_headers(body_str)
-        
-        # 2. Sign the Request
-        signature = self._generate_signature(method, endpoint, headers)
-        headers['X-Ca-Signature'] = signature
-        
         logger.info(f"Making {method} request to: {full_url}")
         
-        try:
-            # 3. Send Request
-            if method.upper() == 'POST':
-                response = requests.post(
-                    full_url,
-                    data=body_str,
-                    headers=headers,
-                    verify=self.verify_ssl,
-                    timeout=Config.API_TIMEOUT
-                )
-            elif method.upper() == 'PUT':
-                response = requests.put(
-                    full_url,
-                    data=body_str,
-                    headers=headers,
-                    verify=self.verify_ssl,
-                    timeout=Config.API_TIMEOUT
-                )
-            elif method.upper() == 'DELETE':
-                response = requests.delete(
-                    full_url,
-                    headers=headers,
-                    verify=self.verify_ssl,
-                    timeout=Config.API_TIMEOUT
-                )
-            elif method.upper() == 'GET':
-                response = requests.get(
-                    full_url,
-                    headers=headers,
-                    verify=self.verify_ssl,
-                    timeout=Config.API_TIMEOUT
-                )
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
+        started_at = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            
+            # 1. Prepare Headers (fresh nonce and timestamp for every attempt)
+            headers = self._build_headers(body_str)
+            
+            # 2. Sign the Request
+            signature = self._generate_signature(method, endpoint, headers)
+            headers['X-Ca-Signature'] = signature
+            
+            retryable = False
+            unprocessed = False
+            result = None
             
-            # 4. Handle Response
-            if response.status_code in [200, 201]:
-                result = response.json()
-                if result.get('code') == '0':
-                    logger.info(f"Request successful: {result}")
-                    return result
+            try:
+                # 3. Send Request
+                timeout = min(Config.API_TIMEOUT, max(self.retry_policy.remaining(started_at), 0.001))
+                response = self._send(method, full_url, body_str, headers, timeout)
+                
+                # 4. Handle Response
+                if response.status_code in [200, 201]:
+                    result = response.json()
+                    if result.get('code') == '0':
+                        logger.info(f"Request successful: {result}")
+                    else:
+                        logger.error(f"HikCentral Error: {result.get('msg')} (Code: {result.get('code')})")
+                        result = None
+                    outcome = 'success' if result else 'api_error'
                 else:
-                    logger.error(f"HikCentral Error: {result.get('msg')} (Code: {result.get('code')})")
-                    return None
-            else:
-                logger.error(f"HTTP Error: {response.status_code} - {response.text}")
+                    logger.error(f"HTTP Error: {response.status_code} - {response.text}")
+                    retryable = response.status_code in RETRYABLE_STATUSES
+                    unprocessed = response.status_code in UNPROCESSED_STATUSES
+                    outcome = f"http_{response.status_code}"
+                    
+            except requests.exceptions.Timeout as e:
+                logger.error(f"Request timeout after {timeout:.1f} seconds")
+                retryable = True
+                unprocessed = self._connection_not_established(e)
+                outcome = 'timeout'
+            except requests.exceptions.ConnectionError as e:
+                logger.error(f"Connection Failed: {e}")
+                retryable = True
+                unprocessed = self._connection_not_established(e)
+                outcome = 'connection_error'
+            except Exception as e:
+                logger.error(f"Unexpected error: {e}")
+                outcome = 'error'
+            
+            self.retry_policy.record_attempt(operation, attempt, result is not None, outcome)
+            if not retryable:
+                return result
+            
+            delay = self.retry_policy.next_delay(operation, attempt, started_at, unprocessed)
+            if delay is None:
                 return None
-                
-        except requests.exceptions.Timeout:
-            logger.error(f"Request timeout after {Config.API_TIMEOUT} seconds")
-            return None
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"Connection Failed: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error: {e}")
-            return None
+            
+            logger.warning(f"Retrying {operation} in {delay:.2f}s after attempt {attempt} failed ({outcome})")
+            time.sleep(delay)
+    
+    def get_retry_stats(self) -> Dict:
+        """Return per-operation retry statistics"""
+        return self.retry_policy.get_stats()
     
     def add_person(self, person_data: Dict) -> Optional[Dict]:
         """Add a new person to HikCentral"""
         endpoint = '/artemis/api/resource/v1/person/single/add'
-        return self.make_request(endpoint, person_data, 'POST')
+        return self.make_request(endpoint, person_data, 'POST', operation='add_person')
     
     def update_person(self, person_code: str, person_data: Dict) -> Optional[Dict]:
         """Update an existing person in HikCentral"""
         endpoint = f'/artemis/api/resource/v1/person/single/update'
         person_data['personCode'] = person_code
-        return self.make_request(endpoint, person_data, 'PUT')
+        return self.make_request(endpoint, person_data, 'PUT', operation='update_person')
     
     def delete_person(self, person_code: str) -> Optional[Dict]:
         """Delete a person from HikCentral"""
         endpoint = f'/artemis/api/resource/v1/person/single/delete'
         body = {'personCode': person_code}
-        return self.make_request(endpoint, body, 'POST')
+        return self.make_request(endpoint, body, 'POST', operation='delete_person')
     
     def get_person(self, person_code: str) -> Optional[Dict]:
         """Get person details from HikCentral"""
         endpoint = f'/artemis/api/resource/v1/person/condition'
         body = {'personCode': person_code}
-        return self.make_request(endpoint, body, 'POST')
\ No newline at end of file
+        return self._single_flight.do(('get_person', person_code), self.make_request, endpoint, body, 'POST', operation='get_person')
+    
+    def get_coalescing_stats(self) -> Dict:
+        """Return request coalescing statistics for reads"""
+        return self._single_flight.get_stats()
+    
+    def add_persons_batch(self, persons_data: List[Dict]) -> List[Dict]:
+        """
+        Add persons to HikCentral in chunks of HIKCENTRAL_BATCH_SIZE
+        Returns one result per input person, in input order
+        """
+        endpoint = '/artemis/api/resource/v1/person/batch/add'
+        batch_size = max(1, Config.HIKCENTRAL_BATCH_SIZE)
+        results = []
+        
+        for offset in range(0, len(persons_data), batch_size):
+            chunk = persons_data[offset:offset + batch_size]
+            # clientId ties each item in the HikCentral response back to its input
+            body = [dict(person_data, clientId=index) for index, person_data in enumerate(chunk)]
+            response = self.make_request(endpoint, body, 'POST', operation='add_persons_batch')
+            
+            chunk_results = [
+                {'success': False, 'message': 'HikCentral batch request failed'}
+                for _ in chunk
+            ]
+            if response:
+                data = response.get('data') or {}
+                for item in data.get('successes') or []:
+                    index = item.get('clientId')
+                    if isinstance(index, int) and 0 <= index < len(chunk):
+                        chunk_results[index] = {'success': True, 'data': {'personId': item.get('personId')}}
+                for item in data.get('failures') or []:
+                    index = item.get('clientId')
+                    if isinstance(index, int) and 0 <= index < len(chunk):
+                        chunk_results[index] = {
+                            'success': False,
+                            'message': item.get('msg') or item.get('errorMsg', 'Unknown error'),
+                            'code': item.get('code') or item.get('errorCode')
+                        }
+            results.extend(chunk_results)
+        
+        return results
+    
+    def delete_persons_batch(self, person_ids: List[str]) -> List[Dict]:
+        """
+        Delete persons from HikCentral in chunks of HIKCENTRAL_BATCH_SIZE
+        Returns one result per input person ID, in input order
+        """
+        endpoint = '/artemis/api/resource/v1/person/batch/delete'
+        batch_size = max(1, Config.HIKCENTRAL_BATCH_SIZE)
+        results = []
+        
+        for offset in range(0, len(person_ids), batch_size):
+            chunk = person_ids[offset:offset + batch_size]
+            response = self.make_request(endpoint, {'personIds': chunk}, 'POST', operation='delete_persons_batch')
+            
+            if not response:
+                results.extend({'success': False, 'message': 'HikCentral batch request failed'} for _ in chunk)
+                continue
+            
+            # HikCentral only reports the failed IDs
+            data = response.get('data') or {}
+            failures = {item.get('personId'): item for item in (data.get('failures') or [])}
+            for person_id in chunk:
+                failure = failures.get(person_id)
+                if failure is None:
+                    results.append({'success': True, 'data': {'personId': person_id}})
+                else:
+                    results.append({
+                        'success': False,
+                        'message': failure.get('msg') or failure.get('errorMsg', 'Unknown error'),
+                        'code': failure.get('code') or failure.get('errorCode')
+                    })
+        
+        return results
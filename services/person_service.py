@@ -1,12 +1,15 @@
 import logging
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 import time
 from models.database import PersonMapping, ApiLog
 from utils.face_processor import FaceDataProcessor
 
 logger = logging.getLogger(__name__)
 
+# Lyve IDs per existence query, well below SQLite's bound parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
 class PersonService:
     def __init__(self, hikcentral_client, db):
         self.hikcentral_client = hikcentral_client
@@ -21,6 +24,19 @@ class PersonService:
             logger.error(f"Error getting person by Lyve ID {lyve_person_id}: {e}")
             return None
     
+    def get_persons_by_lyve_ids(self, lyve_person_ids: List[str]) -> Dict[str, PersonMapping]:
+        """Get existing person mappings for many Lyve IDs, one IN query per LOOKUP_CHUNK_SIZE IDs"""
+        ids = list(dict.fromkeys(lyve_person_ids))
+        mappings = {}
+        try:
+            for offset in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+                chunk = ids[offset:offset + LOOKUP_CHUNK_SIZE]
+                for person in PersonMapping.query.filter(PersonMapping.lyve_person_id.in_(chunk)).all():
+                    mappings[person.lyve_person_id] = person
+        except Exception as e:
+            logger.error(f"Error getting persons by Lyve ID: {e}")
+        return mappings
+    
     def get_person_by_hikcentral_id(self, hikcentral_person_id: str) -> Optional[PersonMapping]:
         """Get person mapping by HikCentral ID"""
         try:
@@ -113,6 +129,54 @@ class PersonService:
                 
         return processed_faces
     
+    def _prepare_hikcentral_person(self, data: Dict) -> Tuple[Dict, List[Dict]]:
+        """Process face images and build the HikCentral person payload"""
+        # Generate unique HikCentral person code
+        hikcentral_person_code = f"LYVE_{data['personId']}_{int(time.time())}"
+        
+        # Process face images if provided
+        face_images = data.get('faceImages', [])
+        processed_faces = self.process_face_images(face_images, data)
+        
+        hikcentral_data = {
+            'personCode': hikcentral_person_code,
+            'personFamilyName': data.get('name', ''),
+            'personGivenName': data.get('givenName', ''),
+            'gender': data.get('gender', 1),
+            'orgIndexCode': data.get('orgIndexCode', '1'),
+            'phoneNo': data.get('phone', ''),
+            'email': data.get('email', ''),
+            'faces': processed_faces,
+            'beginTime': data.get('beginTime', datetime.now().strftime('%Y-%m-%dT%H:%M:%S')),
+            'endTime': data.get('endTime', '2030-12-31T23:59:59')
+        }
+        
+        # Add optional fields if provided
+        if 'certificateType' in data:
+            hikcentral_data['certificateType'] = data['certificateType']
+        if 'certificateNum' in data:
+            hikcentral_data['certificateNum'] = data['certificateNum']
+        if 'personType' in data:
+            hikcentral_data['personType'] = data['personType']
+        
+        return hikcentral_data, processed_faces
+    
+    def _build_person_mapping(self, data: Dict, hikcentral_id: str, face_count: int) -> PersonMapping:
+        """Build the local mapping for a person created in HikCentral"""
+        return PersonMapping(
+            lyve_person_id=data['personId'],
+            hikcentral_person_id=hikcentral_id,
+            name=data.get('name', ''),
+            phone=data.get('phone', ''),
+            email=data.get('email', ''),
+            gender=data.get('gender', 1),
+            org_index_code=data.get('orgIndexCode', '1'),
+            begin_time=datetime.fromisoformat(data.get('beginTime', datetime.now().isoformat())),
+            end_time=datetime.fromisoformat(data.get('endTime', '2030-12-31T23:59:59')) if data.get('endTime') else None,
+            is_active=True,
+            face_count=face_count
+        )
+    
     def create_person(self, data: Dict) -> Dict:
         """Create person in HikCentral and local database"""
         try:
@@ -135,34 +199,9 @@ class PersonService:
                     'hikcentral_id': existing_person.hikcentral_person_id
                 }
             
-            # Generate unique HikCentral person code
-            hikcentral_person_code = f"LYVE_{lyve_person_id}_{int(time.time())}"
-            
-            # Process face images if provided
-            face_images = data.get('faceImages', [])
-            processed_faces = self.process_face_images(face_images, data)
-            
-            # Prepare HikCentral person data
-            hikcentral_data = {
-                'personCode': hikcentral_person_code,
-                'personFamilyName': data.get('name', ''),
-                'personGivenName': data.get('givenName', ''),
-                'gender': data.get('gender', 1),
-                'orgIndexCode': data.get('orgIndexCode', '1'),
-                'phoneNo': data.get('phone', ''),
-                'email': data.get('email', ''),
-                'faces': processed_faces,
-                'beginTime': data.get('beginTime', datetime.now().strftime('%Y-%m-%dT%H:%M:%S')),
-                'endTime': data.get('endTime', '2030-12-31T23:59:59')
-            }
-            
-            # Add optional fields if provided
-            if 'certificateType' in data:
-                hikcentral_data['certificateType'] = data['certificateType']
-            if 'certificateNum' in data:
-                hikcentral_data['certificateNum'] = data['certificateNum']
-            if 'personType' in data:
-                hikcentral_data['personType'] = data['personType']
+            # Process face images and prepare HikCentral person data
+            hikcentral_data, processed_faces = self._prepare_hikcentral_person(data)
+            hikcentral_person_code = hikcentral_data['personCode']
             
             # Create person in HikCentral
             logger.info(f"Creating person in HikCentral: {hikcentral_person_code}")
@@ -178,19 +217,7 @@ class PersonService:
             hikcentral_id = response.get('data', {}).get('personId') or hikcentral_person_code
             
             # Create local mapping
-            person_mapping = PersonMapping(
-                lyve_person_id=lyve_person_id,
-                hikcentral_person_id=hikcentral_id,
-                name=data.get('name', ''),
-                phone=data.get('phone', ''),
-                email=data.get('email', ''),
-                gender=data.get('gender', 1),
-                org_index_code=data.get('orgIndexCode', '1'),
-                begin_time=datetime.fromisoformat(data.get('beginTime', datetime.now().isoformat())),
-                end_time=datetime.fromisoformat(data.get('endTime', '2030-12-31T23:59:59')) if data.get('endTime') else None,
-                is_active=True,
-                face_count=len(processed_faces)
-            )
+            person_mapping = self._build_person_mapping(data, hikcentral_id, len(processed_faces))
             
             self.db.session.add(person_mapping)
             self.db.session.commit()
@@ -393,41 +420,102 @@ class PersonService:
             }
     
     def batch_create_persons(self, persons_data: List[Dict]) -> Dict:
-        """Batch create multiple persons"""
-        results = []
-        success_count = 0
-        error_count = 0
+        """Batch create multiple persons using HikCentral batch add"""
+        results = [None] * len(persons_data)
+        valid = []
+        pending = []
+        seen = set()
         
         for i, person_data in enumerate(persons_data):
             try:
-                result = self.create_person(person_data)
-                results.append({
-                    'index': i,
-                    'personId': person_data.get('personId'),
-                    'success': result['success'],
-                    'message': result.get('message', ''),
-                    'hikcentral_id': result.get('hikcentral_id')
-                })
+                validation = self.validate_person_data(person_data)
+                if not validation['valid']:
+                    results[i] = {'success': False, 'message': f"Validation failed: {', '.join(validation['errors'])}"}
+                    continue
+                valid.append((i, person_data))
+            except Exception as e:
+                logger.error(f"Error in batch create person {i}: {e}")
+                results[i] = {'success': False, 'message': f'Error: {str(e)}'}
+        
+        # Look up every existing mapping at once instead of one query per person
+        existing = self.get_persons_by_lyve_ids([person_data['personId'] for _, person_data in valid])
+        
+        # Prepare every new person before calling HikCentral
+        for i, person_data in valid:
+            try:
+                lyve_person_id = person_data['personId']
+                existing_person = existing.get(lyve_person_id)
+                if existing_person or lyve_person_id in seen:
+                    results[i] = {
+                        'success': False,
+                        'message': 'Person already exists',
+                        'hikcentral_id': existing_person.hikcentral_person_id if existing_person else None
+                    }
+                    continue
+                seen.add(lyve_person_id)
+                
+                hikcentral_data, processed_faces = self._prepare_hikcentral_person(person_data)
+                pending.append((i, person_data, hikcentral_data, processed_faces))
                 
-                if result['success']:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    
             except Exception as e:
                 logger.error(f"Error in batch create person {i}: {e}")
-                results.append({
-                    'index': i,
-                    'personId': person_data.get('personId'),
-                    'success': False,
-                    'message': f'Error: {str(e)}'
-                })
-                error_count += 1
+                results[i] = {'success': False, 'message': f'Error: {str(e)}'}
+        
+        if pending:
+            logger.info(f"Creating {len(pending)} persons in HikCentral in batches")
+            hikcentral_results = self.hikcentral_client.add_persons_batch([item[2] for item in pending])
+            
+            created = []
+            for (i, person_data, hikcentral_data, processed_faces), response in zip(pending, hikcentral_results):
+                if not response.get('success'):
+                    results[i] = {
+                        'success': False,
+                        'message': response.get('message') or 'Failed to create person in HikCentral'
+                    }
+                    continue
+                
+                hikcentral_id = response.get('data', {}).get('personId') or hikcentral_data['personCode']
+                self.db.session.add(self._build_person_mapping(person_data, hikcentral_id, len(processed_faces)))
+                created.append((i, hikcentral_id, len(processed_faces)))
+            
+            try:
+                self.db.session.commit()
+                for i, hikcentral_id, face_count in created:
+                    results[i] = {
+                        'success': True,
+                        'message': 'Person created successfully',
+                        'hikcentral_id': hikcentral_id,
+                        'face_count': face_count
+                    }
+            except Exception as e:
+                logger.error(f"Error saving batch person mappings: {e}")
+                self.db.session.rollback()
+                for i, _, _ in created:
+                    results[i] = {'success': False, 'message': f'Error: {str(e)}'}
+                
+                # The persons exist in HikCentral without a mapping; remove them again
+                orphaned_ids = [hikcentral_id for _, hikcentral_id, _ in created]
+                try:
+                    self.hikcentral_client.delete_persons_batch(orphaned_ids)
+                except Exception as cleanup_error:
+                    logger.error(f"Failed to remove {len(orphaned_ids)} unsaved HikCentral persons: {cleanup_error}")
+        
+        success_count = sum(1 for result in results if result['success'])
+        error_count = len(results) - success_count
         
         return {
             'success': error_count == 0,
             'total': len(persons_data),
             'success_count': success_count,
             'error_count': error_count,
-            'results': results
-        }
\ No newline at end of file
+            'results': [
+                {
+                    'index': i,
+                    'personId': person_data.get('personId'),
+                    'success': result['success'],
+                    'message': result.get('message', ''),
+                    'hikcentral_id': result.get('hikcentral_id')
+                }
+                for i, (person_data, result) in enumerate(zip(persons_data, results))
+            ]
+        }
@@ -0,0 +1,14 @@
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# app.py at the repository root shadows the app/ package, so register the package explicitly
+PACKAGE_DIR = ROOT / "app"
+if not hasattr(sys.modules.get("app"), "__path__"):
+    package = types.ModuleType("app")
+    package.__path__ = [str(PACKAGE_DIR)]
+    sys.modules["app"] = package
@@ -0,0 +1,99 @@
+"""Bulk import: HikCentral persons without a committed mapping are deleted again"""
+import asyncio
+
+from sqlalchemy.dialects import postgresql
+
+from app import resident_service
+from app.circuit_breaker import CircuitBreakerRegistry
+from app.resident_service import ResidentService
+
+def run(coro):
+    return asyncio.run(coro)
+
+def resident_data(number):
+    return {
+        "name": f"Resident {number}",
+        "email": f"resident{number}@example.com",
+        "community": "hyde-park",
+        "fromDate": "2026-01-01T00:00:00",
+        "toDate": "2026-12-31T00:00:00",
+        "ownerType": "owner",
+        "unitId": f"unit-{number}",
+    }
+
+class FakeHikCentral:
+    host = "hikcentral.test"
+    org_index_code = "1"
+    batch_size = 2
+
+    def __init__(self):
+        self.added = []
+        self.deleted = []
+
+    async def add_persons_batch(self, persons_data):
+        await asyncio.sleep(0.01)
+        self.added.extend(person["personCode"] for person in persons_data)
+        return [{"success": True} for _ in persons_data]
+
+    async def delete_persons_batch(self, person_ids):
+        self.deleted.extend(person_ids)
+        return [{"success": True} for _ in person_ids]
+
+class FakeSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, stmt):
+        self.statements.append(stmt)
+        return []
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    def add(self, row):
+        pass
+
+def test_failed_batch_write_deletes_its_persons():
+    async def scenario():
+        client = FakeHikCentral()
+        service = ResidentService(client, CircuitBreakerRegistry())
+        committed = []
+
+        async def no_existing(db, keys):
+            return {}
+
+        async def insert_once(db, residents):
+            if committed:
+                raise RuntimeError("database went away")
+            committed.extend(resident.hikcentral_person_id for resident in residents)
+            return {(resident.email, resident.community) for resident in residents}
+
+        service._find_existing_residents = no_existing
+        service._insert_mappings = insert_once
+        result = await service.create_residents(FakeSession(), [resident_data(number) for number in range(6)])
+
+        assert result["created"] == 2
+        assert [item["status_code"] for item in result["results"] if not item["success"]] == [500] * 4
+        # Everything sent to HikCentral but not committed was removed, and nothing committed was
+        assert sorted(client.deleted) == sorted(set(client.added) - set(committed))
+        assert client.deleted
+    run(scenario())
+
+def test_mapping_insert_stays_under_the_parameter_limit(monkeypatch):
+    async def scenario():
+        service = ResidentService(FakeHikCentral(), CircuitBreakerRegistry())
+        residents = [
+            service._build_resident_mapping(resident_data(number), f"owner-{number}", f"LYVE_owner-{number}", "Resident", str(number))
+            for number in range(5)
+        ]
+        db = FakeSession()
+        await service._insert_mappings(db, residents)
+
+        assert len(db.statements) == 3
+        for stmt in db.statements:
+            assert len(stmt.compile(dialect=postgresql.dialect()).params) <= 30
+    monkeypatch.setattr(resident_service, "MAX_STATEMENT_PARAMETERS", 30)
+    run(scenario())
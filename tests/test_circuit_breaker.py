@@ -0,0 +1,198 @@
+"""Circuit breaker state transitions against a fake Redis shared by several workers"""
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.circuit_breaker import (
+    CLOSED, OPEN, HALF_OPEN, FAILURE, IGNORED, SLIDING_WINDOW, CircuitBreaker, CircuitBreakerRegistry
+)
+
+def run(coro):
+    return asyncio.run(coro)
+
+def make_workers(count=2, server=None, **options):
+    """Breakers with the same name sharing one Redis, as separate workers would"""
+    server = server or fakeredis.FakeServer()
+    options.setdefault("failure_threshold", 3)
+    options.setdefault("recovery_timeout", 60)
+    return [
+        CircuitBreaker(
+            name="get_person",
+            redis_client=fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+            **options
+        )
+        for _ in range(count)
+    ]
+
+async def succeed():
+    return "ok"
+
+async def fail():
+    raise RuntimeError("HikCentral unavailable")
+
+async def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+
+def test_consecutive_failures_open_the_breaker():
+    async def scenario():
+        breaker, = make_workers(1)
+        await trip(breaker)
+        assert await breaker.get_state() == OPEN
+        assert await breaker.redis_client.get(breaker.state_key) == OPEN
+
+        calls = []
+        async def tracked():
+            calls.append(1)
+        with pytest.raises(Exception, match="is OPEN"):
+            await breaker.call(tracked)
+        assert calls == []
+    run(scenario())
+
+async def wait_for(condition, timeout=2.0):
+    """Wait for pub/sub events to reach the other workers"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+def test_success_on_another_worker_resets_the_shared_count():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        registries = [
+            CircuitBreakerRegistry(
+                redis_client=fakeredis.aioredis.FakeRedis(server=server, decode_responses=True),
+                failure_threshold=3
+            )
+            for _ in range(2)
+        ]
+        first, second = (registry.get("get_person") for registry in registries)
+        for registry in registries:
+            await registry.start()
+        try:
+            for _ in range(2):
+                with pytest.raises(RuntimeError):
+                    await first.call(fail)
+            # The second worker has not seen a failure itself, but heard about the first's
+            await wait_for(lambda: second._failure_count == 2)
+            await second.call(succeed)
+            assert await first.get_failure_count() == 0
+            await wait_for(lambda: first._failure_count == 0)
+
+            with pytest.raises(RuntimeError):
+                await first.call(fail)
+            assert await first.get_state() == CLOSED
+            assert await first.get_failure_count() == 1
+        finally:
+            for registry in registries:
+                await registry.stop()
+    run(scenario())
+
+def test_successes_without_failures_stay_in_process():
+    async def scenario():
+        breaker, = make_workers(1)
+        for _ in range(100):
+            await breaker.call(succeed)
+        assert breaker.get_stats()["redis_round_trips"] == 0
+
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        await breaker.call(succeed)
+        await breaker.call(succeed)
+        # One round trip to count the failure and one to reset it
+        assert breaker.get_stats()["redis_round_trips"] == 2
+    run(scenario())
+
+def test_probe_success_closes_the_breaker():
+    async def scenario():
+        breaker, = make_workers(1, recovery_timeout=0)
+        await trip(breaker)
+        assert await breaker.call(succeed) == "ok"
+        assert await breaker.get_state() == CLOSED
+        assert await breaker.get_failure_count() == 0
+        assert await breaker.redis_client.get(breaker.state_key) == CLOSED
+    run(scenario())
+
+def test_probe_failure_reopens_the_breaker():
+    async def scenario():
+        breaker, = make_workers(1, recovery_timeout=0)
+        await trip(breaker)
+        allowed, probe_id = await breaker._admit()
+        assert allowed and probe_id
+        assert await breaker.get_state() == HALF_OPEN
+        await breaker.record_failure(probe_id=probe_id)
+        assert await breaker.get_state() == OPEN
+        assert await breaker.redis_client.zcard(breaker.probes_key) == 0
+    run(scenario())
+
+def test_probe_limit_holds_across_workers():
+    async def scenario():
+        workers = make_workers(3, recovery_timeout=0, half_open_max_probes=2, half_open_success_threshold=2)
+        await trip(workers[0])
+        for worker in workers[1:]:
+            await worker.sync_state()
+
+        admitted = [await worker._admit() for worker in workers]
+        assert [allowed for allowed, _ in admitted] == [True, True, False]
+
+        # One success is not enough to close; the slot it frees goes to the next caller
+        first, second, third = workers
+        await first.record_success(probe_id=admitted[0][1])
+        assert await first.get_state() == HALF_OPEN
+        allowed, probe_id = await third._admit()
+        assert allowed
+
+        await second.record_success(probe_id=admitted[1][1])
+        assert await second.get_state() == CLOSED
+        # A probe that fails after the breaker closed counts as an ordinary failure
+        await third.record_failure(probe_id=probe_id)
+        assert await third.get_state() == CLOSED
+        assert await third.get_failure_count() == 1
+    run(scenario())
+
+def test_ignored_probe_releases_its_slot():
+    async def scenario():
+        breaker, = make_workers(1, recovery_timeout=0, classifier=lambda result, error: IGNORED if error is None else FAILURE)
+        await trip(breaker)
+        await breaker.call(succeed)
+        assert await breaker.get_state() == HALF_OPEN
+        assert await breaker.redis_client.zcard(breaker.probes_key) == 0
+        assert breaker.get_stats()["ignored_calls"] == 1
+
+        allowed, _ = await breaker._admit()
+        assert allowed
+    run(scenario())
+
+def test_sliding_window_trips_on_flush():
+    async def scenario():
+        first, second = make_workers(2, mode=SLIDING_WINDOW, minimum_calls=4, failure_rate_threshold=50.0)
+        for breaker in (first, second):
+            await breaker.call(succeed)
+            with pytest.raises(RuntimeError):
+                await breaker.call(fail)
+        # Outcomes stay in process until flushed
+        assert await first.get_state() == CLOSED
+
+        await first.flush()
+        assert await first.get_state() == CLOSED
+        await second.flush()
+        assert await second.get_state() == OPEN
+        assert second.get_stats()["window"]["failure_rate"] == 50.0
+    run(scenario())
+
+def test_falls_back_to_memory_and_writes_back():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        breaker, = make_workers(1, server=server, redis_retry_interval=0)
+        server.connected = False
+        await trip(breaker)
+        assert await breaker.get_state() == OPEN
+        assert breaker.get_stats()["redis_errors"] == breaker.failure_threshold
+
+        server.connected = True
+        await breaker.write_back()
+        assert await breaker.redis_client.get(breaker.state_key) == OPEN
+    run(scenario())
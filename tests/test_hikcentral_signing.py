@@ -0,0 +1,36 @@
+"""Requests are signed after waiting for the rate limiter, so they never go out with a stale timestamp"""
+import asyncio
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.hikcentral_client import HikCentralClient
+from app.rate_limiter import DistributedRateLimiter
+
+def test_timestamp_is_taken_after_the_rate_limit_wait():
+    async def scenario():
+        skews = []
+
+        async def person_info(request):
+            skews.append(time.time() * 1000 - int(request.headers["X-Ca-Timestamp"]))
+            return web.json_response({"code": "0", "data": {}})
+
+        app = web.Application()
+        app.router.add_get("/artemis/api/resource/v1/person/single/info", person_info)
+        server = TestServer(app)
+        await server.start_server()
+        client = HikCentralClient()
+        client.base_url = str(server.make_url("")).rstrip("/")
+        # One token, refilled every half second: the second call waits for it
+        client.rate_limiter = DistributedRateLimiter(rate=2.0, burst=1, max_wait=5.0)
+        try:
+            results = await asyncio.gather(client.get_person("first"), client.get_person("second"))
+            assert all(result["success"] for result in results)
+        finally:
+            await client.close()
+            await server.close()
+
+        assert client.rate_limiter.get_stats()["delayed"] == 1
+        assert max(skews) < 250
+    asyncio.run(scenario())
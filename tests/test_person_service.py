@@ -0,0 +1,64 @@
+"""Batch person creation in the Flask service: one existence query, and no persons left without a mapping"""
+import pytest
+
+flask = pytest.importorskip("flask")
+pytest.importorskip("flask_sqlalchemy")
+
+from sqlalchemy import event
+
+from models.database import db, PersonMapping
+from services.person_service import PersonService
+
+class FakeHikCentral:
+    """Accepts every batch add under the submitted person code, and records batch deletes"""
+
+    def __init__(self):
+        self.deleted = []
+
+    def add_persons_batch(self, persons_data):
+        return [{"success": True, "data": {"personId": person["personCode"]}} for person in persons_data]
+
+    def delete_persons_batch(self, person_ids):
+        self.deleted.extend(person_ids)
+        return [{"success": True} for _ in person_ids]
+
+@pytest.fixture
+def app():
+    app = flask.Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(PersonMapping(lyve_person_id="existing", hikcentral_person_id="HIK_existing", name="Existing"))
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+def persons(*person_ids):
+    return [{"personId": person_id, "name": f"Person {person_id}"} for person_id in person_ids]
+
+def test_existing_persons_are_found_with_one_query(app):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        result = PersonService(FakeHikCentral(), db).batch_create_persons(persons("a", "b", "existing", "c", "a"))
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+    assert [item["success"] for item in result["results"]] == [True, True, False, True, False]
+    lookups = [statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]
+    assert len(lookups) == 1
+
+def test_failed_commit_removes_the_created_persons(app, monkeypatch):
+    def commit():
+        raise RuntimeError("database is locked")
+    monkeypatch.setattr(db.session, "commit", commit)
+
+    client = FakeHikCentral()
+    result = PersonService(client, db).batch_create_persons(persons("a", "b"))
+
+    assert result["success_count"] == 0
+    assert [person_id.split("_")[1] for person_id in client.deleted] == ["a", "b"]
+    monkeypatch.undo()
+    assert PersonMapping.query.count() == 1
@@ -0,0 +1,70 @@
+"""HikCentral calls cut short by the caller's request deadline, against a slow but healthy upstream"""
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from app.circuit_breaker import CLOSED, FAILURE, CircuitBreaker
+from app.hikcentral_client import HikCentralClient, classify_outcome
+from app.timeouts import set_request_deadline, reset_request_deadline
+
+UPSTREAM_LATENCY = 0.3
+
+def run(coro):
+    return asyncio.run(coro)
+
+async def slow_person_info(request):
+    await asyncio.sleep(UPSTREAM_LATENCY)
+    return web.json_response({"code": "0", "msg": "success", "data": {"personId": request.query.get("personId")}})
+
+async def start_upstream():
+    app = web.Application()
+    app.router.add_get("/artemis/api/resource/v1/person/single/info", slow_person_info)
+    server = TestServer(app)
+    await server.start_server()
+    client = HikCentralClient()
+    client.base_url = str(server.make_url("")).rstrip("/")
+    client.rate_limiter = None
+    return server, client
+
+async def get_person_within(client, breaker, person_id, seconds):
+    token = set_request_deadline(seconds)
+    try:
+        return await breaker.call(client.get_person, person_id)
+    finally:
+        reset_request_deadline(token)
+
+def test_short_client_deadline_does_not_open_the_breaker():
+    async def scenario():
+        server, client = await start_upstream()
+        breaker = CircuitBreaker("get_person", failure_threshold=5, classifier=classify_outcome)
+        try:
+            for index in range(breaker.failure_threshold + 1):
+                result = await get_person_within(client, breaker, f"short-{index}", 0.05)
+                assert result["code"] == "DEADLINE_EXCEEDED"
+            assert await breaker.get_state() == CLOSED
+            # Cut-short attempts are not latency samples for the adaptive timeouts
+            assert "get_person" not in client.timeout_policy.get_stats()["operations"]
+
+            result = await get_person_within(client, breaker, "patient", 2.0)
+            assert result["success"]
+            assert client.timeout_policy.get_stats()["operations"]["get_person"]["samples"] == 1
+        finally:
+            await client.close()
+            await server.close()
+    run(scenario())
+
+def test_policy_timeout_still_counts_as_a_failure():
+    async def scenario():
+        server, client = await start_upstream()
+        client.retry_policy.max_retries = 0
+        client.timeout_policy.read_timeout = 0.05
+        try:
+            result = await get_person_within(client, CircuitBreaker("get_person"), "impatient", 2.0)
+            assert result["code"] == "NETWORK_ERROR"
+            assert classify_outcome(result, None) == FAILURE
+        finally:
+            await client.close()
+            await server.close()
+    run(scenario())
@@ -0,0 +1,88 @@
+"""Resident cache and index fills that race an invalidation must not store the old row"""
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from app.models import ResidentMapping
+from app.resident_cache import ResidentCache
+from app.resident_index import ResidentIndex
+from app.resident_service import ResidentService
+
+EMAIL = "resident@example.com"
+COMMUNITY = "hyde-park"
+OWNER_ID = "owner-1"
+UNIT_ID = "unit-1"
+
+def run(coro):
+    return asyncio.run(coro)
+
+def make_resident() -> ResidentMapping:
+    return ResidentMapping(
+        id=1, email=EMAIL, community=COMMUNITY, hikcentral_person_id="person-1",
+        owner_id=OWNER_ID, unit_id=UNIT_ID, name="Resident", is_active=True
+    )
+
+def make_service(redis_client=None):
+    cache = ResidentCache(redis_client) if redis_client is not None else None
+    index = ResidentIndex(redis_client=redis_client)
+    return ResidentService(hikcentral_client=None, circuit_breakers=None, cache=cache, index=index)
+
+class _Result:
+    def __init__(self, row):
+        self.row = row
+
+    def scalar_one_or_none(self):
+        return self.row
+
+class RacingSession:
+    """Returns the row as read before a write, running the write's invalidation mid-read"""
+
+    def __init__(self, row, during_read=None):
+        self.row = row
+        self.during_read = during_read
+
+    async def execute(self, stmt):
+        if self.during_read is not None:
+            await self.during_read()
+        return _Result(self.row)
+
+def test_check_resident_does_not_index_a_fill_that_raced_a_delete():
+    async def scenario():
+        service = make_service(fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+        async def delete_committed():
+            await service._invalidate_cache(EMAIL, COMMUNITY, OWNER_ID)
+
+        db = RacingSession(make_resident(), delete_committed)
+        assert (await service.check_resident(db, EMAIL, COMMUNITY))["owner_id"] == OWNER_ID
+        assert service.index.get_by_email(EMAIL, COMMUNITY) is None
+        hit, _, _ = await service.cache.get(EMAIL, COMMUNITY)
+        assert not hit
+        assert service.cache.get_stats()["stale_fills_skipped"] == 1
+
+        # Without a concurrent write the next lookup fills both layers
+        db = RacingSession(make_resident())
+        await service.check_resident(db, EMAIL, COMMUNITY)
+        assert service.index.get_by_email(EMAIL, COMMUNITY) is not None
+        hit, resident, _ = await service.cache.get(EMAIL, COMMUNITY)
+        assert hit and resident["owner_id"] == OWNER_ID
+    run(scenario())
+
+def test_owner_lookup_does_not_index_a_fill_that_raced_a_remote_delete():
+    async def scenario():
+        service = make_service()
+
+        async def delete_on_another_worker():
+            # The invalidation another worker published arrives while this one reads
+            service.index._dispatch('{"owner_id": "%s", "origin": "other-worker"}' % OWNER_ID)
+
+        db = RacingSession(make_resident(), delete_on_another_worker)
+        assert await service._find_resident_by_owner(db, OWNER_ID, UNIT_ID) is not None
+        assert service.index.get_by_owner(OWNER_ID, UNIT_ID) is None
+        assert service.index.get_stats()["stale_fills_skipped"] == 1
+
+        await service._find_resident_by_owner(RacingSession(make_resident()), OWNER_ID, UNIT_ID)
+        assert service.index.get_by_owner(OWNER_ID, UNIT_ID) is not None
+    run(scenario())
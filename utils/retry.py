@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Operations that can be repeated without changing the outcome.
+# Adds create new state in HikCentral, so they are only retried when the
+# request provably never reached the server.
+IDEMPOTENT_OPERATIONS = frozenset({
+    'get_person',
+    'update_person',
+    'delete_person',
+    'delete_persons_batch'
+})
+
+# HTTP statuses worth retrying; 429 means the request was rejected unprocessed
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+UNPROCESSED_STATUSES = frozenset({429})
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and an overall deadline"""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.2, max_delay: float = 2.0, deadline: float = 30.0):
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def is_idempotent(self, operation: str) -> bool:
+        """Check if an operation is safe to repeat"""
+        return operation in IDEMPOTENT_OPERATIONS
+
+    def remaining(self, started_at: float) -> float:
+        """Seconds left before the overall deadline"""
+        return self.deadline - (time.monotonic() - started_at)
+
+    def backoff(self, retry_number: int) -> float:
+        """Full-jitter delay before the given retry (1-based)"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (retry_number - 1)))
+        return random.uniform(0, ceiling)
+
+    def next_delay(self, operation: str, attempt: int, started_at: float, unprocessed: bool = False) -> Optional[float]:
+        """
+        Return the delay before the next attempt, or None to give up
+        unprocessed marks failures where HikCentral never acted on the request
+        """
+        if not unprocessed and not self.is_idempotent(operation):
+            self._count(operation, 'not_retried_unsafe')
+            return None
+
+        if attempt > self.max_retries:
+            self._count(operation, 'retries_exhausted')
+            return None
+
+        delay = self.backoff(attempt)
+        if self.remaining(started_at) <= delay:
+            self._count(operation, 'deadline_exceeded')
+            return None
+
+        self._count(operation, 'retries')
+        return delay
+
+    def record_attempt(self, operation: str, attempt: int, success: bool, outcome: str):
+        """Record the outcome of one attempt"""
+        self._count(operation, 'attempts')
+        if not success:
+            self._count(operation, 'failed_attempts')
+        if attempt > 1:
+            logger.info(f"HikCentral {operation} attempt {attempt}: {outcome}")
+
+    def _count(self, operation: str, counter: str):
+        with self._lock:
+            stats = self._stats.setdefault(operation, {
+                'attempts': 0,
+                'failed_attempts': 0,
+                'retries': 0,
+                'retries_exhausted': 0,
+                'deadline_exceeded': 0,
+                'not_retried_unsafe': 0
+            })
+            stats[counter] += 1
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """Return per-operation retry statistics"""
+        with self._lock:
+            return {operation: dict(stats) for operation, stats in self._stats.items()}